@@ -0,0 +1,22 @@
+from django.contrib import admin
+from .models import EquipmentDailyUsage, ExportJob, UserDailyUsage, UserEquipmentWeeklyUsage
+
+@admin.register(EquipmentDailyUsage)
+class EquipmentDailyUsageAdmin(admin.ModelAdmin):
+    list_display = ('equipment', 'date', 'reservation_count', 'reserved_hours')
+    list_filter = ('date',)
+
+@admin.register(UserDailyUsage)
+class UserDailyUsageAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'reservation_count', 'reserved_hours')
+    list_filter = ('date',)
+
+@admin.register(UserEquipmentWeeklyUsage)
+class UserEquipmentWeeklyUsageAdmin(admin.ModelAdmin):
+    list_display = ('user', 'equipment', 'week', 'reservation_count', 'reserved_hours')
+    list_filter = ('week',)
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('dataset', 'format', 'user', 'status', 'row_count', 'created_at', 'finished_at')
+    list_filter = ('status', 'dataset')
@@ -0,0 +1,252 @@
+import csv
+import logging
+import tempfile
+import uuid
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import QueryDict
+from django.utils import timezone
+from reservations.filters import MaintenanceLogFilter, ReservationFilter
+from reservations.models import MaintenanceLog, Reservation
+from .filters import EquipmentUsageFilter, UserUsageFilter
+from .models import EquipmentDailyUsage, ExportJob, UserDailyUsage
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip (a server-side cursor on PostgreSQL)
+EXPORT_CHUNK_SIZE = 2000
+
+# Rows rendered per piece of the response/file
+LINES_PER_WRITE = 500
+
+MAX_ATTEMPTS = 3
+
+# A running export whose worker died is retaken after this long
+LEASE = timedelta(hours=1)
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+# Export columns as (header, lookup); ordering on an indexed key keeps the
+# cursor cheap and the output stable
+Dataset = namedtuple('Dataset', ['model', 'filterset_class', 'columns', 'ordering'])
+
+DATASETS = {
+    'reservations': Dataset(Reservation, ReservationFilter, [
+        ('id', 'id'),
+        ('user_id', 'user_id'),
+        ('username', 'user__username'),
+        ('equipment_id', 'equipment_id'),
+        ('equipment', 'equipment__name'),
+        ('start_time', 'start_time'),
+        ('end_time', 'end_time'),
+        ('status', 'status'),
+        ('purpose', 'purpose'),
+        ('is_recurring', 'is_recurring'),
+        ('series_id', 'series_id'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ], ['id']),
+    'maintenance': Dataset(MaintenanceLog, MaintenanceLogFilter, [
+        ('id', 'id'),
+        ('equipment_id', 'equipment_id'),
+        ('equipment', 'equipment__name'),
+        ('maintenance_type', 'maintenance_type'),
+        ('description', 'description'),
+        ('performed_by', 'performed_by'),
+        ('start_date', 'start_date'),
+        ('end_date', 'end_date'),
+        ('notes', 'notes'),
+        ('created_at', 'created_at'),
+    ], ['id']),
+    'equipment_usage': Dataset(EquipmentDailyUsage, EquipmentUsageFilter, [
+        ('date', 'date'),
+        ('equipment_id', 'equipment_id'),
+        ('equipment', 'equipment__name'),
+        ('reservation_count', 'reservation_count'),
+        ('reserved_hours', 'reserved_hours'),
+    ], ['date', 'equipment_id']),
+    'user_usage': Dataset(UserDailyUsage, UserUsageFilter, [
+        ('date', 'date'),
+        ('user_id', 'user_id'),
+        ('username', 'user__username'),
+        ('reservation_count', 'reservation_count'),
+        ('reserved_hours', 'reserved_hours'),
+    ], ['date', 'user_id']),
+}
+
+
+class ExportError(ValueError):
+    """
+    Unknown dataset or format, or invalid filters; errors maps parameter names to messages
+    """
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def filter_params(filters):
+    """
+    QueryDict from stored filters ({name: value or [values]})
+    """
+    params = QueryDict(mutable=True)
+    for name, value in filters.items():
+        params.setlist(name, [str(item) for item in (value if isinstance(value, list) else [value])])
+    return params
+
+
+def export_queryset(dataset, fmt, params):
+    """
+    Filtered, ordered queryset of a dataset; raises ExportError
+    """
+    if dataset not in DATASETS:
+        raise ExportError({'dataset': [f"Choose one of {', '.join(DATASETS)}."]})
+    if fmt not in FORMATS:
+        raise ExportError({'format': [f"Choose one of {', '.join(FORMATS)}."]})
+    spec = DATASETS[dataset]
+    filterset = spec.filterset_class(params, queryset=spec.model.objects.all())
+    if not filterset.is_valid():
+        raise ExportError(filterset.errors)
+    return filterset.qs.order_by(*spec.ordering)
+
+
+def _cell(value):
+    """
+    CSV cell: ISO 8601 dates, empty NULLs, and text that a spreadsheet would
+    run as a formula quoted with a leading apostrophe
+    """
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@', '\t', '\r'):
+        return "'" + value
+    return value
+
+
+class _Echo:
+    """
+    File-like object whose write() hands the line back, so csv.writer
+    renders rows without a buffer
+    """
+    def write(self, value):
+        return value
+
+
+def export_chunks(dataset, fmt, queryset, tally=None):
+    """
+    Yield the export as text pieces of LINES_PER_WRITE rows, reading the rows
+    through an iterator in chunks, so memory stays flat whatever the row count
+    The number of rows is stored in tally['rows'] at the end
+    """
+    headers = [header for header, _ in DATASETS[dataset].columns]
+    rows = queryset.values_list(
+        *[lookup for _, lookup in DATASETS[dataset].columns]
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        render = lambda row: writer.writerow([_cell(value) for value in row])
+        yield writer.writerow(headers)
+    else:
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        render = lambda row: encoder.encode(dict(zip(headers, row))) + '\n'
+
+    lines, count = [], 0
+    for row in rows:
+        lines.append(render(row))
+        count += 1
+        if len(lines) >= LINES_PER_WRITE:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+    if tally is not None:
+        tally['rows'] = count
+
+
+def export_filename(dataset, fmt):
+    return f"{dataset}-{timezone.localtime():%Y%m%d-%H%M%S}.{FORMATS[fmt][1]}"
+
+
+def create_export_job(user, dataset, fmt, filters):
+    """
+    Queue an export after checking its dataset, format and filters
+    """
+    export_queryset(dataset, fmt, filter_params(filters))
+    return ExportJob.objects.create(user=user, dataset=dataset, format=fmt, filters=filters)
+
+
+def claim_export(now=None):
+    """
+    Lease the oldest pending export (or one whose lease ran out) to this worker
+    The UPDATE re-checks the state, so concurrent workers never share a job
+    """
+    now = now or timezone.now()
+    token = uuid.uuid4().hex
+    # Jobs whose worker kept dying (e.g. out of memory) are not retaken forever
+    ExportJob.objects.filter(status='running', locked_until__lte=now, attempts__gte=MAX_ATTEMPTS).update(
+        status='failed', last_error='The export was interrupted too many times.', locked_until=None
+    )
+    due = ExportJob.objects.filter(status__in=['pending', 'running']).exclude(locked_until__gt=now)
+    pk = due.order_by('created_at').values_list('pk', flat=True).first()
+    if pk is None:
+        return None
+    if not due.filter(pk=pk).update(status='running', claimed_by=token, locked_until=now + LEASE,
+                                    attempts=F('attempts') + 1):
+        return None
+    return ExportJob.objects.get(pk=pk)
+
+
+def write_export(job):
+    """
+    Stream a job's export into a temporary file, then save it to the export
+    storage; returns the number of rows
+    """
+    queryset = export_queryset(job.dataset, job.format, filter_params(job.filters))
+    tally = {}
+    with tempfile.TemporaryFile() as buffer:
+        for piece in export_chunks(job.dataset, job.format, queryset, tally):
+            buffer.write(piece.encode())
+        buffer.seek(0)
+        job.file.save(export_filename(job.dataset, job.format), File(buffer), save=False)
+    return tally['rows']
+
+
+def process_export(now=None):
+    """
+    Claim and run one export; returns the job, or None when nothing is due
+    A job is retried until MAX_ATTEMPTS, then marked failed
+    """
+    job = claim_export(now=now)
+    if job is None:
+        return None
+    owned = ExportJob.objects.filter(pk=job.pk, claimed_by=job.claimed_by)
+    try:
+        row_count = write_export(job)
+    except Exception as error:
+        logger.exception('Export %s failed', job.pk)
+        owned.update(
+            status='failed' if job.attempts >= MAX_ATTEMPTS else 'pending',
+            last_error=str(error), locked_until=None,
+        )
+        return job
+    if not owned.update(status='done', file=job.file.name, row_count=row_count,
+                        locked_until=None, finished_at=timezone.now()):
+        job.file.delete(save=False)  # The lease expired and another worker took over
+    return job
+
+
+def purge_exports(older_than=timedelta(days=7)):
+    """
+    Delete finished exports and their files after `older_than`
+    """
+    expired = ExportJob.objects.filter(status__in=['done', 'failed'], created_at__lt=timezone.now() - older_than)
+    for job in expired.exclude(file='').only('pk', 'file').iterator():
+        job.file.delete(save=False)
+    return expired.delete()[0]
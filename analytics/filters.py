@@ -0,0 +1,28 @@
+import django_filters
+from .models import EquipmentDailyUsage, UserDailyUsage
+
+
+class EquipmentUsageFilter(django_filters.FilterSet):
+    """
+    ?equipment= and a day range (?date_from=, ?date_to=, inclusive)
+    """
+    equipment = django_filters.NumberFilter(field_name='equipment_id')
+    date_from = django_filters.DateFilter(field_name='date', lookup_expr='gte')
+    date_to = django_filters.DateFilter(field_name='date', lookup_expr='lte')
+
+    class Meta:
+        model = EquipmentDailyUsage
+        fields = ['equipment', 'date_from', 'date_to']
+
+
+class UserUsageFilter(django_filters.FilterSet):
+    """
+    ?user= and a day range (?date_from=, ?date_to=, inclusive)
+    """
+    user = django_filters.NumberFilter(field_name='user_id')
+    date_from = django_filters.DateFilter(field_name='date', lookup_expr='gte')
+    date_to = django_filters.DateFilter(field_name='date', lookup_expr='lte')
+
+    class Meta:
+        model = UserDailyUsage
+        fields = ['user', 'date_from', 'date_to']
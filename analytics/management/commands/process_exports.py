@@ -0,0 +1,29 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from analytics.exports import process_export, purge_exports
+
+
+class Command(BaseCommand):
+    help = 'Export worker: write queued exports to files in the export storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Run the queued exports and exit (for cron) instead of polling')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        retention = timedelta(days=getattr(settings, 'EXPORT_RETENTION_DAYS', 7))
+        processed = 0
+        while True:
+            while process_export():
+                processed += 1
+            purge_exports(older_than=retention)
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} exports'))
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from analytics.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the daily usage rollups and the weekly quota counters from '
+        'reservations. Run once after deploying the counters, then periodically '
+        '(e.g. nightly with --days 2) to pick up bulk updates that skip signals'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Only rebuild the last N days, whole weeks for the counters (default: everything)')
+
+    def handle(self, *args, **options):
+        start_date = None
+        if options['days'] is not None:
+            start_date = timezone.localdate() - timedelta(days=options['days'])
+        rebuild_rollups(start_date=start_date)
+        scope = f'since {start_date}' if start_date else 'for all time'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt usage rollups {scope}'))
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('equipment', '0002_alter_equipmentcategory_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentDailyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('reservation_count', models.IntegerField(default=0)),
+                ('reserved_hours', models.FloatField(default=0)),
+                ('equipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_usage', to='equipment.equipment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='equipment_usage_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('equipment', 'date'), name='equipment_daily_usage_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserDailyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('reservation_count', models.IntegerField(default=0)),
+                ('reserved_hours', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='user_usage_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='user_daily_usage_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_export_job'),
+        ('equipment', '0007_equipment_status_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserEquipmentWeeklyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week', models.DateField()),
+                ('reservation_count', models.IntegerField(default=0)),
+                ('reserved_hours', models.FloatField(default=0)),
+                ('equipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_usage', to='equipment.equipment')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['equipment', 'week'], name='weekly_usage_equipment_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'equipment', 'week'), name='user_equipment_weekly_usage_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.core.files.storage import storages
+from django.db import models
+from users.models import User
+from equipment.models import Equipment
+
+class EquipmentDailyUsage(models.Model):
+    """
+    Per equipment, per day rollup of reservations (day of start_time, local time)
+    Maintained incrementally from reservation signals
+    """
+    equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE, related_name='daily_usage')
+    date = models.DateField()
+    reservation_count = models.IntegerField(default=0)
+    reserved_hours = models.FloatField(default=0)
+    
+    def __str__(self):
+        return f"{self.equipment_id} - {self.date}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['equipment', 'date'], name='equipment_daily_usage_unique'),
+        ]
+        indexes = [models.Index(fields=['date'], name='equipment_usage_date_idx')]
+
+class UserDailyUsage(models.Model):
+    """
+    Per user, per day rollup of reservations (day of start_time, local time)
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_usage')
+    date = models.DateField()
+    reservation_count = models.IntegerField(default=0)
+    reserved_hours = models.FloatField(default=0)
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.date}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='user_daily_usage_unique'),
+        ]
+        indexes = [models.Index(fields=['date'], name='user_usage_date_idx')]
+
+class UserEquipmentWeeklyUsage(models.Model):
+    """
+    Per user, per equipment, per week rollup (week of start_time, starting
+    Monday, local time); the counters behind quota checks
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='weekly_usage')
+    equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE, related_name='weekly_usage')
+    week = models.DateField()  # Monday
+    reservation_count = models.IntegerField(default=0)
+    reserved_hours = models.FloatField(default=0)
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.equipment_id} - {self.week}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'equipment', 'week'], name='user_equipment_weekly_usage_unique'),
+        ]
+        # Department quotas: every member's hours on an item in a week
+        indexes = [models.Index(fields=['equipment', 'week'], name='weekly_usage_equipment_idx')]
+
+def export_storage():
+    """
+    Storage of export files; must be shared (e.g. S3) when the web service and
+    the process_exports worker do not share a disk
+    """
+    return storages[getattr(settings, 'EXPORT_STORAGE', 'default')]
+
+class ExportJob(models.Model):
+    """
+    Export too large for a streamed response, written to a file by the
+    process_exports worker and downloaded once done
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('ndjson', 'Newline-delimited JSON'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    dataset = models.CharField(max_length=30)  # Key of analytics.exports.DATASETS
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    filters = models.JSONField(default=dict, blank=True)  # Filter parameters, as in the list views
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    row_count = models.PositiveIntegerField(blank=True, null=True)
+    file = models.FileField(upload_to='exports/', storage=export_storage, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(blank=True, null=True)  # Claim lease, expired leases are retaken
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.dataset}.{self.format} ({self.status})"
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # A user's recent exports
+            models.Index(fields=['user', '-created_at'], name='export_user_recent_idx'),
+            # Worker claims: unfinished jobs, oldest first
+            models.Index(fields=['created_at'], name='export_queue_idx',
+                         condition=models.Q(status__in=['pending', 'running'])),
+        ]
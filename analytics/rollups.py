@@ -0,0 +1,129 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from reservations.models import Reservation
+from .models import EquipmentDailyUsage, UserDailyUsage, UserEquipmentWeeklyUsage
+
+# Reservations that count towards usage (cancelled and no-show slots do not)
+COUNTED_STATUSES = ['pending', 'confirmed', 'active', 'completed']
+
+# Columns a rollup needs from a reservation
+ROLLUP_FIELDS = ['equipment_id', 'user_id', 'start_time', 'end_time', 'status']
+
+
+def week_start(day):
+    """
+    Monday of the week of a date
+    """
+    return day - timedelta(days=day.weekday())
+
+
+def apply_to_rollups(rows, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) reservations from the rollup tables
+    rows are dicts with ROLLUP_FIELDS, grouped so each bucket is one UPDATE
+    """
+    equipment_buckets = defaultdict(lambda: [0, 0.0])
+    user_buckets = defaultdict(lambda: [0, 0.0])
+    weekly_buckets = defaultdict(lambda: [0, 0.0])
+    for row in rows:
+        if row['status'] not in COUNTED_STATUSES:
+            continue
+        day = timezone.localdate(row['start_time'])
+        hours = (row['end_time'] - row['start_time']).total_seconds() / 3600
+        for bucket in (equipment_buckets[(row['equipment_id'], day)],
+                       user_buckets[(row['user_id'], day)],
+                       weekly_buckets[(row['user_id'], row['equipment_id'], week_start(day))]):
+            bucket[0] += sign
+            bucket[1] += sign * hours
+
+    for (equipment_id, day), (count, hours) in equipment_buckets.items():
+        _bump(EquipmentDailyUsage, {'equipment_id': equipment_id, 'date': day}, count, hours)
+    for (user_id, day), (count, hours) in user_buckets.items():
+        _bump(UserDailyUsage, {'user_id': user_id, 'date': day}, count, hours)
+    for (user_id, equipment_id, week), (count, hours) in weekly_buckets.items():
+        _bump(UserEquipmentWeeklyUsage, {'user_id': user_id, 'equipment_id': equipment_id, 'week': week}, count, hours)
+
+
+def _bump(model, key, count, hours):
+    """
+    Atomic increment of one rollup row, creating it on first use
+    """
+    def update():
+        return model.objects.filter(**key).update(
+            reservation_count=F('reservation_count') + count,
+            reserved_hours=F('reserved_hours') + hours,
+        )
+
+    if update():
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, reservation_count=count, reserved_hours=hours)
+    except IntegrityError:
+        update()  # Another request created the row first
+
+
+def rebuild_rollups(start_date=None, end_date=None):
+    """
+    Recompute the rollup tables from Reservation for [start_date, end_date]
+    (whole weeks for the weekly counters)
+    Used by the rebuild_analytics command to repair drift from bulk updates
+    """
+    reservations = Reservation.objects.filter(status__in=COUNTED_STATUSES)
+    equipment_rows = EquipmentDailyUsage.objects.all()
+    user_rows = UserDailyUsage.objects.all()
+    weekly_rows = UserEquipmentWeeklyUsage.objects.all()
+    tz = timezone.get_current_timezone()
+    daily = weekly = reservations
+    if start_date:
+        daily = daily.filter(start_time__date__gte=start_date)
+        weekly = weekly.filter(start_time__date__gte=week_start(start_date))
+        equipment_rows = equipment_rows.filter(date__gte=start_date)
+        user_rows = user_rows.filter(date__gte=start_date)
+        weekly_rows = weekly_rows.filter(week__gte=week_start(start_date))
+    if end_date:
+        daily = daily.filter(start_time__date__lte=end_date)
+        weekly = weekly.filter(start_time__date__lt=week_start(end_date) + timedelta(days=7))
+        equipment_rows = equipment_rows.filter(date__lte=end_date)
+        user_rows = user_rows.filter(date__lte=end_date)
+        weekly_rows = weekly_rows.filter(week__lte=week_start(end_date))
+
+    duration = ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())
+
+    def aggregate(queryset, *keys):
+        buckets = queryset.annotate(day=TruncDate('start_time', tzinfo=tz)).order_by()
+        for row in buckets.values(*keys, 'day').annotate(count=Count('id'), total=Sum(duration)):
+            yield (*[row[key] for key in keys], row['day'], row['count'], row['total'].total_seconds() / 3600)
+
+    # Days add up to weeks in Python, the rows are per user, item and day
+    weeks = defaultdict(lambda: [0, 0.0])
+    for user_id, equipment_id, day, count, hours in aggregate(weekly, 'user_id', 'equipment_id'):
+        bucket = weeks[(user_id, equipment_id, week_start(day))]
+        bucket[0] += count
+        bucket[1] += hours
+
+    with transaction.atomic():
+        equipment_rows.delete()
+        user_rows.delete()
+        weekly_rows.delete()
+        EquipmentDailyUsage.objects.bulk_create(
+            (EquipmentDailyUsage(equipment_id=key, date=day, reservation_count=count, reserved_hours=hours)
+             for key, day, count, hours in aggregate(daily, 'equipment_id')),
+            batch_size=1000,
+        )
+        UserDailyUsage.objects.bulk_create(
+            (UserDailyUsage(user_id=key, date=day, reservation_count=count, reserved_hours=hours)
+             for key, day, count, hours in aggregate(daily, 'user_id')),
+            batch_size=1000,
+        )
+        UserEquipmentWeeklyUsage.objects.bulk_create(
+            (UserEquipmentWeeklyUsage(user_id=user_id, equipment_id=equipment_id, week=week,
+                                      reservation_count=count, reserved_hours=hours)
+             for (user_id, equipment_id, week), (count, hours) in weeks.items()),
+            batch_size=1000,
+        )
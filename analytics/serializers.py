@@ -0,0 +1,22 @@
+from django.urls import reverse
+from rest_framework import serializers
+from .models import ExportJob
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """
+    Background export and, once done, where to download it
+    """
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'dataset', 'format', 'filters', 'status', 'row_count', 'last_error',
+                 'created_at', 'finished_at', 'download_url']
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != 'done':
+            return None
+        path = reverse('analytics-export-download', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(path) if request else path
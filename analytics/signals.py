@@ -0,0 +1,62 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from reservations.models import Reservation
+from reservations.signals import reservations_bulk_created, reservations_rescheduled, reservations_status_changed
+from .rollups import COUNTED_STATUSES, ROLLUP_FIELDS, apply_to_rollups
+
+
+def _as_row(reservation):
+    return {field: getattr(reservation, field) for field in ROLLUP_FIELDS}
+
+
+@receiver(pre_save, sender=Reservation)
+def remember_previous_usage(sender, instance, **kwargs):
+    """
+    Keep the stored values so post_save can move usage between buckets
+    """
+    instance._previous_usage = None
+    if instance.pk:
+        instance._previous_usage = Reservation.objects.filter(pk=instance.pk).values(*ROLLUP_FIELDS).first()
+
+
+@receiver(post_save, sender=Reservation)
+def update_usage_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_usage', None)
+    current = _as_row(instance)
+    if previous == current:
+        return
+    if previous:
+        apply_to_rollups([previous], sign=-1)
+    apply_to_rollups([current])
+
+
+@receiver(post_delete, sender=Reservation)
+def update_usage_on_delete(sender, instance, origin=None, **kwargs):
+    # Cascades from a deleted user/equipment also delete their rollup rows,
+    # so only deletes that start from reservations are applied here
+    if isinstance(origin, Reservation) or getattr(origin, 'model', None) is Reservation:
+        apply_to_rollups([_as_row(instance)], sign=-1)
+
+
+@receiver(reservations_bulk_created)
+def update_usage_on_bulk_create(sender, reservations, **kwargs):
+    apply_to_rollups([_as_row(reservation) for reservation in reservations])
+
+
+@receiver(reservations_status_changed)
+def update_usage_on_status_change(sender, rows, old_status, new_status, **kwargs):
+    # Only moves into or out of the counted statuses change the usage
+    if (old_status in COUNTED_STATUSES) == (new_status in COUNTED_STATUSES):
+        return
+    status, sign = (old_status, -1) if old_status in COUNTED_STATUSES else (new_status, 1)
+    apply_to_rollups([{**row, 'status': status} for row in rows], sign=sign)
+
+
+@receiver(reservations_rescheduled)
+def update_usage_on_reschedule(sender, rows, **kwargs):
+    previous = [
+        {**row, 'start_time': row['previous_start_time'], 'end_time': row['previous_end_time']}
+        for row in rows
+    ]
+    apply_to_rollups(previous, sign=-1)
+    apply_to_rollups(rows)
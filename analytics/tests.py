@@ -0,0 +1,218 @@
+import asyncio
+import csv
+import io
+import json
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from equipment.models import Equipment, EquipmentCategory
+from users.models import User
+from reservations.models import Reservation
+from users.authentication import issue_tokens
+from .exports import export_chunks, process_export
+from .models import EquipmentDailyUsage, ExportJob, UserDailyUsage, UserEquipmentWeeklyUsage
+from .rollups import rebuild_rollups
+
+
+class UsageRollupTests(TestCase):
+    """
+    Rollups follow reservation changes and match a full rebuild
+    """
+    def setUp(self):
+        category = EquipmentCategory.objects.create(name='Microscopy')
+        self.equipment = Equipment.objects.create(
+            name='SEM', description='', category=category, location='Lab 1'
+        )
+        self.user = User.objects.create_user(username='student', password='pass')
+        self.start = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    def reserve(self, hours=2, **kwargs):
+        return Reservation.objects.create(
+            user=self.user, equipment=self.equipment,
+            start_time=self.start, end_time=self.start + timedelta(hours=hours), **kwargs
+        )
+
+    def snapshot(self):
+        return (
+            sorted(EquipmentDailyUsage.objects.values_list('equipment_id', 'date', 'reservation_count', 'reserved_hours')),
+            sorted(UserDailyUsage.objects.values_list('user_id', 'date', 'reservation_count', 'reserved_hours')),
+            sorted(UserEquipmentWeeklyUsage.objects.values_list(
+                'user_id', 'equipment_id', 'week', 'reservation_count', 'reserved_hours'
+            )),
+        )
+
+    def test_save_cancel_and_delete_update_rollups(self):
+        reservation = self.reserve()
+        self.reserve(hours=1)
+        usage = EquipmentDailyUsage.objects.get()
+        self.assertEqual((usage.reservation_count, usage.reserved_hours), (2, 3.0))
+
+        reservation.status = 'cancelled'
+        reservation.save()
+        usage.refresh_from_db()
+        self.assertEqual((usage.reservation_count, usage.reserved_hours), (1, 1.0))
+
+        Reservation.objects.filter(status='pending').delete()
+        usage.refresh_from_db()
+        self.assertEqual((usage.reservation_count, usage.reserved_hours), (0, 0.0))
+
+    def test_incremental_rollups_match_rebuild(self):
+        self.reserve()
+        moved = self.reserve(hours=3)
+        # Into another week, so the weekly counters move too
+        moved.start_time += timedelta(days=9)
+        moved.end_time += timedelta(days=9)
+        moved.save()
+        incremental = self.snapshot()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_dashboard_reads_rollups(self):
+        self.reserve(hours=4)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('analytics-dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_reservations'], 1)
+        self.assertEqual(response.data['equipment_utilization'][0]['total_hours'], 4.0)
+        self.assertEqual(response.data['user_activity'][0]['user_name'], 'student')
+        self.assertEqual(len(response.data['monthly_stats']), 6)
+
+    def test_dashboard_window_ends_today(self):
+        self.reserve(hours=4)
+        self.start += timedelta(days=7)
+        self.reserve(hours=8)  # Upcoming bookings are not utilization yet
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('analytics-dashboard'), {'days': 7})
+        self.assertEqual(response.data['equipment_utilization'][0]['total_hours'], 4.0)
+        self.assertEqual(response.data['user_activity'][0]['total_hours'], 4.0)
+
+
+class ExportTests(TestCase):
+    """
+    Streamed and background exports share the list view filters
+    """
+    def setUp(self):
+        category = EquipmentCategory.objects.create(name='Microscopy')
+        self.equipment = Equipment.objects.create(
+            name='SEM', description='', category=category, location='Lab 1'
+        )
+        self.manager = User.objects.create_user(username='manager', password='pass', role='lab_manager')
+        self.student = User.objects.create_user(username='student', password='pass', role='student')
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        for i, status in enumerate(['confirmed', 'cancelled', 'confirmed']):
+            Reservation.objects.create(
+                user=self.student, equipment=self.equipment, status=status,
+                start_time=start + timedelta(hours=2 * i), end_time=start + timedelta(hours=2 * i + 1),
+                purpose='=HYPERLINK("x")' if i == 0 else 'Imaging',
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_stream_applies_filters(self):
+        response = self.client.get(
+            reverse('analytics-export', args=['reservations', 'csv']), {'status': 'confirmed'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(self.content(response))))
+        self.assertEqual([row['status'] for row in rows], ['confirmed', 'confirmed'])
+        self.assertEqual(rows[0]['purpose'], "'=HYPERLINK(\"x\")")  # Not run as a formula
+        self.assertEqual(rows[0]['username'], 'student')
+
+    def test_ndjson_stream_and_list_view_agree(self):
+        response = self.client.get(reverse('analytics-export', args=['reservations', 'ndjson']), {'status': 'cancelled'})
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        listed = self.client.get(reverse('all-reservations'), {'status': 'cancelled'}).data['results']
+        self.assertEqual([row['id'] for row in rows], [row['id'] for row in listed])
+
+    async def test_stream_under_asgi_sends_rows_as_they_are_read(self):
+        events = []
+
+        def recording_chunks(*args, **kwargs):
+            for piece in export_chunks(*args, **kwargs):
+                events.append('read')
+                yield piece
+
+        requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def receive():
+            if requests:
+                return requests.pop()
+            await asyncio.Event().wait()  # The client never disconnects
+
+        body = []
+
+        async def send(message):
+            if message['type'] == 'http.response.body' and message.get('body'):
+                events.append('sent')
+                body.append(message['body'])
+
+        token = await sync_to_async(lambda: str(issue_tokens(self.manager).access_token))()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': reverse('analytics-export', args=['reservations', 'ndjson']), 'query_string': b'',
+            'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {token}'.encode())],
+            'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+        }
+        # One row per piece and per trip to the view's thread
+        with patch('analytics.views.export_chunks', recording_chunks), patch('analytics.exports.LINES_PER_WRITE', 1), \
+                patch('reservation_system.async_views.STREAM_PIECE_BYTES', 1):
+            # The test client's way of keeping the test transaction's connection open
+            request_started.disconnect(close_old_connections)
+            request_finished.disconnect(close_old_connections)
+            try:
+                await ASGIHandler()(scope, receive, send)
+            finally:
+                request_started.connect(close_old_connections)
+                request_finished.connect(close_old_connections)
+
+        self.assertEqual(len(b''.join(body).decode().splitlines()), 3)
+        # The first rows went out before the last one was read
+        self.assertLess(events.index('sent'), len(events) - 1 - events[::-1].index('read'))
+
+    def test_invalid_requests(self):
+        url = reverse('analytics-export', args=['reservations', 'csv'])
+        self.assertEqual(self.client.get(url, {'status': 'lost'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('analytics-export', args=['secrets', 'csv'])).status_code, 400)
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_background_export(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            response = self.client.post(reverse('analytics-exports'), {
+                'dataset': 'reservations', 'format': 'csv', 'filters': {'status': ['confirmed']},
+            }, format='json')
+            self.assertEqual(response.status_code, 202)
+            self.assertIsNone(response.data['download_url'])
+            job_id = response.data['id']
+
+            process_export()
+            self.assertIsNone(process_export())  # Queue drained
+            detail = self.client.get(reverse('analytics-export-detail', args=[job_id])).data
+            self.assertEqual((detail['status'], detail['row_count']), ('done', 2))
+
+            download = self.client.get(reverse('analytics-export-download', args=[job_id]))
+            self.assertEqual(download.status_code, 200)
+            streamed = self.client.get(
+                reverse('analytics-export', args=['reservations', 'csv']), {'status': 'confirmed'}
+            )
+            self.assertEqual(b''.join(download.streaming_content).decode(), self.content(streamed))
+            ExportJob.objects.get().file.delete(save=False)
+
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get(reverse('analytics-export-detail', args=[job_id])).status_code, 404)
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('dashboard/', views.dashboard, name='analytics-dashboard'),
+    path('export/<str:dataset>.<str:fmt>', views.export_stream, name='analytics-export'),
+    path('exports/', views.export_jobs, name='analytics-exports'),
+    path('exports/<int:pk>/', views.export_job_detail, name='analytics-export-detail'),
+    path('exports/<int:pk>/download/', views.export_job_download, name='analytics-export-download'),
+]
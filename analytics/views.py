@@ -0,0 +1,174 @@
+from datetime import timedelta
+
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.http import FileResponse
+from django.utils import timezone
+from reservation_system.async_views import streaming_response
+from reservations.models import Reservation, BLOCKING_STATUSES
+from .exports import FORMATS, ExportError, create_export_job, export_chunks, export_filename, export_queryset
+from .models import EquipmentDailyUsage, ExportJob, UserDailyUsage
+from .serializers import ExportJobSerializer
+
+# Background exports listed per user
+RECENT_EXPORTS = 20
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def dashboard(request):
+    """
+    Dashboard analytics (AnalyticsData in the frontend)
+    Everything except the live "active" count is read from the daily rollups
+    ?days= controls the utilization/activity window (default 30)
+    """
+    try:
+        days = int(request.query_params.get('days', 30))
+    except ValueError:
+        days = 0
+    if not 1 <= days <= 366:
+        return Response({'error': 'days must be between 1 and 366'}, status=status.HTTP_400_BAD_REQUEST)
+
+    today = timezone.localdate()
+    window_start = today - timedelta(days=days - 1)
+    window_hours = days * 24
+
+    now = timezone.now()
+    active_reservations = Reservation.objects.filter(
+        status__in=BLOCKING_STATUSES, start_time__lte=now, end_time__gt=now
+    ).count()
+
+    total_reservations = EquipmentDailyUsage.objects.aggregate(
+        total=Sum('reservation_count')
+    )['total'] or 0
+
+    equipment_utilization = [
+        {
+            'equipment_name': row['equipment__name'],
+            'utilization_rate': round(min(row['hours'] / window_hours * 100, 100), 1),
+            'total_hours': round(row['hours'], 1),
+        }
+        for row in EquipmentDailyUsage.objects.filter(date__gte=window_start, date__lte=today)
+        .values('equipment_id', 'equipment__name')
+        .annotate(hours=Sum('reserved_hours'))
+        .filter(hours__gt=0)
+        .order_by('-hours')[:10]
+    ]
+
+    # Last six calendar months, including months without reservations
+    year, month_index = divmod(today.year * 12 + today.month - 1 - 5, 12)
+    first_month = today.replace(year=year, month=month_index + 1, day=1)
+    monthly = {
+        row['month']: row
+        for row in EquipmentDailyUsage.objects.filter(date__gte=first_month)
+        .annotate(month=TruncMonth('date'))
+        .values('month')
+        .annotate(reservations=Sum('reservation_count'), hours=Sum('reserved_hours'))
+    }
+    monthly_stats = []
+    month = first_month
+    while month <= today:
+        row = monthly.get(month, {})
+        monthly_stats.append({
+            'month': month.strftime('%b'),
+            'reservations': row.get('reservations') or 0,
+            'hours': round(row.get('hours') or 0, 1),
+        })
+        month = (month + timedelta(days=32)).replace(day=1)
+
+    # Regular users only see their own activity
+    user_rows = UserDailyUsage.objects.filter(date__gte=window_start, date__lte=today)
+    if request.user.role not in ['super_admin', 'lab_manager']:
+        user_rows = user_rows.filter(user=request.user)
+    user_activity = [
+        {
+            'user_name': row['user__username'],
+            'reservation_count': row['reservation_count'],
+            'total_hours': round(row['hours'], 1),
+        }
+        for row in user_rows.values('user_id', 'user__username')
+        .annotate(reservation_count=Sum('reservation_count'), hours=Sum('reserved_hours'))
+        .filter(reservation_count__gt=0)
+        .order_by('-reservation_count')[:10]
+    ]
+
+    return Response({
+        'total_reservations': total_reservations,
+        'active_reservations': active_reservations,
+        'equipment_utilization': equipment_utilization,
+        'monthly_stats': monthly_stats,
+        'user_activity': user_activity,
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_stream(request, dataset, fmt):
+    """
+    Stream a dataset (reservations, maintenance, equipment_usage, user_usage)
+    as CSV or NDJSON, filtered with the list view parameters
+    Rows are read in chunks and written as they come (also under ASGI), for
+    exports that fit a request; larger ones go through a background export
+    """
+    if request.user.role not in ['super_admin', 'lab_manager']:
+        return Response({'error': 'Only lab managers and admins can export data'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        queryset = export_queryset(dataset, fmt, request.query_params)
+    except ExportError as error:
+        return Response({'error': error.errors}, status=status.HTTP_400_BAD_REQUEST)
+    response = streaming_response(request, export_chunks(dataset, fmt, queryset), content_type=FORMATS[fmt][0])
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(dataset, fmt)}"'
+    return response
+
+@api_view(['GET', 'POST'])
+@permission_classes([permissions.IsAuthenticated])
+def export_jobs(request):
+    """
+    GET: the requesting user's recent background exports
+    POST {"dataset", "format", "filters"}: queue one for the process_exports worker
+    """
+    if request.user.role not in ['super_admin', 'lab_manager']:
+        return Response({'error': 'Only lab managers and admins can export data'}, status=status.HTTP_403_FORBIDDEN)
+    if request.method == 'GET':
+        jobs = ExportJob.objects.filter(user_id=request.user.pk)[:RECENT_EXPORTS]
+        return Response(ExportJobSerializer(jobs, many=True, context={'request': request}).data)
+
+    filters = request.data.get('filters') or {}
+    if not isinstance(filters, dict):
+        return Response({'error': {'filters': ['Must be an object of filter parameters.']}},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        job = create_export_job(
+            request.user, request.data.get('dataset', ''), request.data.get('format', 'csv'), filters
+        )
+    except ExportError as error:
+        return Response({'error': error.errors}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(ExportJobSerializer(job, context={'request': request}).data, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_job_detail(request, pk):
+    """
+    Progress of one of the requesting user's exports
+    """
+    job = ExportJob.objects.filter(pk=pk, user_id=request.user.pk).first()
+    if job is None:
+        return Response({'error': 'Export not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(ExportJobSerializer(job, context={'request': request}).data)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_job_download(request, pk):
+    """
+    File of a finished export, streamed from the export storage
+    """
+    job = ExportJob.objects.filter(pk=pk, user_id=request.user.pk).first()
+    if job is None:
+        return Response({'error': 'Export not found'}, status=status.HTTP_404_NOT_FOUND)
+    if job.status != 'done' or not job.file:
+        return Response({'error': f'Export is {job.status}'}, status=status.HTTP_409_CONFLICT)
+    return FileResponse(
+        job.file.open('rb'), as_attachment=True,
+        filename=f'{job.dataset}-{job.pk}.{FORMATS[job.format][1]}', content_type=FORMATS[job.format][0],
+    )
@@ -22,3 +22,5 @@ else:
 # Apply any outstanding database migrations
 python manage.py migrate
 
+# Backfill the equipment search documents and specification values
+python manage.py rebuild_search_index
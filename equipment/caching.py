@@ -0,0 +1,93 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+# Version keys: bumping one makes every cached response built on it unreachable
+CATALOG_VERSION = 'equipment:catalog:version'  # Any list of equipment or categories
+
+
+def equipment_version_key(equipment_id):
+    return f'equipment:{equipment_id}:version'  # One equipment detail response
+
+
+def get_versions(keys):
+    """
+    Current value of each version key, starting unknown ones at a fresh value
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*keys):
+    """
+    Invalidate every cached response that depends on these keys
+    """
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted or never set: a fresh value cannot collide with old entries
+            cache.set(key, time.time_ns(), None)
+
+
+class CachedResponseMixin:
+    """
+    Cache successful GET responses of a generic view with ETag/Last-Modified
+    Views list the version keys they depend on in get_cache_versions(), so
+    invalidation is a counter bump (see equipment/signals.py), never a scan.
+    Responses do not depend on the user, only on the URL and versions.
+    """
+    cache_timeout = None  # Defaults to settings.EQUIPMENT_CACHE_TIMEOUT
+
+    def get_cache_versions(self):
+        return [CATALOG_VERSION]
+
+    def get_last_modified(self):
+        """
+        Timestamp for Last-Modified, computed only when the cache is cold
+        """
+        return None
+
+    def get(self, request, *args, **kwargs):
+        version_keys = self.get_cache_versions()
+        versions = get_versions(version_keys)
+        raw_key = f'{request.get_full_path()}|{versions}'
+        cache_key = 'equipment:response:' + hashlib.md5(raw_key.encode()).hexdigest()
+
+        entry = cache.get(cache_key)
+        if entry is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            last_modified = self.get_last_modified()
+            entry = {
+                'data': response.data,
+                'etag': f'"{cache_key.rsplit(":", 1)[1]}"',
+                'last_modified': last_modified.timestamp() if last_modified else None,
+            }
+            timeout = self.cache_timeout or getattr(settings, 'EQUIPMENT_CACHE_TIMEOUT', 300)
+            cache.set(cache_key, entry, timeout)
+
+        response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        if entry['last_modified'] is not None:
+            response['Last-Modified'] = http_date(entry['last_modified'])
+        # Clients may keep a copy but must revalidate (cheap 304s)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+
+        return get_conditional_response(
+            request._request,
+            etag=entry['etag'],
+            last_modified=entry['last_modified'] and int(entry['last_modified']),
+            response=response,
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from equipment.models import Equipment
+from equipment.search import update_index
+from equipment.specs import update_spec_values
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the equipment full-text search documents and specification values'
+
+    def handle(self, *args, **options):
+        ids = list(Equipment.objects.values_list('pk', flat=True))
+        for start in range(0, len(ids), 1000):
+            update_index(ids[start:start + 1000])
+        for equipment in Equipment.objects.only('pk', 'specifications').iterator(chunk_size=1000):
+            update_spec_values(equipment)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {len(ids)} equipment items'))
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0002_alter_equipmentcategory_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentSearchDocument',
+            fields=[
+                ('equipment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='equipment.equipment')),
+                ('title', models.TextField()),
+                ('body', models.TextField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,87 @@
+from django.db import OperationalError, migrations
+
+POSTGRES_SQL = [
+    """
+    ALTER TABLE equipment_equipmentsearchdocument
+        ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(body, '')), 'B')
+        ) STORED
+    """,
+    "CREATE INDEX equipment_search_vector_idx ON equipment_equipmentsearchdocument USING gin (search_vector)",
+]
+
+POSTGRES_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS equipment_search_vector_idx",
+    "ALTER TABLE equipment_equipmentsearchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+# External-content FTS5 table kept in sync with the document table by triggers
+SQLITE_SQL = [
+    """
+    CREATE VIRTUAL TABLE equipment_search_fts USING fts5(
+        title, body,
+        content='equipment_equipmentsearchdocument', content_rowid='equipment_id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER equipment_search_ai AFTER INSERT ON equipment_equipmentsearchdocument BEGIN
+        INSERT INTO equipment_search_fts(rowid, title, body) VALUES (new.equipment_id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER equipment_search_ad AFTER DELETE ON equipment_equipmentsearchdocument BEGIN
+        INSERT INTO equipment_search_fts(equipment_search_fts, rowid, title, body)
+            VALUES ('delete', old.equipment_id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER equipment_search_au AFTER UPDATE ON equipment_equipmentsearchdocument BEGIN
+        INSERT INTO equipment_search_fts(equipment_search_fts, rowid, title, body)
+            VALUES ('delete', old.equipment_id, old.title, old.body);
+        INSERT INTO equipment_search_fts(rowid, title, body) VALUES (new.equipment_id, new.title, new.body);
+    END
+    """,
+]
+
+SQLITE_REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS equipment_search_au",
+    "DROP TRIGGER IF EXISTS equipment_search_ad",
+    "DROP TRIGGER IF EXISTS equipment_search_ai",
+    "DROP TABLE IF EXISTS equipment_search_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        statements = POSTGRES_SQL
+    elif vendor == 'sqlite':
+        statements = SQLITE_SQL
+    else:
+        return  # Other databases fall back to plain LIKE matching
+    try:
+        schema_editor.execute(statements[0])
+    except OperationalError:
+        return  # SQLite built without FTS5, search falls back to LIKE matching
+    for statement in statements[1:]:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'postgresql': POSTGRES_REVERSE_SQL, 'sqlite': SQLITE_REVERSE_SQL}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0003_equipmentsearchdocument'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentSpecValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200)),
+                ('text_value', models.CharField(max_length=255)),
+                ('numeric_value', models.FloatField(blank=True, null=True)),
+                ('equipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spec_values', to='equipment.equipment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key', 'numeric_value'], name='spec_key_number_idx'), models.Index(fields=['key', 'text_value'], name='spec_key_text_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def create_gin_index(apps, schema_editor):
+    # Key presence on top-level specification keys (? operator) uses this on PostgreSQL
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX equipment_specifications_gin ON equipment_equipment USING gin (specifications)"
+        )
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS equipment_specifications_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0005_equipmentspecvalue'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_gin_index, drop_gin_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0006_specifications_gin'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['status'], name='equipment_status_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def drop_gin_index(apps, schema_editor):
+    # Key presence is answered from EquipmentSpecValue on every backend now,
+    # nothing queries the JSON column with the ? operator
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS equipment_specifications_gin")
+
+
+def create_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX equipment_specifications_gin ON equipment_equipment USING gin (specifications)"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0007_equipment_status_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_gin_index, create_gin_index),
+    ]
@@ -24,6 +24,8 @@ class Equipment(models.Model):
     category = models.ForeignKey(EquipmentCategory, on_delete=models.CASCADE)
     specifications = models.JSONField(default=dict, blank=True)  # Store technical specs
     location = models.CharField(max_length=100)
+    # Derived from reservations and maintenance windows and kept current by
+    # signals (see status.py); only 'out_of_service' is set by hand
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='available')
     
     # Images
@@ -46,4 +48,42 @@ class Equipment(models.Model):
         return self.name
     
     class Meta:
-        verbose_name_plural = "Equipment"
\ No newline at end of file
+        verbose_name_plural = "Equipment"
+        indexes = [
+            # ?status= filter of the equipment list, active items only
+            models.Index(fields=['status'], name='equipment_status_idx', condition=models.Q(is_active=True)),
+        ]
+
+class EquipmentSearchDocument(models.Model):
+    """
+    Flattened text of one equipment item for full-text search
+    Backed by a weighted tsvector + GIN index on PostgreSQL and an FTS5 table
+    on SQLite (see migration 0003 and equipment/search.py)
+    """
+    equipment = models.OneToOneField(Equipment, on_delete=models.CASCADE, primary_key=True,
+                                     related_name='search_document')
+    title = models.TextField()  # Equipment name, ranked highest
+    body = models.TextField()   # Description, location, category and specifications
+    
+    def __str__(self):
+        return self.title
+
+
+class EquipmentSpecValue(models.Model):
+    """
+    One flattened specification entry of an equipment item ('gpu.memory' -> '48GB')
+    Denormalized from Equipment.specifications so spec filters are index lookups
+    """
+    equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE, related_name='spec_values')
+    key = models.CharField(max_length=200)          # Lowercase dotted path
+    text_value = models.CharField(max_length=255)   # Lowercase text of the value
+    numeric_value = models.FloatField(blank=True, null=True)  # Leading number, if any ('48GB' -> 48)
+    
+    def __str__(self):
+        return f"{self.key}={self.text_value}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'numeric_value'], name='spec_key_number_idx'),
+            models.Index(fields=['key', 'text_value'], name='spec_key_text_idx'),
+        ]
@@ -0,0 +1,112 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+from .models import Equipment, EquipmentSearchDocument
+
+# Cap on query terms so a pasted paragraph cannot build a huge query
+MAX_TERMS = 8
+
+
+def flatten_specifications(value, prefix=''):
+    """
+    Yield 'key value' strings for nested specification dicts/lists
+    """
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten_specifications(item, f'{prefix}{key} ')
+    elif isinstance(value, list):
+        for item in value:
+            yield from flatten_specifications(item, prefix)
+    elif value is not None:
+        yield f'{prefix}{value}'
+
+
+def build_document(equipment):
+    """
+    Search document for one equipment item (category must be loaded)
+    """
+    body = [equipment.description, equipment.location, equipment.category.name]
+    body += flatten_specifications(equipment.specifications or {})
+    return EquipmentSearchDocument(equipment_id=equipment.pk, title=equipment.name, body='\n'.join(body))
+
+
+def update_index(equipment_ids):
+    """
+    (Re)build the search documents of these equipment items with one upsert
+    """
+    documents = [
+        build_document(equipment)
+        for equipment in Equipment.objects.filter(pk__in=equipment_ids).select_related('category')
+    ]
+    EquipmentSearchDocument.objects.bulk_create(
+        documents, batch_size=500,
+        update_conflicts=True, unique_fields=['equipment'], update_fields=['title', 'body'],
+    )
+
+
+def _search_backend():
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite' and 'equipment_search_fts' in connection.introspection.table_names():
+        return 'fts5'
+    return 'basic'
+
+
+def search_terms(text):
+    return re.findall(r'\w+', text.lower())[:MAX_TERMS]
+
+
+def search_equipment(queryset, text):
+    """
+    Filter an Equipment queryset to matches of `text`, best matches first
+    Every term must match, the last one as a prefix (search-as-you-type)
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+    backend = _search_backend()
+
+    if backend == 'postgresql':
+        tsquery = ' & '.join(terms) + ':*'
+        matches = RawSQL(
+            "SELECT equipment_id FROM equipment_equipmentsearchdocument "
+            "WHERE search_vector @@ to_tsquery('english', %s)", [tsquery]
+        )
+        rank = RawSQL(
+            "SELECT ts_rank(search_vector, to_tsquery('english', %s)) "
+            "FROM equipment_equipmentsearchdocument WHERE equipment_id = equipment_equipment.id",
+            [tsquery], output_field=FloatField()
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank).order_by('-search_rank', 'id')
+
+    if backend == 'fts5':
+        fts_query = ' '.join(f'"{term}"' for term in terms) + '*'
+        matches = RawSQL("SELECT rowid FROM equipment_search_fts WHERE equipment_search_fts MATCH %s", [fts_query])
+        # bm25 is lower-is-better; the name column weighs ten times the rest
+        rank = RawSQL(
+            "SELECT -bm25(equipment_search_fts, 10.0, 1.0) FROM equipment_search_fts "
+            "WHERE equipment_search_fts MATCH %s AND rowid = equipment_equipment.id",
+            [fts_query], output_field=FloatField()
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank).order_by('-search_rank', 'id')
+
+    # No full-text support: plain substring matching on the documents
+    condition = Q()
+    for term in terms:
+        condition &= Q(search_document__title__icontains=term) | Q(search_document__body__icontains=term)
+    return queryset.filter(condition)
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    ?search= over name, description, location, category and specifications,
+    ranked by relevance
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        return search_equipment(queryset, text)
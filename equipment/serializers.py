@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import EquipmentCategory, Equipment
+from reservation_system.serializers import DynamicFieldsMixin
 
 class EquipmentCategorySerializer(serializers.ModelSerializer):
     """
@@ -10,12 +11,13 @@ class EquipmentCategorySerializer(serializers.ModelSerializer):
         model = EquipmentCategory
         fields = ['id', 'name', 'description']  # Only expose these fields via API
 
-class EquipmentSerializer(serializers.ModelSerializer):
+class EquipmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for Equipment model with extra computed fields
     """
     category_name = serializers.CharField(source='category.name', read_only=True)
     # ^ This creates a computed field that shows the category name instead of just ID
+    status = serializers.SerializerMethodField()
     
     class Meta:
         model = Equipment
@@ -23,4 +25,8 @@ class EquipmentSerializer(serializers.ModelSerializer):
                  'specifications', 'location', 'status', 'image', 
                  'max_reservation_hours', 'requires_training', 'is_active',
                  'last_maintenance', 'next_maintenance', 'created_at']
-        read_only_fields = ['id', 'created_at']  # These are auto-generated
\ No newline at end of file
+        read_only_fields = ['id', 'created_at']  # These are auto-generated
+
+    def get_status(self, obj):
+        # Live value when the queryset was annotated (status.with_live_status)
+        return getattr(obj, 'live_status', obj.status)
\ No newline at end of file
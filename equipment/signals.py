@@ -0,0 +1,117 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from reservations.maintenance import refresh_maintenance_dates
+from reservations.models import MaintenanceLog, Reservation
+from reservations.signals import reservations_bulk_created, reservations_rescheduled, reservations_status_changed
+from reservation_system.events import equipment_channel, publish_on_commit
+from .caching import CATALOG_VERSION, bump_versions, equipment_version_key
+from .models import Equipment, EquipmentCategory
+from .search import update_index
+from .status import MANUAL_STATUSES, refresh_status
+from .specs import update_spec_values
+
+
+@receiver(post_save, sender=Equipment)
+@receiver(post_delete, sender=Equipment)
+def invalidate_equipment(sender, instance, **kwargs):
+    bump_versions(CATALOG_VERSION, equipment_version_key(instance.pk))
+
+
+@receiver(post_save, sender=EquipmentCategory)
+@receiver(post_delete, sender=EquipmentCategory)
+def invalidate_category(sender, instance, **kwargs):
+    # Equipment responses embed the category name
+    equipment_ids = Equipment.objects.filter(category_id=instance.pk).values_list('pk', flat=True)
+    bump_versions(CATALOG_VERSION, *[equipment_version_key(pk) for pk in equipment_ids])
+
+
+@receiver(post_init, sender=Reservation)
+def remember_loaded_status(sender, instance, **kwargs):
+    # __dict__ so a deferred status is not fetched just for this
+    instance._loaded_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Reservation)
+def invalidate_on_status_change(sender, instance, created, **kwargs):
+    if created or instance.status != instance._loaded_status:
+        bump_versions(CATALOG_VERSION, equipment_version_key(instance.equipment_id))
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=Reservation)
+def invalidate_on_delete(sender, instance, **kwargs):
+    bump_versions(CATALOG_VERSION, equipment_version_key(instance.equipment_id))
+
+
+@receiver(reservations_bulk_created)
+def invalidate_on_bulk_create(sender, reservations, **kwargs):
+    equipment_ids = {reservation.equipment_id for reservation in reservations}
+    bump_versions(CATALOG_VERSION, *[equipment_version_key(pk) for pk in equipment_ids])
+
+
+@receiver(reservations_status_changed)
+@receiver(reservations_rescheduled)
+def invalidate_on_status_sweep(sender, rows, **kwargs):
+    equipment_ids = {row['equipment_id'] for row in rows}
+    bump_versions(CATALOG_VERSION, *[equipment_version_key(pk) for pk in equipment_ids])
+
+
+@receiver(post_init, sender=Equipment)
+def remember_equipment_status(sender, instance, **kwargs):
+    instance._status_on_load = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Equipment)
+def publish_status_change(sender, instance, created, **kwargs):
+    if not created and instance.status != instance._status_on_load:
+        publish_on_commit(equipment_channel(instance.pk), 'equipment.status', {
+            'equipment_id': instance.pk,
+            'status': instance.status,
+        })
+    instance._status_on_load = instance.status
+
+
+@receiver(post_save, sender=Equipment)
+def index_equipment(sender, instance, **kwargs):
+    update_index([instance.pk])
+    update_spec_values(instance)
+
+
+@receiver(post_save, sender=EquipmentCategory)
+def index_category_equipment(sender, instance, **kwargs):
+    update_index(Equipment.objects.filter(category_id=instance.pk).values_list('pk', flat=True))
+
+
+# Equipment.status follows reservations and maintenance (see status.py); the
+# advance_reservations sweep catches windows that open or close with no write
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+@receiver(post_save, sender=MaintenanceLog)
+@receiver(post_delete, sender=MaintenanceLog)
+def refresh_equipment_status(sender, instance, **kwargs):
+    refresh_status([instance.equipment_id])
+
+
+@receiver(post_save, sender=MaintenanceLog)
+@receiver(post_delete, sender=MaintenanceLog)
+def refresh_equipment_maintenance_dates(sender, instance, **kwargs):
+    refresh_maintenance_dates([instance.equipment_id])
+
+
+@receiver(reservations_bulk_created)
+def refresh_status_on_bulk_create(sender, reservations, **kwargs):
+    refresh_status({reservation.equipment_id for reservation in reservations})
+
+
+@receiver(reservations_status_changed)
+@receiver(reservations_rescheduled)
+def refresh_status_on_sweep(sender, rows, **kwargs):
+    refresh_status({row['equipment_id'] for row in rows})
+
+
+@receiver(post_save, sender=Equipment)
+def derive_saved_status(sender, instance, created, **kwargs):
+    # A hand-set status other than out of service is replaced by the live one
+    if instance.status not in MANUAL_STATUSES:
+        refresh_status([instance.pk])
@@ -0,0 +1,115 @@
+import re
+
+from django.db import transaction
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from .models import EquipmentSpecValue
+
+NUMBER = re.compile(r'^\s*(-?\d+(?:\.\d+)?)')
+
+# 'gpu.memory>=48GB', 'vendor=Zeiss' or just 'cryo' (key presence)
+CLAUSE = re.compile(r'^\s*(?P<key>[^<>=!?]+?)\s*(?:(?P<op><=|>=|=|<|>)\s*(?P<value>.+?))?\s*\??\s*$')
+
+RANGE_LOOKUPS = {'<': 'lt', '<=': 'lte', '>': 'gt', '>=': 'gte'}
+
+MAX_CLAUSES = 10
+
+
+def normalize_key(key):
+    return ' '.join(str(key).lower().split())
+
+
+def parse_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = NUMBER.match(str(value))
+    return float(match.group(1)) if match else None
+
+
+def spec_items(value, prefix=''):
+    """
+    Yield (dotted key, value) for nested specification dicts and lists
+    """
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from spec_items(item, f'{prefix}{normalize_key(key)}.')
+    elif isinstance(value, list):
+        for item in value:
+            yield from spec_items(item, prefix)
+    elif value is not None and prefix:
+        yield prefix[:-1], value
+
+
+def update_spec_values(equipment):
+    """
+    Replace the denormalized spec rows of one equipment item
+    """
+    rows = [
+        EquipmentSpecValue(
+            equipment_id=equipment.pk,
+            key=key[:200],
+            text_value=str(value).lower()[:255],
+            numeric_value=parse_number(value),
+        )
+        for key, value in spec_items(equipment.specifications or {})
+    ]
+    with transaction.atomic():
+        EquipmentSpecValue.objects.filter(equipment_id=equipment.pk).delete()
+        EquipmentSpecValue.objects.bulk_create(rows)
+
+
+def parse_clause(text):
+    """
+    (key, operator, value) for one ?spec= clause; operator is None for presence
+    """
+    match = CLAUSE.match(text)
+    if not match:
+        raise ValidationError({'spec': f'Invalid specification filter "{text}"'})
+    key, operator, value = normalize_key(match['key']), match['op'], match['value']
+    if operator in RANGE_LOOKUPS and parse_number(value) is None:
+        raise ValidationError({'spec': f'"{text}" compares with {operator} so it needs a number'})
+    return key, operator, value
+
+
+def filter_by_specifications(queryset, clauses):
+    """
+    Narrow an Equipment queryset with parsed spec clauses
+    Each clause is an indexed lookup on EquipmentSpecValue (key + value),
+    so keys match case-insensitively on every backend
+    """
+    for key, operator, value in clauses:
+        if operator is None:
+            # Present with a value, directly or nested under the key
+            rows = EquipmentSpecValue.objects.filter(Q(key=key) | Q(key__startswith=f'{key}.'))
+        else:
+            rows = EquipmentSpecValue.objects.filter(key=key)
+        if operator in RANGE_LOOKUPS:
+            rows = rows.filter(**{f'numeric_value__{RANGE_LOOKUPS[operator]}': parse_number(value)})
+        elif operator == '=':
+            number = parse_number(value)
+            if number is not None and NUMBER.sub('', value).strip() == '':
+                rows = rows.filter(numeric_value=number)  # '48' matches 48, '48GB', '48.0'
+            else:
+                rows = rows.filter(text_value=value.lower())
+        queryset = queryset.filter(id__in=rows.values('equipment_id'))
+    return queryset
+
+
+class SpecificationFilter(BaseFilterBackend):
+    """
+    ?spec=resolution<=1&spec=gpu.memory>=48&spec=vendor=Zeiss&spec=cryo
+    Numeric comparisons use the leading number of the stored value, so
+    '48GB' and 48 both compare as 48 (units are not converted)
+    """
+    spec_param = 'spec'
+
+    def filter_queryset(self, request, queryset, view):
+        texts = [text for text in request.query_params.getlist(self.spec_param) if text.strip()]
+        if not texts:
+            return queryset
+        if len(texts) > MAX_CLAUSES:
+            raise ValidationError({'spec': f'At most {MAX_CLAUSES} specification filters'})
+        return filter_by_specifications(queryset, [parse_clause(text) for text in texts])
@@ -0,0 +1,63 @@
+from django.db.models import Case, CharField, Exists, F, OuterRef, Value, When
+from django.utils import timezone
+from reservations.models import MaintenanceLog, Reservation
+from reservation_system.events import equipment_channel, publish_batch_on_commit
+from .caching import CATALOG_VERSION, bump_versions, equipment_version_key
+from .models import Equipment
+
+# Reservations that occupy the equipment while their slot is running
+OCCUPYING_STATUSES = ['confirmed', 'active']
+
+# Set by hand and never derived: the item stays out until someone puts it back
+MANUAL_STATUSES = ['out_of_service']
+
+
+def with_live_status(queryset, now=None):
+    """
+    Annotate `live_status`, the status at `now` from open maintenance windows
+    and running reservations, with two EXISTS subqueries (no extra queries)
+    """
+    now = now or timezone.now()
+    in_maintenance = MaintenanceLog.objects.filter(
+        equipment=OuterRef('pk'), start_date__lte=now, end_date__gt=now
+    )
+    reserved = Reservation.objects.filter(
+        equipment=OuterRef('pk'), status__in=OCCUPYING_STATUSES, start_time__lte=now, end_time__gt=now
+    )
+    return queryset.annotate(live_status=Case(
+        When(status__in=MANUAL_STATUSES, then=F('status')),
+        When(Exists(in_maintenance), then=Value('maintenance')),
+        When(Exists(reserved), then=Value('reserved')),
+        default=Value('available'),
+        output_field=CharField(),
+    ))
+
+
+def refresh_status(equipment_ids=None, now=None):
+    """
+    Store the live status in Equipment.status for the given items (all when
+    None): one SELECT of the rows that drifted, one UPDATE per new status
+    Returns the number of items whose status changed
+    """
+    now = now or timezone.now()
+    queryset = Equipment.objects.exclude(status__in=MANUAL_STATUSES)
+    if equipment_ids is not None:
+        queryset = queryset.filter(pk__in=list(equipment_ids))
+    drifted = with_live_status(queryset, now).exclude(status=F('live_status'))
+
+    changed = {}
+    for pk, live_status in drifted.values_list('pk', 'live_status'):
+        changed.setdefault(live_status, []).append(pk)
+    if not changed:
+        return 0
+
+    for live_status, ids in changed.items():
+        Equipment.objects.filter(pk__in=ids).update(status=live_status, updated_at=timezone.now())
+    # update() skips post_save, so invalidate and announce here
+    ids = [pk for group in changed.values() for pk in group]
+    bump_versions(CATALOG_VERSION, *[equipment_version_key(pk) for pk in ids])
+    publish_batch_on_commit([
+        (equipment_channel(pk), 'equipment.status', {'equipment_id': pk, 'status': live_status})
+        for live_status, group in changed.items() for pk in group
+    ])
+    return len(ids)
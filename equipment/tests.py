@@ -1,3 +1,205 @@
+from datetime import timedelta
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from reservations.models import MaintenanceLog, Reservation
+from users.models import User
+from .models import Equipment, EquipmentCategory
+from .status import refresh_status
+
+
+class EquipmentCacheTests(TestCase):
+    """
+    Equipment read endpoints are cached, revalidated and invalidated on change
+    """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='student', password='pass'))
+        self.category = EquipmentCategory.objects.create(name='Microscopy')
+        self.equipment = Equipment.objects.create(
+            name='SEM', description='', category=self.category, location='Lab 1'
+        )
+
+    def test_cached_hit_does_not_touch_the_database(self):
+        url = reverse('equipment-list')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data['results'][0]['name'], 'SEM')
+
+    def test_etag_and_last_modified_give_304(self):
+        url = reverse('equipment-detail', args=[self.equipment.id])
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_equipment_change_invalidates_list_and_detail(self):
+        list_url = reverse('equipment-list')
+        detail_url = reverse('equipment-detail', args=[self.equipment.id])
+        etag = self.client.get(detail_url)['ETag']
+        self.client.get(list_url)
+
+        self.equipment.name = 'TEM'
+        self.equipment.save()
+
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'TEM')
+        self.assertEqual(self.client.get(list_url).data['results'][0]['name'], 'TEM')
+
+    def test_category_rename_invalidates_its_equipment(self):
+        detail_url = reverse('equipment-detail', args=[self.equipment.id])
+        self.client.get(detail_url)
+        self.category.name = 'Electron Microscopy'
+        self.category.save()
+        self.assertEqual(self.client.get(detail_url).data['category_name'], 'Electron Microscopy')
+        self.assertEqual(self.client.get(reverse('equipment-categories')).data[0]['name'], 'Electron Microscopy')
+
+
+class EquipmentSearchTests(TestCase):
+    """
+    Full-text search covers every indexed field and ranks name matches first
+    """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='student', password='pass'))
+        self.category = EquipmentCategory.objects.create(name='Microscopy')
+
+    def make(self, name, **kwargs):
+        kwargs.setdefault('description', '')
+        kwargs.setdefault('location', 'Lab 1')
+        return Equipment.objects.create(name=name, category=self.category, **kwargs)
+
+    def search(self, text):
+        response = self.client.get(reverse('equipment-list'), {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.data['results']]
+
+    def test_matches_specifications_category_and_prefixes(self):
+        self.make('Workstation', specifications={'gpu': {'model': 'A6000', 'memory': '48GB'}})
+        self.make('Confocal')
+        self.assertEqual(self.search('a6000'), ['Workstation'])
+        self.assertCountEqual(self.search('microsc'), ['Workstation', 'Confocal'])
+        self.assertEqual(self.search('nothing here'), [])
+
+    def test_name_matches_rank_first(self):
+        self.make('Plate reader', description='Reads plates, see also the electron microscope')
+        self.make('Electron microscope')
+        self.assertEqual(self.search('electron')[0], 'Electron microscope')
+
+    def test_index_follows_updates(self):
+        equipment = self.make('Old name')
+        equipment.name = 'Sputter coater'
+        equipment.save()
+        self.assertEqual(self.search('sputter'), ['Sputter coater'])
+        self.assertEqual(self.search('old'), [])
+
+
+class EquipmentSpecFilterTests(TestCase):
+    """
+    ?spec= filters on numeric ranges, equality and key presence
+    """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='student', password='pass'))
+        category = EquipmentCategory.objects.create(name='Compute')
+        for name, specs in [
+            ('A6000', {'gpu': {'memory': '48GB', 'vendor': 'NVIDIA'}, 'cuda': True}),
+            ('V100', {'gpu': {'memory': 16, 'vendor': 'NVIDIA'}}),
+            ('SEM', {'Resolution': '0.8 nm', 'Detector': None}),
+        ]:
+            Equipment.objects.create(name=name, description='', category=category,
+                                     location='Lab 1', specifications=specs)
+
+    def filter(self, *clauses):
+        return self.client.get(reverse('equipment-list'), {'spec': list(clauses)})
+
+    def names(self, *clauses):
+        response = self.filter(*clauses)
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['name'] for row in response.data['results'])
+
+    def test_numeric_ranges_use_leading_numbers(self):
+        self.assertEqual(self.names('gpu.memory>=48'), ['A6000'])
+        self.assertEqual(self.names('gpu.memory<48'), ['V100'])
+        self.assertEqual(self.names('resolution<=1nm'), ['SEM'])
+
+    def test_equality_presence_and_combination(self):
+        self.assertEqual(self.names('gpu.vendor=nvidia'), ['A6000', 'V100'])
+        self.assertEqual(self.names('cuda'), ['A6000'])
+        self.assertEqual(self.names('gpu.vendor=nvidia', 'gpu.memory=16'), ['V100'])
+
+    def test_presence_ignores_key_case_and_matches_nested_keys(self):
+        self.assertEqual(self.names('Resolution'), ['SEM'])
+        self.assertEqual(self.names('RESOLUTION'), ['SEM'])
+        self.assertEqual(self.names('gpu'), ['A6000', 'V100'])
+        self.assertEqual(self.names('gpu.mem'), [])  # Whole path segments only
+        self.assertEqual(self.names('detector'), [])  # Null values are not present
+
+    def test_invalid_filters_are_rejected(self):
+        self.assertEqual(self.filter('gpu.memory>=lots').status_code, 400)
+
+
+class EquipmentStatusTests(TestCase):
+    """
+    Equipment.status follows running reservations and maintenance windows
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='student', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = EquipmentCategory.objects.create(name='Microscopy')
+        self.sem, self.tem, self.afm = [
+            Equipment.objects.create(name=name, description='', category=category, location='Lab 1')
+            for name in ('SEM', 'TEM', 'AFM')
+        ]
+        self.now = timezone.now()
+
+    def statuses(self, **params):
+        response = self.client.get(reverse('equipment-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return {item['name']: item['status'] for item in response.data['results']}
+
+    def test_status_follows_reservations_and_maintenance(self):
+        reservation = Reservation.objects.create(
+            user=self.user, equipment=self.sem, status='confirmed',
+            start_time=self.now - timedelta(minutes=5), end_time=self.now + timedelta(hours=1),
+        )
+        MaintenanceLog.objects.create(
+            equipment=self.tem, maintenance_type='Calibration', description='', performed_by='tech',
+            start_date=self.now - timedelta(hours=1), end_date=self.now + timedelta(hours=1),
+        )
+        self.assertEqual(self.statuses(), {'SEM': 'reserved', 'TEM': 'maintenance', 'AFM': 'available'})
+        self.assertEqual(self.statuses(status='available'), {'AFM': 'available'})
+
+        reservation.status = 'cancelled'
+        reservation.save()
+        self.assertEqual(self.statuses(status='available'), {'SEM': 'available', 'AFM': 'available'})
+
+    def test_hand_edits_only_stick_for_out_of_service(self):
+        self.afm.status = 'maintenance'
+        self.afm.save()
+        self.afm.refresh_from_db()
+        self.assertEqual(self.afm.status, 'available')
+        self.afm.status = 'out_of_service'
+        self.afm.save()
+        self.assertEqual(self.statuses(status='out_of_service'), {'AFM': 'out_of_service'})
 
-# Create your tests here.
+    def test_refresh_catches_windows_that_opened_without_a_write(self):
+        Reservation.objects.create(
+            user=self.user, equipment=self.sem, status='confirmed',
+            start_time=self.now + timedelta(hours=1), end_time=self.now + timedelta(hours=2),
+        )
+        self.assertEqual(Equipment.objects.get(pk=self.sem.pk).status, 'available')
+        with self.assertNumQueries(2):  # One SELECT of the drifted rows, one UPDATE
+            self.assertEqual(refresh_status(now=self.now + timedelta(minutes=90)), 1)
+        self.assertEqual(Equipment.objects.get(pk=self.sem.pk).status, 'reserved')
@@ -1,8 +1,9 @@
 from django.urls import path
+from reservation_system.async_views import async_read_view
 from . import views
 
 urlpatterns = [
     path('categories/', views.EquipmentCategoryListView.as_view(), name='equipment-categories'),
-    path('equipment/', views.EquipmentListView.as_view(), name='equipment-list'),
+    path('equipment/', async_read_view(views.EquipmentListView.as_view()), name='equipment-list'),
     path('equipment/<int:pk>/', views.EquipmentDetailView.as_view(), name='equipment-detail'),
 ]
\ No newline at end of file
@@ -1,17 +1,24 @@
 from rest_framework import generics, permissions, filters
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db.models import Max
 from .models import EquipmentCategory, Equipment
 from .serializers import EquipmentCategorySerializer, EquipmentSerializer
+from .caching import CachedResponseMixin, equipment_version_key
+from .search import FullTextSearchFilter
+from .specs import SpecificationFilter
+from .status import with_live_status
+from reservation_system.pagination import RankedPagination
 
-class EquipmentCategoryListView(generics.ListAPIView):
+class EquipmentCategoryListView(CachedResponseMixin, generics.ListAPIView):
     """
     API endpoint to list all equipment categories
     """
     queryset = EquipmentCategory.objects.all()
     serializer_class = EquipmentCategorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None  # Small lookup table, always returned in full
 
-class EquipmentListView(generics.ListAPIView):
+class EquipmentListView(CachedResponseMixin, generics.ListAPIView):
     """
     API endpoint to list equipment with filtering, searching, and sorting
     """
@@ -19,16 +26,29 @@ class EquipmentListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     # Enable powerful filtering capabilities
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, SpecificationFilter, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'status', 'location']  # Filter by these fields
-    search_fields = ['name', 'description', 'location']    # Search in these fields
+    # ?spec=gpu.memory>=48 filters on specifications (see equipment/specs.py)
     ordering_fields = ['name', 'created_at']               # Sort by these fields
+    # ?search= is full-text over name, description, location, category and specs
+
+    @property
+    def paginator(self):
+        """
+        Search results are ordered by relevance, so they page by number
+        """
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('search') and not self.request.query_params.get('ordering'):
+                self._paginator = RankedPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_queryset(self):
         """
-        Custom queryset - only show active equipment
+        Custom queryset - only show active equipment, with its live status
         """
-        queryset = Equipment.objects.filter(is_active=True)
+        queryset = with_live_status(Equipment.objects.filter(is_active=True).select_related('category'))
         
         # Additional filtering by category if provided
         category_id = self.request.query_params.get('category', None)
@@ -37,10 +57,27 @@ class EquipmentListView(generics.ListAPIView):
             
         return queryset
 
-class EquipmentDetailView(generics.RetrieveAPIView):
+    def get_last_modified(self):
+        return self.filter_queryset(self.get_queryset()).aggregate(Max('updated_at'))['updated_at__max']
+
+class EquipmentDetailView(CachedResponseMixin, generics.RetrieveAPIView):
     """
     API endpoint to view details of a specific equipment item
     """
-    queryset = Equipment.objects.all()
     serializer_class = EquipmentSerializer
-    permission_classes = [permissions.IsAuthenticated]
\ No newline at end of file
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return with_live_status(Equipment.objects.select_related('category'))
+
+    def get_cache_versions(self):
+        # Only this item's changes invalidate its detail response
+        return [equipment_version_key(self.kwargs['pk'])]
+
+    def get_object(self):
+        if not hasattr(self, '_object'):
+            self._object = super().get_object()  # Reused for Last-Modified
+        return self._object
+
+    def get_last_modified(self):
+        return self.get_object().updated_at
\ No newline at end of file
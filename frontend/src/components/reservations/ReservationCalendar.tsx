@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import {
   Box,
   Typography,
@@ -17,7 +17,8 @@ import { DatePicker } from '@mui/x-date-pickers/DatePicker';
 import { LocalizationProvider } from '@mui/x-date-pickers/LocalizationProvider';
 import { AdapterDayjs } from '@mui/x-date-pickers/AdapterDayjs';
 import dayjs, { Dayjs } from 'dayjs';
-import { TimeSlot } from '../../types/reservation';
+import { MaintenanceWindow, Reservation, TimeSlot } from '../../types/reservation';
+import { reservationService } from '../../services/reservations';
 
 interface ReservationCalendarProps {
   equipmentId: number;
@@ -34,6 +35,46 @@ const ReservationCalendar: React.FC<ReservationCalendarProps> = ({
 }) => {
   const [selectedDate, setSelectedDate] = useState<Dayjs>(dayjs());
   const [selectedSlot, setSelectedSlot] = useState<TimeSlot | null>(null);
+  const [bookedReservations, setBookedReservations] = useState<Reservation[]>([]);
+  const [maintenanceWindows, setMaintenanceWindows] = useState<MaintenanceWindow[]>([]);
+  const [refreshKey, setRefreshKey] = useState(0);
+
+  // Load the day's reservations, again whenever the server pushes a change
+  useEffect(() => {
+    const dayStart = selectedDate.startOf('day').toISOString();
+    const dayEnd = selectedDate.endOf('day').toISOString();
+    reservationService
+      .checkAvailability(equipmentId, dayStart, dayEnd)
+      .then((response) => {
+        setBookedReservations(response.conflicting_reservations);
+        setMaintenanceWindows(response.conflicting_maintenance || []);
+      })
+      .catch(() => {
+        setBookedReservations([]);
+        setMaintenanceWindows([]);
+      });
+  }, [equipmentId, selectedDate, refreshKey]);
+
+  // Server-Sent Events instead of polling
+  useEffect(
+    () => reservationService.subscribeToAvailability([equipmentId], () => setRefreshKey((key) => key + 1)),
+    [equipmentId]
+  );
+
+  const reservedSlots: TimeSlot[] = [
+    ...existingReservations,
+    ...bookedReservations.map((reservation) => ({
+      start: new Date(reservation.start_time),
+      end: new Date(reservation.end_time),
+      available: false,
+      reservation,
+    })),
+    ...maintenanceWindows.map((window) => ({
+      start: new Date(window.start_time),
+      end: new Date(window.end_time),
+      available: false,
+    })),
+  ];
 
   // Generate time slots for the selected date (8 AM to 8 PM, 1-hour slots)
   const generateTimeSlots = (): TimeSlot[] => {
@@ -46,7 +87,7 @@ const ReservationCalendar: React.FC<ReservationCalendarProps> = ({
       const end = selectedDate.hour(hour + 1).minute(0).second(0);
 
       // Check if this slot conflicts with existing reservations
-      const conflictingReservation = existingReservations.find(reservation =>
+      const conflictingReservation = reservedSlots.find(reservation =>
         start.isBefore(reservation.end) && end.isAfter(reservation.start)
       );
 
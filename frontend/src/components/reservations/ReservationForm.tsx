@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import {
   Dialog,
   DialogTitle,
@@ -10,6 +10,8 @@ import {
   Typography,
   Alert,
   CircularProgress,
+  Chip,
+  Stack,
 } from '@mui/material';
 import { Equipment } from '../../types/equipment';
 import { TimeSlot, CreateReservationData } from '../../types/reservation';
@@ -38,10 +40,30 @@ const ReservationForm: React.FC<ReservationFormProps> = ({
   });
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
+  // Free alternatives offered when the chosen slot is taken, and the one picked
+  const [suggestions, setSuggestions] = useState<TimeSlot[]>([]);
+  const [chosenSlot, setChosenSlot] = useState<TimeSlot | null>(null);
+
+  useEffect(() => {
+    setChosenSlot(null);
+    setSuggestions([]);
+  }, [selectedSlot]);
+
+  const slot = chosenSlot || selectedSlot;
+
+  const loadSuggestions = async (taken: TimeSlot) => {
+    const hours = (taken.end.getTime() - taken.start.getTime()) / 3_600_000;
+    try {
+      const slots = await reservationService.suggestSlots(equipment.id, hours, taken.start.toISOString());
+      setSuggestions(slots.map((s) => ({ start: new Date(s.start_time), end: new Date(s.end_time), available: true })));
+    } catch {
+      setSuggestions([]);
+    }
+  };
 
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
-    if (!selectedSlot) return;
+    if (!slot) return;
 
     setLoading(true);
     setError('');
@@ -49,8 +71,8 @@ const ReservationForm: React.FC<ReservationFormProps> = ({
     try {
       const reservationData: CreateReservationData = {
         equipment: equipment.id,
-        start_time: selectedSlot.start.toISOString(),
-        end_time: selectedSlot.end.toISOString(),
+        start_time: slot.start.toISOString(),
+        end_time: slot.end.toISOString(),
         purpose: formData.purpose,
         is_recurring: formData.is_recurring,
         recurring_pattern: formData.is_recurring ? formData.recurring_pattern : undefined,
@@ -63,6 +85,9 @@ const ReservationForm: React.FC<ReservationFormProps> = ({
       setFormData({ purpose: '', is_recurring: false, recurring_pattern: '' });
     } catch (err: any) {
       setError(err.response?.data?.error || 'Failed to create reservation');
+      if (err.response?.status === 409) {
+        await loadSuggestions(slot);
+      }
     } finally {
       setLoading(false);
     }
@@ -71,10 +96,12 @@ const ReservationForm: React.FC<ReservationFormProps> = ({
   const handleClose = () => {
     onClose();
     setError('');
+    setSuggestions([]);
+    setChosenSlot(null);
     setFormData({ purpose: '', is_recurring: false, recurring_pattern: '' });
   };
 
-  if (!selectedSlot) return null;
+  if (!slot) return null;
 
   return (
     <Dialog open={open} onClose={handleClose} maxWidth="sm" fullWidth>
@@ -90,10 +117,10 @@ const ReservationForm: React.FC<ReservationFormProps> = ({
               Reservation Details
             </Typography>
             <Typography variant="body2" color="text.secondary">
-              <strong>Date:</strong> {dayjs(selectedSlot.start).format('MMMM D, YYYY')}
+              <strong>Date:</strong> {dayjs(slot.start).format('MMMM D, YYYY')}
             </Typography>
             <Typography variant="body2" color="text.secondary">
-              <strong>Time:</strong> {dayjs(selectedSlot.start).format('h:mm A')} - {dayjs(selectedSlot.end).format('h:mm A')}
+              <strong>Time:</strong> {dayjs(slot.start).format('h:mm A')} - {dayjs(slot.end).format('h:mm A')}
             </Typography>
             <Typography variant="body2" color="text.secondary">
               <strong>Location:</strong> {equipment.location}
@@ -106,6 +133,27 @@ const ReservationForm: React.FC<ReservationFormProps> = ({
             </Alert>
           )}
 
+          {suggestions.length > 0 && (
+            <Box sx={{ mb: 2 }}>
+              <Typography variant="body2" gutterBottom>
+                Free slots of the same length:
+              </Typography>
+              <Stack direction="row" spacing={1} useFlexGap flexWrap="wrap">
+                {suggestions.map((suggestion) => (
+                  <Chip
+                    key={suggestion.start.toISOString()}
+                    label={`${dayjs(suggestion.start).format('ddd D MMM, h:mm A')} - ${dayjs(suggestion.end).format('h:mm A')}`}
+                    onClick={() => {
+                      setChosenSlot(suggestion);
+                      setSuggestions([]);
+                      setError('');
+                    }}
+                  />
+                ))}
+              </Stack>
+            </Box>
+          )}
+
           {/* Purpose Field */}
           <TextField
             label="Purpose of Reservation"
@@ -58,6 +58,9 @@ export const authService = {
   },
 
   logout: () => {
+    // Revoke both tokens server side, logging out locally does not wait for it
+    const refresh = localStorage.getItem('refresh_token');
+    api.post('/auth/logout/', { refresh }).catch(() => {});
     localStorage.removeItem('access_token');
     localStorage.removeItem('refresh_token');
     localStorage.removeItem('user');
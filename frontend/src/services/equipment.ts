@@ -8,6 +8,7 @@ export const equipmentService = {
     status?: string;
     location?: string;
     search?: string;
+    spec?: string[];  // e.g. ['gpu.memory>=48', 'vendor=Zeiss']
   }): Promise<Equipment[]> => {
     const params = new URLSearchParams();
     
@@ -15,9 +16,10 @@ export const equipmentService = {
     if (filters?.status) params.append('status', filters.status);
     if (filters?.location) params.append('location', filters.location);
     if (filters?.search) params.append('search', filters.search);
+    filters?.spec?.forEach((clause) => params.append('spec', clause));
     
     const response = await api.get(`/equipment/?${params}`);
-    return response.data;
+    return response.data.results;  // List endpoints are cursor paginated
   },
 
   // Get equipment by ID
@@ -39,4 +41,20 @@ export const equipmentService = {
     );
     return response.data;
   },
+
+  // Free/busy intervals for many equipment items in one request
+  getBulkAvailability: async (
+    startTime: string,
+    endTime: string,
+    filters: { equipment?: number[]; category?: number | string; location?: string }
+  ) => {
+    const params = new URLSearchParams({ start_time: startTime, end_time: endTime });
+
+    if (filters.equipment?.length) params.append('equipment', filters.equipment.join(','));
+    if (filters.category) params.append('category', filters.category.toString());
+    if (filters.location) params.append('location', filters.location);
+
+    const response = await api.get(`/equipment/availability/?${params}`);
+    return response.data;
+  },
 };
\ No newline at end of file
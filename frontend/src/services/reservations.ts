@@ -1,16 +1,22 @@
-import { api } from './api';
-import { Reservation, CreateReservationData, AvailabilityResponse } from '../types/reservation';
+import { api, API_BASE_URL } from './api';
+import {
+  Reservation,
+  CreateReservationData,
+  AvailabilityResponse,
+  AvailabilityEvent,
+  SlotSuggestion,
+} from '../types/reservation';
 
 export const reservationService = {
   // Get all reservations for current user
   getReservations: async (): Promise<Reservation[]> => {
-    const response = await api.get('/reservations/');
-    return response.data;
+    const response = await api.get('/reservations/?expand=equipment_details');
+    return response.data.results;  // List endpoints are cursor paginated
   },
 
   getAllReservations: async () => {
-    const response = await api.get('/admin/reservations/'); // Matches your Django URL
-    return response.data;
+    const response = await api.get('/admin/reservations/?expand=equipment_details'); // Matches your Django URL
+    return response.data.results;
   },
 
   // Create a new reservation
@@ -44,4 +50,56 @@ export const reservationService = {
     );
     return response.data;
   },
-};
\ No newline at end of file
+
+  // Next free slots of the given length (hours) from `after` on
+  suggestSlots: async (equipmentId: number, durationHours: number, after: string, count = 5): Promise<SlotSuggestion[]> => {
+    const params = new URLSearchParams({ duration: String(durationHours), after, count: String(count) });
+    const response = await api.get(`/equipment/${equipmentId}/suggestions/?${params}`);
+    return response.data.slots;
+  },
+
+  // Live reservation/status changes for the given equipment; returns an unsubscribe function.
+  // EventSource cannot send headers, so a short-lived stream token goes in the query string;
+  // it is only valid on connect, so every reconnect fetches a new one
+  subscribeToAvailability: (equipmentIds: number[], onEvent: (event: AvailabilityEvent) => void): (() => void) => {
+    let source: EventSource | null = null;
+    let closed = false;
+    const eventTypes: AvailabilityEvent['event'][] = [
+      'reservation.created',
+      'reservation.updated',
+      'reservation.cancelled',
+      'reservation.deleted',
+      'equipment.status',
+      'resync',
+    ];
+    const reconnect = () => {
+      if (!closed) setTimeout(connect, 5000);
+    };
+    const connect = async () => {
+      let token: string;
+      try {
+        token = (await api.get('/equipment/events/token/')).data.stream_token;
+      } catch {
+        reconnect();
+        return;
+      }
+      if (closed) return;
+      const params = new URLSearchParams({ equipment: equipmentIds.join(','), stream_token: token });
+      source = new EventSource(`${API_BASE_URL}/equipment/events/?${params}`);
+      eventTypes.forEach((type) =>
+        source!.addEventListener(type, (message) =>
+          onEvent({ event: type, data: JSON.parse((message as MessageEvent).data) })
+        )
+      );
+      source.onerror = () => {
+        source?.close();
+        reconnect();
+      };
+    };
+    connect();
+    return () => {
+      closed = true;
+      source?.close();
+    };
+  },
+};
@@ -17,6 +17,8 @@ export interface Reservation {
   is_recurring: boolean;
   recurring_pattern: string;
   recurring_end_date: string | null;
+  recurring_exceptions: string[];
+  series: number | null;
   created_at: string;
 }
 
@@ -28,6 +30,7 @@ export interface CreateReservationData {
   is_recurring?: boolean;
   recurring_pattern?: string;
   recurring_end_date?: string;
+  recurring_exceptions?: string[];
 }
 
 export interface TimeSlot {
@@ -37,7 +40,39 @@ export interface TimeSlot {
   reservation?: Reservation;
 }
 
+export interface MaintenanceWindow {
+  id: number;
+  start_time: string;
+  end_time: string;
+  maintenance_type: string;
+}
+
+export interface SlotSuggestion {
+  start_time: string;
+  end_time: string;
+  equipment_id?: number;
+  equipment_name?: string;
+}
+
 export interface AvailabilityResponse {
   available: boolean;
   conflicting_reservations: Reservation[];
-}
\ No newline at end of file
+  conflicting_maintenance: MaintenanceWindow[];
+}
+// Pushed over /equipment/events/ (Server-Sent Events)
+export interface AvailabilityEvent {
+  event:
+    | 'reservation.created'
+    | 'reservation.updated'
+    | 'reservation.cancelled'
+    | 'reservation.deleted'
+    | 'equipment.status'
+    | 'resync';
+  data: {
+    equipment_id?: number;
+    reservation_id?: number;
+    start_time?: string;
+    end_time?: string;
+    status?: string;
+  };
+}
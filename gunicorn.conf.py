@@ -0,0 +1,44 @@
+"""
+Production server settings, picked up automatically by gunicorn:
+
+    gunicorn reservation_system.asgi:application
+
+Runs the ASGI app on uvicorn workers (async views, live event streams)
+Local development without gunicorn:
+
+    uvicorn reservation_system.asgi:application --reload
+"""
+import logging
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# The in-process event broker only reaches clients of its own worker, so
+# several workers need EVENT_BROKER_URL; one async worker already serves
+# many concurrent requests
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1 if os.getenv('EVENT_BROKER_URL') else 1))
+
+# Event streams stay open, uvicorn workers heartbeat independently of requests
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+
+class StripQueryString(logging.Filter):
+    """
+    Drops the query string from uvicorn access log lines: stream and
+    calendar feed URLs carry their tokens there
+    """
+    def filter(self, record):
+        # uvicorn.access args: client, method, path with query, HTTP version, status
+        if isinstance(record.args, tuple) and len(record.args) == 5:
+            client, method, path, version, status = record.args
+            record.args = (client, method, str(path).split('?', 1)[0], version, status)
+        return True
+
+
+def post_worker_init(worker):
+    logging.getLogger('uvicorn.access').addFilter(StripQueryString())
@@ -0,0 +1,99 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import StreamingHttpResponse
+
+READ_METHODS = ('GET', 'HEAD')
+
+# Text taken from a sync iterator per trip to its thread
+STREAM_PIECE_BYTES = 64 * 1024
+
+
+def _run_read(view, request, *args, **kwargs):
+    # Pool threads keep their own connections: drop broken ones and those
+    # past CONN_MAX_AGE around each request, as Django does for sync requests
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()  # DRF responses: serialize here, off the event loop
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """
+    Async version of a (DRF) view for ASGI servers
+    Under ASGI, Django runs every sync view and every async ORM query on one
+    shared thread per process, so a slow query holds up all others. Here
+    GET/HEAD run in the thread pool on their own database connection and
+    proceed side by side. Writes, and requests under WSGI (including the
+    test client), keep the default thread-sensitive path
+    Returns the view unchanged when settings.ASYNC_READ_VIEWS is off
+    """
+    if not getattr(settings, 'ASYNC_READ_VIEWS', True):
+        return view
+
+    read_view = sync_to_async(_run_read, thread_sensitive=False)
+    write_view = sync_to_async(view)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if isinstance(request, ASGIRequest) and request.method in READ_METHODS:
+            return await read_view(view, request, *args, **kwargs)
+        return await write_view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def _pull(iterator, size):
+    """
+    Join pieces of `iterator` until `size` characters; '' once it is exhausted
+    """
+    pieces, length = [], 0
+    for piece in iterator:
+        pieces.append(piece)
+        length += len(piece)
+        if length >= size:
+            break
+    return ''.join(pieces)
+
+
+def _close(iterator):
+    if hasattr(iterator, 'close'):
+        iterator.close()  # A generator left early releases its cursor here
+
+
+async def iterate_in_thread(iterable, size=None):
+    """
+    Async iterator over a sync iterator of text (e.g. one reading rows
+    with queryset.iterator()), advanced a piece at a time on the
+    thread-sensitive executor the sync views and their queries run on
+    """
+    iterator = iter(iterable)
+    size = size or STREAM_PIECE_BYTES
+    pull = sync_to_async(_pull)
+    try:
+        while True:
+            text = await pull(iterator, size)
+            if not text:
+                break
+            yield text
+    finally:
+        await sync_to_async(_close)(iterator)
+
+
+def streaming_response(request, iterable, **kwargs):
+    """
+    StreamingHttpResponse over a sync iterator that keeps streaming under ASGI
+    Django serves a sync iterator to an ASGI server by reading it into a
+    list first, so there the iterator is wrapped in iterate_in_thread;
+    under WSGI it is served as is
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        iterable = iterate_in_thread(iterable)
+    return StreamingHttpResponse(iterable, **kwargs)
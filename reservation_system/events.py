@@ -0,0 +1,196 @@
+import asyncio
+import itertools
+import json
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# Per-subscriber queue length; a client that falls this far behind gets a
+# "resync" event (reload everything) instead of unbounded memory growth
+QUEUE_SIZE = 256
+
+# Comment line sent when idle so proxies keep the connection open
+HEARTBEAT_SECONDS = 20
+
+_event_ids = itertools.count(1)
+
+
+def equipment_channel(equipment_id):
+    return f'equipment:{equipment_id}'
+
+
+class Subscription:
+    """
+    Events for a set of channels, used as `async with broker.subscribe(...)`
+    and read with `await subscription.get(timeout)`
+    """
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = channels
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.loop = None
+        self.overflowed = False
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        await self.broker.add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker.remove(self)
+
+    def put(self, event):
+        # Runs on the subscriber's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        """
+        Next event, a {'event': 'resync'} marker after dropped events, or
+        None when nothing arrived within `timeout` seconds
+        """
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return {'event': 'resync', 'data': {}}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessBroker:
+    """
+    Delivers events to the subscribers connected to this process only
+    Enough for a single ASGI worker; run several workers with RedisBroker
+    publish() is thread-safe, so sync views and signal handlers can call it
+    """
+    def __init__(self, **options):
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # channel -> set of Subscription
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                pass  # Loop already closed, the subscription is going away
+
+    def subscribe(self, channels):
+        return Subscription(self, channels)
+
+    async def add(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+
+    def remove(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscriptions.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[channel]
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Shares events between processes through Redis pub/sub
+    Each process keeps one pattern subscription to every channel and fans
+    the messages out to its local subscribers as the in-process broker does
+    """
+    def __init__(self, url=None, prefix='events', **options):
+        super().__init__()
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError as error:
+            raise ImproperlyConfigured('RedisBroker needs the redis package') from error
+        self.url = url or getattr(settings, 'EVENT_BROKER_URL', None)
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(self.url)
+        self._async_redis = redis.asyncio
+        self._listeners = {}  # event loop -> (pubsub, task)
+
+    def publish(self, channel, event):
+        self._client.publish(f'{self.prefix}:{channel}', json.dumps(event, cls=DjangoJSONEncoder))
+
+    async def add(self, subscription):
+        if subscription.loop not in self._listeners:
+            pubsub = self._async_redis.Redis.from_url(self.url).pubsub()
+            await pubsub.psubscribe(f'{self.prefix}:*')
+            self._listeners[subscription.loop] = (pubsub, subscription.loop.create_task(self._listen(pubsub)))
+        await super().add(subscription)
+
+    async def _listen(self, pubsub):
+        async for message in pubsub.listen():
+            if message['type'] == 'pmessage':
+                channel = message['channel'].decode().split(':', 1)[1]
+                InProcessBroker.publish(self, channel, json.loads(message['data']))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    The broker configured in settings.EVENT_BROKER (created once per process)
+    """
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = getattr(settings, 'EVENT_BROKER', {})
+                backend = import_string(config.get('BACKEND', 'reservation_system.events.InProcessBroker'))
+                _broker = backend(**config.get('OPTIONS', {}))
+    return _broker
+
+
+def publish_on_commit(channel, event, data):
+    """
+    Publish once the current transaction commits (right away outside one),
+    so subscribers never hear about rows that end up rolled back
+    """
+    payload = {'id': next(_event_ids), 'event': event, 'data': data}
+    transaction.on_commit(lambda: get_broker().publish(channel, payload))
+
+
+def publish_batch_on_commit(messages):
+    """
+    publish_on_commit() for many (channel, event, data) with one callback
+    """
+    payloads = [(channel, {'id': next(_event_ids), 'event': event, 'data': data})
+                for channel, event, data in messages]
+
+    def publish():
+        broker = get_broker()
+        for channel, payload in payloads:
+            broker.publish(channel, payload)
+
+    transaction.on_commit(publish)
+
+
+async def sse_stream(channels, heartbeat=HEARTBEAT_SECONDS):
+    """
+    Server-Sent Events body for a subscription, one idle coroutine per client
+    """
+    async with get_broker().subscribe(channels) as subscription:
+        yield 'retry: 5000\n\n'  # Browser reconnect delay (ms); subscribed from here on
+        while True:
+            event = await subscription.get(heartbeat)
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            data = json.dumps(event['data'], cls=DjangoJSONEncoder)
+            yield f"id: {event.get('id', '')}\nevent: {event['event']}\ndata: {data}\n\n"
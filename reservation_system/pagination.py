@@ -0,0 +1,23 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination shared by all list endpoints
+    Pages are ordered on (created_at, id) so each page is an indexed range
+    scan instead of an OFFSET that gets slower the deeper you go
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'  # Clients can ask for smaller/larger pages
+    max_page_size = 200
+
+
+class RankedPagination(PageNumberPagination):
+    """
+    Page numbers for relevance-ranked results (search), where there is no
+    stable column to build a cursor from
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from datetime import timedelta
+from importlib.util import find_spec
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,6 +40,7 @@ INSTALLED_APPS = [
     'users',
     'equipment',
     'reservations',
+    'analytics',
 ]
 
 MIDDLEWARE = [
@@ -82,6 +84,70 @@ DATABASES = {
     )
 }
 
+# Cache: local memory per process by default. Set CACHE_URL (e.g. redis://host:6379/0)
+# to share it between workers (needs the redis package); with local memory another
+# worker can serve a stale equipment response for up to EQUIPMENT_CACHE_TIMEOUT
+if os.getenv('CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'lab-reservation-cache',
+        }
+    }
+
+# Seconds a cached equipment/category response is kept (invalidated on change anyway)
+EQUIPMENT_CACHE_TIMEOUT = int(os.getenv('EQUIPMENT_CACHE_TIMEOUT', 300))
+
+# Serve the read-heavy endpoints (equipment list, reservation list, availability)
+# through async views that run their queries in a thread pool under ASGI
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'True') == 'True'
+
+# Live availability events (SSE at /api/equipment/events/). The in-process broker
+# only reaches clients of the same worker process; set EVENT_BROKER_URL
+# (redis://...) to share events between workers
+EVENT_BROKER_URL = os.getenv('EVENT_BROKER_URL')
+EVENT_BROKER = {
+    'BACKEND': 'reservation_system.events.RedisBroker' if EVENT_BROKER_URL
+    else 'reservation_system.events.InProcessBroker',
+}
+
+# Notification emails, sent by the process_notifications worker: SMTP when
+# EMAIL_HOST is set, otherwise printed to the worker's log
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend'
+                          if os.getenv('EMAIL_HOST') else 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'Lab Reservations <noreply@localhost>')
+NOTIFICATION_EMAIL_BATCH_SIZE = int(os.getenv('NOTIFICATION_EMAIL_BATCH_SIZE', 100))  # Messages per connection
+NOTIFICATION_REMINDER_HOURS = int(os.getenv('NOTIFICATION_REMINDER_HOURS', 24))
+
+# Reservation status sweeps (manage.py advance_reservations). With check-in
+# required, confirmed reservations nobody checked into become no_show after the
+# grace period; otherwise they turn active at their start time. Pending requests
+# nobody approved before their start are only cancelled with
+# RESERVATION_CANCEL_UNAPPROVED (off: bookings are created pending and approval
+# is not routine)
+RESERVATION_REQUIRE_CHECK_IN = os.getenv('RESERVATION_REQUIRE_CHECK_IN', 'False') == 'True'
+RESERVATION_CANCEL_UNAPPROVED = os.getenv('RESERVATION_CANCEL_UNAPPROVED', 'False') == 'True'
+RESERVATION_NO_SHOW_GRACE_MINUTES = int(os.getenv('RESERVATION_NO_SHOW_GRACE_MINUTES', 15))
+RESERVATION_CHECK_IN_EARLY_MINUTES = int(os.getenv('RESERVATION_CHECK_IN_EARLY_MINUTES', 15))
+
+# Background exports (POST /api/analytics/exports/), written by the process_exports
+# worker to this storage alias (see STORAGES). The web service serves the files, so
+# when the two run on separate machines this must be shared storage such as S3
+EXPORT_STORAGE = os.getenv('EXPORT_STORAGE', 'default')
+EXPORT_RETENTION_DAYS = int(os.getenv('EXPORT_RETENTION_DAYS', 7))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -98,22 +164,58 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing: PASSWORD_HASHER=argon2 (default when argon2-cffi is installed),
+# bcrypt or pbkdf2. Hashes from the other hashers keep working and are re-hashed
+# with the preferred one (and its current cost settings) on the next login
+PASSWORD_HASHER_CLASSES = {
+    'argon2': 'users.hashers.TunedArgon2PasswordHasher',
+    'bcrypt': 'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'pbkdf2': 'users.hashers.TunedPBKDF2PasswordHasher',
+}
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'argon2' if find_spec('argon2') else 'pbkdf2')
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+]
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 19456))  # KiB
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 1))
+PBKDF2_ITERATIONS = int(os.getenv('PBKDF2_ITERATIONS', 1_000_000))
+
+# Token buckets in front of login/register: (burst capacity, tokens refilled per second)
+AUTH_THROTTLE_BUCKETS = {
+    'login_ip': (300, 5.0),
+    'login_username': (10, 0.2),
+    'register_ip': (20, 0.1),
+}
+
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWT with role/approval claims, no users query per request
+        'users.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Keyset pagination on (created_at, id) for every list endpoint
+    'DEFAULT_PAGINATION_CLASS': 'reservation_system.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': 50,
+    # Proxies in front of the app (Render: its load balancer); client addresses
+    # for throttling are read that many hops from the end of X-Forwarded-For
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '1')),
 }
 
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.ClaimsTokenRefreshSerializer',
 }
 
+# Lifetime of the ?stream_token= of event stream URLs; only checked when a
+# stream (re)connects
+STREAM_TOKEN_LIFETIME = timedelta(minutes=5)
+
 # CORS Settings for Production
 CORS_ALLOWED_ORIGINS = [
     "https://your-frontend-app.vercel.app",  # Will update after deployment
@@ -0,0 +1,49 @@
+from rest_framework.permissions import SAFE_METHODS
+
+
+def split_param(value):
+    """
+    Turn a comma separated query parameter into a set of names
+    """
+    if not value:
+        return set()
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class DynamicFieldsMixin:
+    """
+    Lets clients shape GET responses through query parameters
+      ?fields=id,status           -> only return these fields
+      ?expand=equipment_details   -> include heavy nested fields (off by default)
+    Heavy nested fields are listed in Meta.expandable_fields
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return  # Writes and internal use always get the full serializer
+
+        requested = split_param(request.query_params.get('fields'))
+        expanded = self.get_expanded_fields(request)
+
+        allowed = set(self.fields)
+        if requested:
+            allowed &= requested
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if name not in expanded:
+                allowed.discard(name)
+
+        for name in set(self.fields) - allowed:
+            self.fields.pop(name)
+
+    @classmethod
+    def get_expanded_fields(cls, request):
+        """
+        Expandable fields the client asked for, through ?expand= or ?fields=
+        """
+        expandable = set(getattr(cls.Meta, 'expandable_fields', ()))
+        if request is None or request.method not in SAFE_METHODS:
+            return expandable
+        params = request.query_params
+        return expandable & (split_param(params.get('expand')) | split_param(params.get('fields')))
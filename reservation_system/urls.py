@@ -23,5 +23,6 @@ urlpatterns = [
     path('api/auth/', include('users.urls')),      # Include users app URLs
     path('api/', include('equipment.urls')),       # Include equipment app URLs  
     path('api/', include('reservations.urls')),    # Include reservations app URLs
+    path('api/analytics/', include('analytics.urls')),  # Dashboard analytics
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
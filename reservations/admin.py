@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Reservation, MaintenanceLog, Notification
+from .models import Reservation, MaintenanceLog, Notification, NotificationJob, QuotaPolicy, WaitlistEntry
 
 @admin.register(Reservation)
 class ReservationAdmin(admin.ModelAdmin):
@@ -15,4 +15,22 @@ class MaintenanceLogAdmin(admin.ModelAdmin):
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ('user', 'notification_type', 'title', 'is_read', 'created_at')
-    list_filter = ('notification_type', 'is_read')
\ No newline at end of file
+    list_filter = ('notification_type', 'is_read')
+
+@admin.register(NotificationJob)
+class NotificationJobAdmin(admin.ModelAdmin):
+    list_display = ('event', 'status', 'attempts', 'run_at', 'created_at')
+    list_filter = ('event', 'status')
+    readonly_fields = ('claimed_by', 'locked_until', 'last_error')
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'equipment', 'window_start', 'window_end', 'duration', 'priority', 'status')
+    list_filter = ('status', 'equipment')
+    readonly_fields = ('reservation',)
+
+@admin.register(QuotaPolicy)
+class QuotaPolicyAdmin(admin.ModelAdmin):
+    list_display = ('scope', 'user', 'role', 'department', 'equipment', 'category', 'hours_per_week', 'is_active')
+    list_filter = ('scope', 'is_active', 'role')
+    search_fields = ('user__username', 'department', 'equipment__name', 'category__name')
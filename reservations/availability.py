@@ -0,0 +1,63 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .conflicts import blocking_intervals
+
+
+def parse_time_range(params):
+    """
+    Read start_time/end_time query parameters as aware datetimes
+    Returns (start, end, error message)
+    """
+    start = parse_datetime(params.get('start_time') or '')
+    end = parse_datetime(params.get('end_time') or '')
+    if start is None or end is None:
+        return None, None, 'start_time and end_time parameters are required (ISO 8601)'
+    if timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    if timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    if end <= start:
+        return None, None, 'end_time must be after start_time'
+    return start, end, None
+
+
+def merge_intervals(intervals):
+    """
+    Merge sorted (start, end) pairs that overlap or touch
+    """
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+
+def free_intervals(busy, start, end):
+    """
+    Gaps between merged busy intervals inside [start, end)
+    """
+    free = []
+    cursor = start
+    for busy_start, busy_end in busy:
+        if busy_start > cursor:
+            free.append((cursor, busy_start))
+        cursor = max(cursor, busy_end)
+    if cursor < end:
+        free.append((cursor, end))
+    return free
+
+
+def busy_intervals(equipment_ids, start, end, exclude_ids=()):
+    """
+    Merged busy intervals (reservations and maintenance) per equipment inside
+    [start, end)
+    One query for the whole set, ordered so rows arrive grouped by equipment
+    """
+    busy = {equipment_id: [] for equipment_id in equipment_ids}
+    for block in blocking_intervals(equipment_ids, start, end, exclude_ids=exclude_ids):
+        busy[block.equipment_id].append((max(block.start_time, start), min(block.end_time, end)))
+
+    return {equipment_id: merge_intervals(intervals) for equipment_id, intervals in busy.items()}
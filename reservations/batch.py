@@ -0,0 +1,248 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from analytics.rollups import COUNTED_STATUSES
+from equipment.models import Equipment
+from .conflicts import (
+    OVERLAP_CONSTRAINT, ReservationConflict, deferred_overlap_check, lock_equipment_items,
+    windowed_blocking_intervals,
+)
+from .models import Reservation
+from .quotas import QuotaExceeded, check_quotas
+from .serializers import BatchReservationSerializer, BatchReservationUpdateSerializer
+from .signals import reservations_bulk_created, reservations_rescheduled, reservations_status_changed
+from .states import SWEEP_FIELDS, check_transition
+
+MAX_BATCH_ITEMS = 100
+
+# Reservations whose times and purpose a batch may still change
+EDITABLE_STATUSES = ['pending', 'confirmed']
+
+
+class BatchRejected(ValueError):
+    """
+    Nothing in a batch was written; items lists the failed entries as
+    {op, index, ...}. status_code is 409 when every failure is a conflict,
+    403 when it is a quota
+    """
+    def __init__(self, message, items=(), status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.items = list(items)
+        self.status_code = status_code
+
+
+def _pk(value, op):
+    """
+    Reservation id of an update (dict with id) or cancel (id) entry, or None
+    """
+    pk = value.get('id') if op == 'update' and isinstance(value, dict) else value
+    return pk if isinstance(pk, int) and not isinstance(pk, bool) else None
+
+
+def _position(error):
+    return error['op'], error['index']
+
+
+def _overlaps_within(intervals):
+    """
+    Errors for batch entries overlapping an earlier entry on the same equipment
+    intervals: (op, index, equipment_id, start, end)
+    """
+    errors, latest = [], {}
+    for op, index, equipment_id, start, end in sorted(intervals, key=lambda item: (item[2], item[3])):
+        previous = latest.get(equipment_id)
+        if previous and previous[4] > start:
+            errors.append({
+                'op': op, 'index': index, 'code': 'batch_overlap',
+                'error': f'Overlaps {previous[0]} entry {previous[1]} of this batch.',
+            })
+        if previous is None or end > previous[4]:
+            latest[equipment_id] = (op, index, equipment_id, start, end)
+    return errors
+
+
+def apply_batch(operations, user, context=None, now=None):
+    """
+    Create, update and cancel reservations all at once, or not at all
+    operations: {"create": [fields], "update": [{"id", fields}], "cancel": [ids]}
+    Every entry is validated first (existing rows and equipment loaded in
+    bulk), then the new intervals are checked under the equipment locks
+    with one grouped interval query and the creates and moves against the
+    weekly quotas, and the writes are one UPDATE per
+    cancelled status, one bulk_update and one bulk_create
+    Returns (created, updated, cancelled) reservations; raises BatchRejected
+    """
+    now = now or timezone.now()
+    context = context or {}
+    creates, updates, cancels = (operations.get(op) or [] for op in ('create', 'update', 'cancel'))
+    if not all(isinstance(values, list) for values in (creates, updates, cancels)):
+        raise BatchRejected('create, update and cancel must be lists')
+    if not creates and not updates and not cancels:
+        raise BatchRejected('The batch is empty')
+    if len(creates) + len(updates) + len(cancels) > MAX_BATCH_ITEMS:
+        raise BatchRejected(f'At most {MAX_BATCH_ITEMS} entries per batch')
+
+    errors = []
+    existing = Reservation.objects.select_related('user', 'equipment', 'equipment__category')
+    if user.role not in ['super_admin', 'lab_manager']:
+        existing = existing.filter(user_id=user.pk)
+    existing = existing.in_bulk(
+        [_pk(value, 'update') for value in updates] + [_pk(value, 'cancel') for value in cancels]
+    )
+
+    seen = set()
+    intervals, changed, cancelled = [], [], []
+    for op, values in (('update', updates), ('cancel', cancels)):
+        for index, value in enumerate(values):
+            pk = _pk(value, op)
+            if pk is None:
+                errors.append({'op': op, 'index': index, 'errors': {'id': ['A reservation id is required.']}})
+                continue
+            if pk not in existing:
+                errors.append({'op': op, 'index': index, 'errors': {'id': ['Reservation not found.']}})
+                continue
+            if pk in seen:
+                errors.append({'op': op, 'index': index, 'errors': {'id': ['Named twice in this batch.']}})
+                continue
+            seen.add(pk)
+            reservation = existing[pk]
+            if op == 'cancel':
+                error = check_transition(reservation, 'cancelled', user, now=now)
+                if error:
+                    errors.append({'op': op, 'index': index, 'errors': {'status': [error]}})
+                else:
+                    cancelled.append(reservation)
+                continue
+            if reservation.status not in EDITABLE_STATUSES:
+                errors.append({'op': op, 'index': index,
+                               'errors': {'status': [f'A {reservation.status} reservation cannot be changed.']}})
+                continue
+            serializer = BatchReservationUpdateSerializer(reservation, data=value, partial=True, context=context)
+            if not serializer.is_valid():
+                errors.append({'op': op, 'index': index, 'errors': serializer.errors})
+                continue
+            data = serializer.validated_data
+            start = data.get('start_time', reservation.start_time)
+            end = data.get('end_time', reservation.end_time)
+            changed.append((index, reservation, start, end, data.get('purpose', reservation.purpose)))
+            intervals.append((op, index, reservation.equipment, start, end))
+
+    new = []
+    for index, value in enumerate(creates):
+        serializer = BatchReservationSerializer(data=value, context=context)
+        if serializer.is_valid():
+            new.append((index, serializer.validated_data))
+        else:
+            errors.append({'op': 'create', 'index': index, 'errors': serializer.errors})
+    equipment = Equipment.objects.filter(is_active=True).select_related('category').in_bulk(
+        {data['equipment'] for _, data in new}
+    )
+    for index, data in new:
+        if data['equipment'] not in equipment:
+            errors.append({'op': 'create', 'index': index,
+                           'errors': {'equipment': ['No active equipment with this id.']}})
+        else:
+            intervals.append(('create', index, equipment[data['equipment']], data['start_time'], data['end_time']))
+
+    for op, index, item, start, end in intervals:
+        if end - start > timedelta(hours=item.max_reservation_hours):
+            errors.append({'op': op, 'index': index, 'errors': {
+                'end_time': [f'{item.name} can be reserved for at most {item.max_reservation_hours} hours.']
+            }})
+    if errors:
+        raise BatchRejected('No reservations were changed', sorted(errors, key=_position))
+
+    intervals = [(op, index, item.pk, start, end) for op, index, item, start, end in intervals]
+    windows = {}
+    for _, _, equipment_id, start, end in intervals:
+        window = windows.get(equipment_id, (start, end))
+        windows[equipment_id] = (min(window[0], start), max(window[1], end))
+
+    # The slots of the updated and cancelled rows are free for the batch
+    released = [reservation.pk for _, reservation, *_ in changed] + [reservation.pk for reservation in cancelled]
+    with transaction.atomic():
+        lock_equipment_items(list(windows))
+        blocks = windowed_blocking_intervals(windows, exclude_ids=released)
+        for op, index, equipment_id, start, end in intervals:
+            overlapping = [
+                block for block in blocks[equipment_id] if block.start_time < end and block.end_time > start
+            ]
+            if overlapping:
+                errors.append({'op': op, 'index': index, **ReservationConflict(overlapping[:10]).detail})
+        errors += _overlaps_within(intervals)
+        if errors:
+            raise BatchRejected('No reservations were changed', sorted(errors, key=_position), status_code=409)
+        # Creates and moves must fit the quotas, once the hours the moved
+        # and cancelled bookings held are given back
+        bookings = [('update', index, reservation.user, reservation.equipment, start, end)
+                    for index, reservation, start, end, _ in changed]
+        bookings += [('create', index, user, equipment[data['equipment']], data['start_time'], data['end_time'])
+                     for index, data in new]
+        released = [
+            (reservation.user, reservation.equipment, reservation.start_time, reservation.end_time)
+            for reservation in [reservation for _, reservation, *_ in changed] + cancelled
+            if reservation.status in COUNTED_STATUSES
+        ]
+        refused = check_quotas([booking[2:] for booking in bookings], released)
+        if refused:
+            raise BatchRejected('No reservations were changed', sorted([
+                {'op': bookings[position][0], 'index': bookings[position][1], **QuotaExceeded(message).detail}
+                for position, message in refused.items()
+            ], key=_position), status_code=QuotaExceeded.status_code)
+
+        try:
+            with transaction.atomic():
+                for old_status in {reservation.status for reservation in cancelled}:
+                    rows = [
+                        {field: getattr(reservation, field) for field in SWEEP_FIELDS}
+                        for reservation in cancelled if reservation.status == old_status
+                    ]
+                    Reservation.objects.filter(pk__in=[row['id'] for row in rows]).update(
+                        status='cancelled', updated_at=now
+                    )
+                    reservations_status_changed.send(
+                        sender=Reservation, rows=rows, old_status=old_status, new_status='cancelled'
+                    )
+                for reservation in cancelled:
+                    reservation.status, reservation.updated_at = 'cancelled', now
+
+                moved = []
+                for _, reservation, start, end, purpose in changed:
+                    if (start, end) != (reservation.start_time, reservation.end_time):
+                        moved.append({
+                            **{field: getattr(reservation, field) for field in SWEEP_FIELDS},
+                            'status': reservation.status, 'start_time': start, 'end_time': end,
+                            'previous_start_time': reservation.start_time,
+                            'previous_end_time': reservation.end_time,
+                        })
+                    reservation.start_time, reservation.end_time = start, end
+                    reservation.purpose, reservation.updated_at = purpose, now
+                if changed:
+                    with deferred_overlap_check():
+                        Reservation.objects.bulk_update(
+                            [reservation for _, reservation, *_ in changed],
+                            ['start_time', 'end_time', 'purpose', 'updated_at'],
+                        )
+                if moved:
+                    reservations_rescheduled.send(sender=Reservation, rows=moved)
+
+                created = Reservation.objects.bulk_create([
+                    Reservation(
+                        user=user,
+                        equipment=equipment[data['equipment']],
+                        start_time=data['start_time'],
+                        end_time=data['end_time'],
+                        status=data.get('status', 'pending'),
+                        purpose=data.get('purpose', ''),
+                    )
+                    for _, data in new
+                ])
+                if created:
+                    reservations_bulk_created.send(sender=Reservation, reservations=created)
+        except IntegrityError as exc:
+            if OVERLAP_CONSTRAINT in str(exc):
+                raise ReservationConflict()
+            raise
+    return created, [reservation for _, reservation, *_ in changed], cancelled
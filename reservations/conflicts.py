@@ -0,0 +1,225 @@
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q, Value
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from analytics.rollups import COUNTED_STATUSES
+from equipment.models import Equipment
+from .models import MaintenanceLog, Reservation, BLOCKING_STATUSES
+from .quotas import enforce_quotas
+
+# Name of the PostgreSQL exclusion constraint (see migration 0002)
+OVERLAP_CONSTRAINT = 'reservation_no_overlap'
+
+# One interval that blocks an equipment item: a reservation (label is its
+# status) or a maintenance window (label is the maintenance type)
+Block = namedtuple('Block', ['id', 'equipment_id', 'start_time', 'end_time', 'label', 'kind'])
+
+
+class ReservationConflict(APIException):
+    """
+    Raised when a reservation overlaps another booking of the same equipment
+    or one of its maintenance windows, given as Blocks
+    Rendered as a structured 409 response
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Equipment is already reserved for part of this time period.'
+    maintenance_detail = 'Equipment is scheduled for maintenance during part of this time period.'
+    default_code = 'reservation_conflict'
+
+    def __init__(self, blocks=()):
+        super().__init__()
+        maintenance = [block for block in blocks if block.kind == 'maintenance']
+        # Keep the detail as plain JSON (ids stay ints instead of ErrorDetail strings)
+        self.detail = {
+            'error': str(self.maintenance_detail if maintenance else self.default_detail),
+            'code': self.default_code,
+            'conflicting_reservations': [
+                {
+                    'id': block.id,
+                    'start_time': block.start_time,
+                    'end_time': block.end_time,
+                    'status': block.label,
+                }
+                for block in blocks if block.kind == 'reservation'
+            ],
+            'conflicting_maintenance': [
+                {
+                    'id': block.id,
+                    'start_time': block.start_time,
+                    'end_time': block.end_time,
+                    'maintenance_type': block.label,
+                }
+                for block in maintenance
+            ],
+        }
+
+
+def find_conflicts(equipment_id, start_time, end_time, exclude_id=None):
+    """
+    Reservations of this equipment that overlap [start_time, end_time)
+    """
+    conflicts = Reservation.objects.filter(
+        equipment_id=equipment_id,
+        status__in=BLOCKING_STATUSES,
+        start_time__lt=end_time,    # Reservation starts before requested end
+        end_time__gt=start_time     # Reservation ends after requested start
+    )
+    if exclude_id is not None:
+        conflicts = conflicts.exclude(pk=exclude_id)
+    return conflicts
+
+
+def blocking_intervals(equipment_ids, start_time, end_time, exclude_ids=(), limit=None):
+    """
+    Reservations and maintenance windows of these equipment items that
+    overlap [start_time, end_time), as Blocks ordered by equipment and start
+    One UNION query over both tables (each side uses its own index)
+    """
+    reservations = Reservation.objects.filter(
+        equipment_id__in=equipment_ids,
+        status__in=BLOCKING_STATUSES,
+        start_time__lt=end_time,
+        end_time__gt=start_time,
+    )
+    if exclude_ids:
+        reservations = reservations.exclude(pk__in=exclude_ids)
+    # Model orderings are cleared: compound queries are ordered as a whole
+    reservations = reservations.order_by().annotate(kind=Value('reservation')).values_list(
+        'id', 'equipment_id', 'start_time', 'end_time', 'status', 'kind'
+    )
+    maintenance = MaintenanceLog.objects.filter(
+        equipment_id__in=equipment_ids,
+        start_date__lt=end_time,
+        end_date__gt=start_time,
+    ).order_by().annotate(kind=Value('maintenance')).values_list(
+        'id', 'equipment_id', 'start_date', 'end_date', 'maintenance_type', 'kind'
+    )
+    rows = reservations.union(maintenance, all=True).order_by('equipment_id', 'start_time')
+    if limit is not None:
+        rows = rows[:limit]
+    return [Block(*row) for row in rows]
+
+
+def windowed_blocking_intervals(windows, exclude_ids=()):
+    """
+    Blocks overlapping a window per equipment item ({equipment_id: (start,
+    end)}), grouped by equipment and ordered by start
+    One UNION query for all the items, however far apart their windows are
+    """
+    reservation_window = Q()
+    maintenance_window = Q()
+    for equipment_id, (start_time, end_time) in windows.items():
+        reservation_window |= Q(equipment_id=equipment_id, start_time__lt=end_time, end_time__gt=start_time)
+        maintenance_window |= Q(equipment_id=equipment_id, start_date__lt=end_time, end_date__gt=start_time)
+    grouped = {equipment_id: [] for equipment_id in windows}
+    if not windows:
+        return grouped
+
+    reservations = Reservation.objects.filter(reservation_window, status__in=BLOCKING_STATUSES)
+    if exclude_ids:
+        reservations = reservations.exclude(pk__in=exclude_ids)
+    reservations = reservations.order_by().annotate(kind=Value('reservation')).values_list(
+        'id', 'equipment_id', 'start_time', 'end_time', 'status', 'kind'
+    )
+    maintenance = MaintenanceLog.objects.filter(maintenance_window).order_by().annotate(
+        kind=Value('maintenance')
+    ).values_list('id', 'equipment_id', 'start_date', 'end_date', 'maintenance_type', 'kind')
+    for row in reservations.union(maintenance, all=True).order_by('equipment_id', 'start_time'):
+        block = Block(*row)
+        grouped[block.equipment_id].append(block)
+    return grouped
+
+
+def lock_equipment(equipment_id):
+    """
+    Serialize reservation writes for one equipment until the transaction ends
+    """
+    if connection.features.has_select_for_update:
+        # PostgreSQL: row lock on the equipment, other writers for it wait here
+        list(Equipment.objects.select_for_update().filter(pk=equipment_id).values_list('pk', flat=True))
+    else:
+        # SQLite has no row locks: a no-op write takes the database write lock
+        Equipment.objects.filter(pk=equipment_id).update(updated_at=F('updated_at'))
+
+
+def lock_equipment_items(equipment_ids):
+    """
+    lock_equipment for several items in one statement, taken in id order so
+    two writers locking overlapping sets cannot deadlock
+    """
+    equipment_ids = sorted(set(equipment_ids))
+    if connection.features.has_select_for_update:
+        list(Equipment.objects.select_for_update().filter(pk__in=equipment_ids).order_by('pk')
+             .values_list('pk', flat=True))
+    else:
+        Equipment.objects.filter(pk__in=equipment_ids).update(updated_at=F('updated_at'))
+
+
+@contextmanager
+def deferred_overlap_check():
+    """
+    Check the exclusion constraint once at the end of the block instead of
+    row by row, for single statements that move several bookings of one
+    item (a row may pass through a slot another row is leaving)
+    Use inside a transaction; IntegrityError surfaces when the block ends
+    """
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'SET CONSTRAINTS {OVERLAP_CONSTRAINT} DEFERRED')
+    yield
+    with connection.cursor() as cursor:
+        cursor.execute(f'SET CONSTRAINTS {OVERLAP_CONSTRAINT} IMMEDIATE')
+
+
+def save_reservation(serializer, **kwargs):
+    """
+    Save a ReservationSerializer, refusing to double-book the equipment or
+    to book it during maintenance
+    The check and the write happen in one transaction holding the equipment
+    lock, and on PostgreSQL the exclusion constraint is the final guard
+    New reservations, and changes that add hours to one, must also fit the
+    weekly quotas of its user
+    """
+    data = serializer.validated_data
+    instance = serializer.instance
+
+    def value(name):
+        if name in data:
+            return data[name]
+        return getattr(instance, name, None)
+
+    equipment = value('equipment')
+    reservation_status = kwargs.get('status', value('status') or 'pending')
+
+    with transaction.atomic():
+        lock_equipment(equipment.pk)
+
+        if reservation_status in BLOCKING_STATUSES:
+            conflicts = blocking_intervals(
+                [equipment.pk], value('start_time'), value('end_time'),
+                exclude_ids=[instance.pk] if instance else (), limit=10
+            )
+            if conflicts:
+                raise ReservationConflict(conflicts)
+        interval = (value('start_time'), value('end_time'))
+        if instance is None:
+            enforce_quotas(kwargs['user'], equipment, [interval])
+        elif reservation_status in COUNTED_STATUSES:
+            held = instance.status in COUNTED_STATUSES
+            # Moved, resized, put on other equipment or counted again
+            if not held or (equipment.pk, *interval) != (instance.equipment_id, instance.start_time, instance.end_time):
+                released = [(instance.equipment, instance.start_time, instance.end_time)] if held else []
+                enforce_quotas(instance.user, equipment, [interval], released=released)
+
+        try:
+            with transaction.atomic():
+                return serializer.save(**kwargs)
+        except IntegrityError as exc:
+            if OVERLAP_CONSTRAINT in str(exc):
+                raise ReservationConflict()
+            raise
@@ -0,0 +1,35 @@
+import django_filters
+from .models import MaintenanceLog, Reservation
+
+
+class ReservationFilter(django_filters.FilterSet):
+    """
+    ?status= (repeatable), ?equipment=, ?user=, ?category= and a start_time
+    range (?start_after=, ?start_before=, ISO 8601); shared by the admin
+    listing and the exports
+    """
+    status = django_filters.MultipleChoiceFilter(choices=Reservation.STATUS_CHOICES)
+    # Plain id filters, so a filter never costs a lookup query
+    equipment = django_filters.NumberFilter(field_name='equipment_id')
+    user = django_filters.NumberFilter(field_name='user_id')
+    category = django_filters.NumberFilter(field_name='equipment__category_id')
+    start_after = django_filters.IsoDateTimeFilter(field_name='start_time', lookup_expr='gte')
+    start_before = django_filters.IsoDateTimeFilter(field_name='start_time', lookup_expr='lt')
+
+    class Meta:
+        model = Reservation
+        fields = ['status', 'equipment', 'user', 'category', 'start_after', 'start_before']
+
+
+class MaintenanceLogFilter(django_filters.FilterSet):
+    """
+    ?equipment=, ?maintenance_type= and a start_date range
+    """
+    equipment = django_filters.NumberFilter(field_name='equipment_id')
+    maintenance_type = django_filters.CharFilter()
+    start_after = django_filters.IsoDateTimeFilter(field_name='start_date', lookup_expr='gte')
+    start_before = django_filters.IsoDateTimeFilter(field_name='start_date', lookup_expr='lt')
+
+    class Meta:
+        model = MaintenanceLog
+        fields = ['equipment', 'maintenance_type', 'start_after', 'start_before']
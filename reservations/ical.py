@@ -0,0 +1,272 @@
+import hashlib
+import re
+import zoneinfo
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from .conflicts import OVERLAP_CONSTRAINT, ReservationConflict, lock_equipment
+from .models import Reservation
+from .quotas import check_quotas
+from .recurrence import find_series_conflicts
+from .signals import reservations_bulk_created
+
+PRODID = '-//Lab Reservation System//Reservations//EN'
+
+# Reservations that appear in the feeds (cancelled ones simply disappear)
+FEED_STATUSES = ['pending', 'confirmed', 'active', 'completed']
+
+# Feeds cover this much history plus everything ahead
+FEED_HISTORY = timedelta(days=30)
+
+# Rows fetched per round trip while streaming a feed
+FEED_CHUNK_SIZE = 500
+
+FEED_FIELDS = ['id', 'start_time', 'end_time', 'status', 'purpose', 'updated_at',
+               'equipment__name', 'equipment__location']
+
+MAX_IMPORT_EVENTS = 1000
+IMPORT_BATCH_SIZE = 250
+
+DURATION = re.compile(r'^P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$')
+
+
+class CalendarImportError(ValueError):
+    """
+    An import was refused; errors maps event numbers (0: the whole file) to messages
+    """
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def feed_queryset(queryset, now=None):
+    now = now or timezone.now()
+    return queryset.filter(status__in=FEED_STATUSES, end_time__gte=now - FEED_HISTORY)
+
+
+def feed_version(queryset, scope):
+    """
+    (ETag, last modified) of a feed from one aggregate query, so polling
+    clients get a 304 without the feed being generated
+    Edits bump updated_at, deletions and cancellations change the count
+    """
+    stats = queryset.aggregate(count=Count('id'), last=Max('updated_at'))
+    raw = f"{scope}|{stats['count']}|{stats['last'] and stats['last'].isoformat()}"
+    return f'"{hashlib.md5(raw.encode()).hexdigest()}"', stats['last']
+
+
+def escape_text(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """
+    Split a content line into 75-octet pieces (RFC 5545 3.1), never inside
+    a UTF-8 character
+    """
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1  # Back off to a character boundary
+        parts.append(encoded[start:end].decode())
+        start, limit = end, 74  # Continuation lines start with a space
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_utc(moment):
+    return moment.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def event_lines(row, host, private):
+    """
+    VEVENT of one reservation row (FEED_FIELDS values); shared feeds
+    (equipment, lab) leave out the purpose
+    """
+    equipment = row['equipment__name']
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:reservation-{row['id']}@{host}",
+        f"DTSTAMP:{format_utc(row['updated_at'])}",
+        f"LAST-MODIFIED:{format_utc(row['updated_at'])}",
+        f"DTSTART:{format_utc(row['start_time'])}",
+        f"DTEND:{format_utc(row['end_time'])}",
+        f"SUMMARY:{escape_text(equipment if private else f'{equipment} reserved')}",
+        f"LOCATION:{escape_text(row['equipment__location'])}",
+        f"STATUS:{'TENTATIVE' if row['status'] == 'pending' else 'CONFIRMED'}",
+    ]
+    if private and row['purpose']:
+        lines.append(f"DESCRIPTION:{escape_text(row['purpose'])}")
+    lines.append('END:VEVENT')
+    return ''.join(fold(line) for line in lines)
+
+
+def generate_calendar(queryset, name, host, private):
+    """
+    Yield the calendar piece by piece, reading the rows in chunks, so a
+    large feed never sits in memory
+    """
+    yield ''.join(fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{escape_text(name)}',
+        'REFRESH-INTERVAL;VALUE=DURATION:PT15M',
+    ])
+    rows = queryset.order_by('start_time', 'id').values(*FEED_FIELDS).iterator(chunk_size=FEED_CHUNK_SIZE)
+    for row in rows:
+        yield event_lines(row, host, private)
+    yield fold('END:VCALENDAR')
+
+
+def unfold(text):
+    lines = []
+    for line in text.replace('\r\n', '\n').replace('\r', '\n').split('\n'):
+        if line[:1] in (' ', '\t') and lines:
+            lines[-1] += line[1:]
+        elif line:
+            lines.append(line)
+    return lines
+
+
+def unescape_text(value):
+    return re.sub(r'\\([\\;,nN])', lambda match: '\n' if match.group(1) in 'nN' else match.group(1), value)
+
+
+def parse_datetime_value(value, params):
+    """
+    DTSTART/DTEND value: UTC ('...Z'), with a TZID, floating (server time
+    zone) or a whole date (VALUE=DATE, midnight)
+    """
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        moment = datetime.strptime(value, '%Y%m%d')
+    else:
+        moment = datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+        if value.endswith('Z'):
+            return moment.replace(tzinfo=dt_timezone.utc)
+    if 'TZID' in params:
+        try:
+            return moment.replace(tzinfo=zoneinfo.ZoneInfo(params['TZID'].strip('"')))
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown time zone {params['TZID']}")
+    return timezone.make_aware(moment)
+
+
+def parse_duration(value):
+    match = DURATION.match(value.lstrip('+'))
+    if not match or not any(match.groupdict().values()):
+        raise ValueError(f'Invalid duration {value}')
+    return timedelta(**{name: int(amount) for name, amount in match.groupdict().items() if amount})
+
+
+def parse_calendar(text):
+    """
+    Events of an iCalendar document as dicts with start, end, summary and
+    description; recurrence rules are not expanded
+    Raises ValueError naming the first unreadable event
+    """
+    events, current, nested = [], None, 0
+    for line in unfold(text):
+        name_params, sep, value = line.partition(':')
+        if not sep:
+            continue
+        name, *raw_params = name_params.split(';')
+        name = name.upper()
+        params = dict(param.partition('=')[::2] for param in raw_params)
+        params = {key.upper(): item for key, item in params.items()}
+
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            current, nested = {'number': len(events) + 1, 'summary': '', 'description': ''}, 0
+        elif current is not None and name in ('BEGIN', 'END') and value.upper() != 'VEVENT':
+            nested += 1 if name == 'BEGIN' else -1  # e.g. a VALARM, whose properties are not the event's
+        elif current is not None and nested:
+            continue
+        elif name == 'END' and value.upper() == 'VEVENT' and current is not None:
+            if 'start' not in current:
+                raise ValueError(f"Event {current['number']} has no DTSTART")
+            if 'end' not in current:
+                if 'duration' not in current:
+                    raise ValueError(f"Event {current['number']} has no DTEND or DURATION")
+                current['end'] = current['start'] + current.pop('duration')
+            events.append(current)
+            current = None
+        elif current is not None:
+            try:
+                if name == 'DTSTART':
+                    current['start'] = parse_datetime_value(value, params)
+                elif name == 'DTEND':
+                    current['end'] = parse_datetime_value(value, params)
+                elif name == 'DURATION':
+                    current['duration'] = parse_duration(value)
+                elif name in ('SUMMARY', 'DESCRIPTION'):
+                    current[name.lower()] = unescape_text(value)
+            except ValueError as error:
+                raise ValueError(f"Event {current['number']}: {error}")
+    return events
+
+
+def import_events(events, equipment, user, status='pending', now=None):
+    """
+    Book every event on `equipment` for `user`, or none of them
+    Each event is validated, then the whole set goes through the series
+    conflict check (one interval query) and the weekly quotas under the
+    equipment lock and is written with bulk_create in batches
+    Returns the created reservations; raises CalendarImportError or
+    ReservationConflict
+    """
+    now = now or timezone.now()
+    longest = timedelta(hours=equipment.max_reservation_hours)
+    errors = {}
+    if not events:
+        raise CalendarImportError({0: 'The calendar has no events.'})
+    if len(events) > MAX_IMPORT_EVENTS:
+        raise CalendarImportError({0: f'At most {MAX_IMPORT_EVENTS} events per import.'})
+    for event in events:
+        if event['end'] <= event['start']:
+            errors[event['number']] = 'Ends before it starts.'
+        elif event['start'] < now:
+            errors[event['number']] = 'Starts in the past.'
+        elif event['end'] - event['start'] > longest:
+            errors[event['number']] = f'Longer than {equipment.max_reservation_hours} hours.'
+    events = sorted(events, key=lambda event: event['start'])
+    for previous, event in zip(events, events[1:]):
+        if event['start'] < previous['end']:
+            errors.setdefault(event['number'], f"Overlaps event {previous['number']}.")
+    if errors:
+        raise CalendarImportError(errors)
+
+    intervals = [(event['start'], event['end']) for event in events]
+    with transaction.atomic():
+        lock_equipment(equipment.pk)
+        conflicts = find_series_conflicts(equipment.pk, intervals)
+        if conflicts:
+            raise ReservationConflict(conflicts[:10])
+        refused = check_quotas([(user, equipment, event['start'], event['end']) for event in events])
+        if refused:
+            raise CalendarImportError({events[index]['number']: message for index, message in refused.items()})
+        try:
+            with transaction.atomic():
+                created = Reservation.objects.bulk_create([
+                    Reservation(
+                        user=user,
+                        equipment=equipment,
+                        start_time=event['start'],
+                        end_time=event['end'],
+                        status=status,
+                        purpose='\n\n'.join(part for part in (event['summary'], event['description']) if part),
+                    )
+                    for event in events
+                ], batch_size=IMPORT_BATCH_SIZE)
+                reservations_bulk_created.send(sender=Reservation, reservations=created)
+        except IntegrityError as exc:
+            if OVERLAP_CONSTRAINT in str(exc):
+                raise ReservationConflict()
+            raise
+    return created
@@ -0,0 +1,179 @@
+from bisect import insort
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from analytics.rollups import COUNTED_STATUSES
+from equipment.caching import CATALOG_VERSION, bump_versions, equipment_version_key
+from equipment.models import Equipment
+from users.models import User
+from .availability import busy_intervals
+from .conflicts import OVERLAP_CONSTRAINT, ReservationConflict, deferred_overlap_check, lock_equipment
+from .models import BLOCKING_STATUSES, MaintenanceLog, Reservation
+from .quotas import QuotaLedger, weeks_between
+from .notifications import enqueue
+from .signals import reservations_rescheduled, reservations_status_changed
+from .states import SWEEP_FIELDS
+
+# How far past a maintenance window displaced reservations may be moved
+RESCHEDULE_HORIZON = timedelta(days=14)
+
+
+def affected_reservations(maintenance):
+    """
+    Bookings that hold a slot during the maintenance window
+    """
+    return Reservation.objects.filter(
+        equipment_id=maintenance.equipment_id,
+        status__in=BLOCKING_STATUSES,
+        start_time__lt=maintenance.end_date,
+        end_time__gt=maintenance.start_date,
+    ).order_by('start_time', 'id')
+
+
+def first_fit(busy, not_before, duration, limit):
+    """
+    Earliest start >= not_before where `duration` fits between the sorted
+    busy intervals and ends by `limit`, or None
+    """
+    cursor = not_before
+    for busy_start, busy_end in busy:
+        if busy_end <= cursor:
+            continue
+        if busy_start - cursor >= duration:
+            break
+        cursor = busy_end
+    return cursor if cursor + duration <= limit else None
+
+
+def reschedule_affected(maintenance, horizon=RESCHEDULE_HORIZON, dry_run=False):
+    """
+    Move every booking displaced by a maintenance window to the first free
+    slot of the same length after it, cancelling those that do not fit
+    within `horizon` or, moved into another week, their owner's quotas.
+    A fixed number of reads and at most two writes, whatever the count
+    Returns (moved rows with previous times, cancelled rows); raises
+    ReservationConflict if a concurrent booking took a chosen slot
+    """
+    limit = maintenance.end_date + horizon
+    with transaction.atomic():
+        lock_equipment(maintenance.equipment_id)
+        affected = list(affected_reservations(maintenance).values(*SWEEP_FIELDS, 'status'))
+        if not affected:
+            return [], []
+
+        # Everything else that blocks the equipment until the horizon, this window included
+        busy = busy_intervals(
+            [maintenance.equipment_id], maintenance.start_date, limit,
+            exclude_ids=[row['id'] for row in affected],
+        )[maintenance.equipment_id]
+
+        # A move into another week must fit its owner's quotas there
+        owners = User.objects.in_bulk({row['user_id'] for row in affected})
+        equipment = Equipment.objects.get(pk=maintenance.equipment_id)
+        ledger = QuotaLedger(owners.values(), [equipment], weeks_between(affected[0]['start_time'], limit), lock=True)
+        for row in affected:
+            if row['status'] in COUNTED_STATUSES:
+                ledger.release(owners[row['user_id']], equipment, row['start_time'], row['end_time'])
+
+        moved, cancelled = [], []
+        for row in affected:
+            duration = row['end_time'] - row['start_time']
+            start = first_fit(busy, max(row['start_time'], maintenance.end_date), duration, limit)
+            if start is None or ledger.breach(owners[row['user_id']], equipment, start, start + duration):
+                cancelled.append(row)
+                continue
+            ledger.add(owners[row['user_id']], equipment, start, start + duration)
+            moved.append({
+                **row, 'start_time': start, 'end_time': start + duration,
+                'previous_start_time': row['start_time'], 'previous_end_time': row['end_time'],
+            })
+            insort(busy, (start, start + duration))
+
+        if dry_run:
+            return moved, cancelled
+
+        now = timezone.now()
+        if moved:
+            try:
+                with transaction.atomic(), deferred_overlap_check():
+                    Reservation.objects.bulk_update(
+                        [Reservation(pk=row['id'], start_time=row['start_time'], end_time=row['end_time'],
+                                     updated_at=now)
+                         for row in moved],
+                        ['start_time', 'end_time', 'updated_at'],
+                    )
+            except IntegrityError as exc:
+                if OVERLAP_CONSTRAINT in str(exc):
+                    raise ReservationConflict()
+                raise
+            reservations_rescheduled.send(sender=Reservation, rows=moved)
+        for old_status in {row['status'] for row in cancelled}:
+            rows = [row for row in cancelled if row['status'] == old_status]
+            Reservation.objects.filter(pk__in=[row['id'] for row in rows]).update(
+                status='cancelled', updated_at=now
+            )
+            reservations_status_changed.send(
+                sender=Reservation, rows=rows, old_status=old_status, new_status='cancelled'
+            )
+        # The alert queued when the window was saved no longer finds these
+        # bookings in the window, so name them explicitly
+        enqueue('maintenance_alert', maintenance_id=maintenance.pk,
+                reservation_ids=[row['id'] for row in moved + cancelled])
+    return moved, cancelled
+
+
+def upcoming_maintenance(start, end):
+    """
+    Maintenance windows of active equipment overlapping [start, end), with
+    the number of bookings each displaces, in one query
+    """
+    affected = Reservation.objects.filter(
+        equipment_id=OuterRef('equipment_id'),
+        status__in=BLOCKING_STATUSES,
+        start_time__lt=OuterRef('end_date'),
+        end_time__gt=OuterRef('start_date'),
+    ).order_by().values('equipment_id').annotate(count=Count('id')).values('count')
+    return MaintenanceLog.objects.filter(
+        equipment__is_active=True, start_date__lt=end, end_date__gt=start,
+    ).select_related('equipment').annotate(
+        affected_reservations=Coalesce(Subquery(affected, output_field=IntegerField()), 0)
+    ).order_by('start_date', 'id')
+
+
+def _differs(field, value):
+    # NULL-safe "field IS DISTINCT FROM value"
+    return (
+        Q(**{f'{field}__isnull': True, f'{value}__isnull': False})
+        | Q(**{f'{field}__isnull': False, f'{value}__isnull': True})
+        | ~Q(**{field: F(value)})
+    )
+
+
+def refresh_maintenance_dates(equipment_ids=None, now=None):
+    """
+    Keep Equipment.last_maintenance/next_maintenance equal to the last
+    finished and the next unfinished window of the maintenance log
+    One SELECT of the items that drifted, one bulk UPDATE
+    Returns the number of items updated
+    """
+    now = now or timezone.now()
+    logs = MaintenanceLog.objects.filter(equipment_id=OuterRef('pk')).order_by().values('equipment_id')
+    equipment = Equipment.objects.all()
+    if equipment_ids is not None:
+        equipment = equipment.filter(pk__in=list(equipment_ids))
+    drifted = equipment.annotate(
+        last_day=Subquery(logs.filter(end_date__lte=now).annotate(day=Max(TruncDate('end_date'))).values('day')),
+        next_day=Subquery(logs.filter(end_date__gt=now).annotate(day=Min(TruncDate('start_date'))).values('day')),
+    ).filter(_differs('last_maintenance', 'last_day') | _differs('next_maintenance', 'next_day'))
+
+    updates = [
+        Equipment(pk=pk, last_maintenance=last_day, next_maintenance=next_day, updated_at=now)
+        for pk, last_day, next_day in drifted.values_list('pk', 'last_day', 'next_day')
+    ]
+    if updates:
+        Equipment.objects.bulk_update(updates, ['last_maintenance', 'next_maintenance', 'updated_at'])
+        bump_versions(CATALOG_VERSION, *[equipment_version_key(item.pk) for item in updates])
+    return len(updates)
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from equipment.status import refresh_status
+from reservations.maintenance import refresh_maintenance_dates
+from reservations.states import advance_reservations
+from reservations.waitlist import expire_waitlist
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply time-based status transitions (start, end, no-show and, with '
+        'RESERVATION_CANCEL_UNAPPROVED, expired requests) with batched '
+        'set-based UPDATEs, then bring Equipment.status '
+        'and the last/next maintenance dates up to date with maintenance '
+        'windows that opened or closed, and expire waitlist entries whose '
+        'window is over'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows per UPDATE/transaction')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Keep running, sweeping every this many seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            moved = advance_reservations(batch_size=options['batch_size'])
+            summary = ', '.join(f'{old}->{new}: {count}' for (old, new), count in moved.items())
+            summary += f', equipment status: {refresh_status()}, maintenance dates: {refresh_maintenance_dates()}'
+            summary += f', waitlist expired: {expire_waitlist()}'
+            self.stdout.write(f'{summary} ({time.perf_counter() - started:.2f}s)')
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,166 @@
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from equipment.models import Equipment, EquipmentCategory
+from reservations.models import Reservation
+from users.authentication import issue_tokens
+from users.models import User
+
+# name -> (application, worker class, ASYNC_READ_VIEWS)
+SERVERS = {
+    'wsgi': ('reservation_system.wsgi:application', 'sync', 'False'),
+    'asgi-sync': ('reservation_system.asgi:application', 'uvicorn.workers.UvicornWorker', 'False'),
+    'asgi-async': ('reservation_system.asgi:application', 'uvicorn.workers.UvicornWorker', 'True'),
+}
+
+SEED_PREFIX = 'loadtest'
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the read endpoints under gunicorn sync workers and under '
+        'uvicorn workers with sync or async views; reports requests/s and p99'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', default=','.join(SERVERS),
+                            help=f'Comma separated, from: {", ".join(SERVERS)}')
+        parser.add_argument('--workers', type=int, default=1, help='Server worker processes')
+        parser.add_argument('--concurrency', type=int, default=50, help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per endpoint and server')
+        parser.add_argument('--equipment', type=int, default=50)
+        parser.add_argument('--reservations', type=int, default=5000)
+        parser.add_argument('--port', type=int, default=8750)
+
+    def handle(self, *args, **options):
+        servers = [name.strip() for name in options['servers'].split(',')]
+        unknown = set(servers) - set(SERVERS)
+        if unknown:
+            raise CommandError(f'Unknown servers: {", ".join(sorted(unknown))}')
+
+        # The servers are separate processes, so the data has to be committed
+        user, equipment_ids = self.seed(options)
+        try:
+            token = str(issue_tokens(user).access_token)
+            self.stdout.write(f'{"server":<12}{"endpoint":<16}{"req/s":>9}{"p50 ms":>9}{"p99 ms":>9}{"errors":>8}')
+            for offset, name in enumerate(servers):
+                base_url = f'http://127.0.0.1:{options["port"] + offset}'
+                with self.server(name, base_url, options):
+                    for endpoint, paths in self.endpoints(equipment_ids, options['requests']).items():
+                        rps, p50, p99, errors = self.run(base_url, paths, token, options['concurrency'])
+                        self.stdout.write(f'{name:<12}{endpoint:<16}{rps:>9.0f}{p50:>9.1f}{p99:>9.1f}{errors:>8}')
+        finally:
+            Reservation.objects.filter(user=user).delete()
+            Equipment.objects.filter(pk__in=equipment_ids).delete()
+            user.delete()
+
+    def seed(self, options):
+        User.objects.filter(username=f'{SEED_PREFIX}_user').delete()
+        user = User.objects.create_user(
+            username=f'{SEED_PREFIX}_user', password=None, role='researcher', is_approved=True
+        )
+        category, _ = EquipmentCategory.objects.get_or_create(name=f'{SEED_PREFIX} instruments')
+        equipment = Equipment.objects.bulk_create([
+            Equipment(name=f'{SEED_PREFIX} {i}', description='', category=category, location='Load lab')
+            for i in range(options['equipment'])
+        ])
+        equipment_ids = [item.pk for item in equipment]
+        start = timezone.now()
+        Reservation.objects.bulk_create([
+            Reservation(
+                user=user,
+                equipment_id=equipment_ids[i % len(equipment_ids)],
+                start_time=start + timedelta(hours=2 * (i // len(equipment_ids))),
+                end_time=start + timedelta(hours=2 * (i // len(equipment_ids)) + 1),
+                status='confirmed',
+            )
+            for i in range(options['reservations'])
+        ], batch_size=1000)
+        return user, equipment_ids
+
+    def endpoints(self, equipment_ids, count):
+        start = timezone.now()
+        return {
+            'reservations': ['/api/reservations/'] * count,
+            'equipment': ['/api/equipment/'] * count,
+            'availability': [
+                f'/api/equipment/{random.choice(equipment_ids)}/availability/'
+                f'?start_time={(start + timedelta(days=random.randint(0, 30))).strftime("%Y-%m-%dT%H:%M:%S")}'
+                f'&end_time={(start + timedelta(days=random.randint(31, 60))).strftime("%Y-%m-%dT%H:%M:%S")}'
+                for _ in range(count)
+            ],
+        }
+
+    def server(self, name, base_url, options):
+        command = self
+
+        class Server:
+            def __enter__(self):
+                application, worker_class, async_views = SERVERS[name]
+                port = base_url.rsplit(':', 1)[1]
+                self.process = subprocess.Popen(
+                    [sys.executable, '-m', 'gunicorn', application, '-k', worker_class,
+                     '-w', str(options['workers']), '-b', f'127.0.0.1:{port}', '--access-logfile', '/dev/null'],
+                    env={**os.environ, 'ASYNC_READ_VIEWS': async_views, 'PORT': port},
+                    cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                )
+                deadline = time.monotonic() + 30
+                while True:
+                    try:
+                        socket.create_connection(('127.0.0.1', int(port)), timeout=1).close()
+                        return self
+                    except OSError:
+                        if time.monotonic() > deadline or self.process.poll() is not None:
+                            self.process.kill()
+                            raise CommandError(f'{name} server did not start')
+                        time.sleep(0.2)
+
+            def __exit__(self, *exc_info):
+                self.process.terminate()
+                self.process.wait(timeout=30)
+                command.stdout.flush()
+
+        return Server()
+
+    def run(self, base_url, paths, token, concurrency):
+        local = threading.local()
+        latencies, errors = [], 0
+        lock = threading.Lock()
+
+        def fetch(path):
+            nonlocal errors
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+                local.session.headers['Authorization'] = f'Bearer {token}'
+            started = time.perf_counter()
+            try:
+                ok = local.session.get(base_url + path, timeout=60).status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                errors += not ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(fetch, paths))
+        total = time.perf_counter() - started
+        return len(paths) / total, percentile(latencies, 0.5), percentile(latencies, 0.99), errors
@@ -0,0 +1,144 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from equipment.models import Equipment, EquipmentCategory
+from users.models import User
+from reservations.conflicts import blocking_intervals
+from reservations.models import BLOCKING_STATUSES, MaintenanceLog, Reservation
+from reservations.serializers import ReservationSerializer
+
+
+class Rollback(Exception):
+    """
+    Raised at the end of the benchmark so the seeded rows are never committed
+    """
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed reservations inside a rolled-back transaction and check that '
+        'availability and list queries stay under a latency budget'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--equipment', type=int, default=200)
+        parser.add_argument('--users', type=int, default=2_000)
+        parser.add_argument('--samples', type=int, default=200)
+        parser.add_argument('--max-ms', type=float, default=25.0,
+                            help='p95 budget per query in milliseconds')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options)
+                results = self.measure(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+        failed = []
+        for name, p95 in results.items():
+            ok = p95 <= options['max_ms']
+            self.stdout.write(f'{name:<24} p95 {p95:8.2f} ms  {"OK" if ok else "TOO SLOW"}')
+            if not ok:
+                failed.append(name)
+        if failed:
+            raise CommandError(f'Over the {options["max_ms"]} ms budget: {", ".join(failed)}')
+
+    def seed(self, options):
+        """
+        Bulk insert users, equipment, reservations spread over two years and
+        maintenance windows
+        """
+        started = time.perf_counter()
+        category = EquipmentCategory.objects.create(name='Benchmark')
+        self.equipment_ids = [
+            e.id for e in Equipment.objects.bulk_create(
+                Equipment(name=f'Bench {i}', description='', category=category, location='Bench')
+                for i in range(options['equipment'])
+            )
+        ]
+        self.user_ids = [
+            u.id for u in User.objects.bulk_create(
+                User(username=f'bench_user_{i}', password='!') for i in range(options['users'])
+            )
+        ]
+
+        # Blocking bookings of one item never overlap (the exclusion
+        # constraint of migration 0002 refuses that on PostgreSQL): each item
+        # has a cursor its next one starts after. Only the cancelled and
+        # completed rows land anywhere, overlaps included
+        self.origin = timezone.now() - timedelta(days=365)
+        horizon = self.origin + timedelta(days=2 * 365)
+        cursors = dict.fromkeys(self.equipment_ids, self.origin)
+        finished = ['cancelled', 'completed']
+        batch = []
+        for i in range(options['rows']):
+            equipment_id = random.choice(self.equipment_ids)
+            duration = timedelta(hours=random.randint(1, 4))
+            start = cursors[equipment_id] + timedelta(hours=random.randint(0, 2))
+            if random.random() < 0.6 and start + duration <= horizon:
+                status = random.choice(BLOCKING_STATUSES)
+                cursors[equipment_id] = start + duration
+            else:
+                status = random.choice(finished)
+                start = self.origin + timedelta(hours=random.randrange(2 * 365 * 24))
+            batch.append(Reservation(
+                user_id=random.choice(self.user_ids),
+                equipment_id=equipment_id,
+                start_time=start,
+                end_time=start + duration,
+                status=status,
+            ))
+            if len(batch) >= options['batch_size']:
+                Reservation.objects.bulk_create(batch)
+                batch = []
+        Reservation.objects.bulk_create(batch)
+
+        # A maintenance window a month per item, for the other side of the UNION
+        windows = []
+        for equipment_id in self.equipment_ids:
+            for month in range(24):
+                start = self.origin + timedelta(days=30 * month, hours=random.randrange(30 * 24))
+                windows.append(MaintenanceLog(
+                    equipment_id=equipment_id, maintenance_type='routine', description='',
+                    performed_by='Benchmark', start_date=start, end_date=start + timedelta(hours=random.randint(2, 8)),
+                ))
+        MaintenanceLog.objects.bulk_create(windows, batch_size=options['batch_size'])
+        self.stdout.write(f'Seeded {options["rows"]} reservations in {time.perf_counter() - started:.1f}s')
+
+    def measure(self, options):
+        """
+        p95 latency of the hot queries, in milliseconds
+        """
+        def availability():
+            start = self.origin + timedelta(hours=random.randrange(2 * 365 * 24))
+            # The check every booking write runs (reservations and maintenance)
+            blocking_intervals([random.choice(self.equipment_ids)], start, start + timedelta(hours=2), limit=10)
+
+        def user_list():
+            queryset = Reservation.objects.filter(user_id=random.choice(self.user_ids))
+            list(ReservationSerializer.setup_eager_loading(queryset).order_by('-created_at', '-id')[:50])
+
+        def admin_list():
+            list(ReservationSerializer.setup_eager_loading(Reservation.objects.all()).order_by('-created_at', '-id')[:50])
+
+        results = {}
+        for name, query in [('availability check', availability),
+                            ('user reservation list', user_list),
+                            ('admin reservation list', admin_list)]:
+            timings = []
+            for _ in range(options['samples']):
+                started = time.perf_counter()
+                query()
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            results[name] = timings[int(len(timings) * 0.95) - 1]
+        return results
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reservations.notifications import enqueue_due_reminders, process_jobs, purge_finished_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Notification worker: queue due reminders, fan queued events out into '
+        'notifications and batched emails'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the due jobs and exit (for cron) instead of polling')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            enqueue_due_reminders()
+            while claimed := process_jobs(batch_size=options['batch_size']):
+                processed += claimed
+            if options['once']:
+                break
+            purge_finished_jobs()
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} notification jobs'))
@@ -0,0 +1,80 @@
+import logging
+
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+ADD_CONSTRAINT = """
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+ALTER TABLE reservations_reservation
+    ADD CONSTRAINT reservation_no_overlap
+    EXCLUDE USING gist (
+        equipment_id WITH =,
+        tstzrange(start_time, end_time, '[)') WITH &&
+    )
+    WHERE (status IN ('pending', 'confirmed', 'active'))
+    DEFERRABLE INITIALLY IMMEDIATE;
+"""
+
+DROP_CONSTRAINT = """
+ALTER TABLE reservations_reservation DROP CONSTRAINT IF EXISTS reservation_no_overlap;
+"""
+
+BLOCKING_STATUSES = ['pending', 'confirmed', 'active']
+
+logger = logging.getLogger(__name__)
+
+
+def cancel_overlaps(Reservation):
+    """
+    Cancel the double bookings the constraint would refuse: per equipment
+    item the earliest made booking keeps its slot and any later one that
+    overlaps a kept booking is cancelled. Returns the cancelled ids
+    """
+    blocking = Reservation.objects.filter(status__in=BLOCKING_STATUSES)
+    overlapping = blocking.filter(Exists(
+        blocking.filter(
+            equipment_id=OuterRef('equipment_id'),
+            start_time__lt=OuterRef('end_time'),
+            end_time__gt=OuterRef('start_time'),
+        ).exclude(pk=OuterRef('pk'))
+    )).order_by('equipment_id', 'created_at', 'id').values_list('id', 'equipment_id', 'start_time', 'end_time')
+
+    kept, cancelled = {}, []
+    for pk, equipment_id, start_time, end_time in overlapping:
+        held = kept.setdefault(equipment_id, [])
+        if any(start < end_time and end > start_time for start, end in held):
+            cancelled.append(pk)
+        else:
+            held.append((start_time, end_time))
+    if cancelled:
+        Reservation.objects.filter(pk__in=cancelled).update(status='cancelled', updated_at=timezone.now())
+    return cancelled
+
+
+def add_overlap_constraint(apps, schema_editor):
+    # Exclusion constraints are PostgreSQL only, SQLite relies on the
+    # serialized transactional check in reservations/conflicts.py
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Existing double bookings would make ADD CONSTRAINT fail
+    cancelled = cancel_overlaps(apps.get_model('reservations', 'Reservation'))
+    if cancelled:
+        logger.warning('Cancelled %d overlapping reservations: %s', len(cancelled), ', '.join(map(str, cancelled)))
+    schema_editor.execute(ADD_CONSTRAINT)
+
+
+def drop_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_CONSTRAINT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_overlap_constraint, drop_overlap_constraint),
+    ]
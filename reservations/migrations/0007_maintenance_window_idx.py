@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0007_equipment_status_indexes'),
+        ('reservations', '0006_reservation_sweep_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='maintenancelog',
+            index=models.Index(fields=['equipment', 'start_date', 'end_date'], name='maintenance_window_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0007_equipment_status_indexes'),
+        ('reservations', '0007_maintenance_window_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('reservation_confirmation', 'Reservation Confirmation'), ('reservation_reminder', 'Reservation Reminder'), ('maintenance_alert', 'Maintenance Alert'), ('waitlist_allocated', 'Waitlist Allocation'), ('system_announcement', 'System Announcement')], max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='notificationjob',
+            name='event',
+            field=models.CharField(choices=[('reservation_confirmation', 'Reservation Confirmation'), ('reservation_reminder', 'Reservation Reminder'), ('maintenance_alert', 'Maintenance Alert'), ('waitlist_allocated', 'Waitlist Allocation'), ('system_announcement', 'System Announcement')], max_length=50),
+        ),
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_start', models.DateTimeField()),
+                ('window_end', models.DateTimeField()),
+                ('duration', models.DurationField()),
+                ('purpose', models.TextField(blank=True)),
+                ('priority', models.PositiveSmallIntegerField(default=3)),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('allocated', 'Allocated'), ('expired', 'Expired'), ('withdrawn', 'Withdrawn')], default='waiting', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('equipment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='equipment.equipment')),
+                ('reservation', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='reservations.reservation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['priority', 'created_at', 'id'],
+                'indexes': [models.Index(condition=models.Q(('status', 'waiting')), fields=['equipment', 'window_start', 'window_end'], name='waitlist_window_idx'), models.Index(fields=['user', '-created_at'], name='waitlist_user_recent_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0007_equipment_status_indexes'),
+        ('reservations', '0008_waitlist'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('user', 'User'), ('role', 'Role'), ('department', 'Department')], max_length=20)),
+                ('role', models.CharField(blank=True, choices=[('super_admin', 'Super Admin'), ('lab_manager', 'Lab Manager'), ('researcher', 'Researcher'), ('student', 'Student')], max_length=20)),
+                ('department', models.CharField(blank=True, max_length=100)),
+                ('hours_per_week', models.FloatField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='quota_policies', to='equipment.equipmentcategory')),
+                ('equipment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='quota_policies', to='equipment.equipment')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='quota_policies', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'quota policies',
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('category__isnull', True), ('equipment__isnull', False)), models.Q(('category__isnull', False), ('equipment__isnull', True)), _connector='OR'), name='quota_policy_one_target'), models.CheckConstraint(condition=models.Q(models.Q(('scope', 'user'), ('user__isnull', False)), models.Q(('role__gt', ''), ('scope', 'role')), models.Q(('department__gt', ''), ('scope', 'department')), _connector='OR'), name='quota_policy_subject'), models.CheckConstraint(condition=models.Q(('hours_per_week__gte', 0)), name='quota_policy_hours')],
+            },
+        ),
+    ]
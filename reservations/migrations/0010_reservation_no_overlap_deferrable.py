@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Databases migrated before 0002 declared the constraint deferrable keep a
+# NOT DEFERRABLE one, which SET CONSTRAINTS cannot defer; PostgreSQL cannot
+# alter that on an exclusion constraint, so it is recreated
+RECREATE_DEFERRABLE = """
+ALTER TABLE reservations_reservation DROP CONSTRAINT IF EXISTS reservation_no_overlap;
+ALTER TABLE reservations_reservation
+    ADD CONSTRAINT reservation_no_overlap
+    EXCLUDE USING gist (
+        equipment_id WITH =,
+        tstzrange(start_time, end_time, '[)') WITH &&
+    )
+    WHERE (status IN ('pending', 'confirmed', 'active'))
+    DEFERRABLE INITIALLY IMMEDIATE;
+"""
+
+
+def make_deferrable(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT condeferrable FROM pg_constraint WHERE conname = 'reservation_no_overlap'"
+        )
+        row = cursor.fetchone()
+    if row and not row[0]:
+        schema_editor.execute(RECREATE_DEFERRABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0009_quota_policy'),
+    ]
+
+    operations = [
+        migrations.RunPython(make_deferrable, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,10 @@
 from django.db import models
+from django.utils import timezone
 from users.models import User
-from equipment.models import Equipment
+from equipment.models import Equipment, EquipmentCategory
+
+# Reservations in these states hold their time slot
+BLOCKING_STATUSES = ['pending', 'confirmed', 'active']
 
 class Reservation(models.Model):
     STATUS_CHOICES = [
@@ -27,6 +31,9 @@ class Reservation(models.Model):
     is_recurring = models.BooleanField(default=False)
     recurring_pattern = models.CharField(max_length=50, blank=True)  # 'weekly', 'daily', etc.
     recurring_end_date = models.DateTimeField(blank=True, null=True)
+    recurring_exceptions = models.JSONField(default=list, blank=True)  # Skipped dates, 'YYYY-MM-DD'
+    series = models.ForeignKey('self', on_delete=models.CASCADE, blank=True, null=True,
+                               related_name='occurrences')  # First reservation of the series
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -37,6 +44,29 @@ class Reservation(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Overlap check: equipment + time range, only rows that hold a slot
+            models.Index(
+                fields=['equipment', 'start_time', 'end_time'],
+                name='reservation_slot_idx',
+                condition=models.Q(status__in=BLOCKING_STATUSES),
+            ),
+            # "My reservations" listing, newest first
+            models.Index(fields=['user', '-created_at'], name='reservation_user_recent_idx'),
+            # Keyset pagination of the admin listing on (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='reservation_recent_idx'),
+            # Status sweeps (states.py): live rows whose start/end has passed
+            models.Index(
+                fields=['start_time'],
+                name='reservation_due_start_idx',
+                condition=models.Q(status__in=['pending', 'confirmed']),
+            ),
+            models.Index(
+                fields=['end_time'],
+                name='reservation_due_end_idx',
+                condition=models.Q(status__in=['confirmed', 'active']),
+            ),
+        ]
 
 class MaintenanceLog(models.Model):
     equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE, related_name='maintenance_logs')
@@ -51,12 +81,19 @@ class MaintenanceLog(models.Model):
     
     def __str__(self):
         return f"{self.equipment.name} - {self.maintenance_type}"
+    
+    class Meta:
+        indexes = [
+            # Open maintenance windows of an equipment item
+            models.Index(fields=['equipment', 'start_date', 'end_date'], name='maintenance_window_idx'),
+        ]
 
 class Notification(models.Model):
     TYPE_CHOICES = [
         ('reservation_confirmation', 'Reservation Confirmation'),
         ('reservation_reminder', 'Reservation Reminder'),
         ('maintenance_alert', 'Maintenance Alert'),
+        ('waitlist_allocated', 'Waitlist Allocation'),
         ('system_announcement', 'System Announcement'),
     ]
     
@@ -71,4 +108,136 @@ class Notification(models.Model):
         return f"{self.user.username} - {self.title}"
     
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # Unread badge: count of a user's unread rows only
+            models.Index(fields=['user'], name='notification_unread_idx', condition=models.Q(is_read=False)),
+            # Keyset pagination of a user's notifications, newest first
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_recent_idx'),
+        ]
+
+class NotificationJob(models.Model):
+    """
+    Queued notification event, fanned out into Notification rows and emails
+    by the process_notifications worker, never in the request
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    event = models.CharField(max_length=50, choices=Notification.TYPE_CHOICES)
+    payload = models.JSONField(default=dict)  # e.g. {"reservation_id": 1}
+    dedupe_key = models.CharField(max_length=100, blank=True, null=True, unique=True)  # Enqueue at most once
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(blank=True, null=True)  # Claim lease, expired leases are retaken
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.event} ({self.status})"
+    
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            # Workers poll only the due, pending jobs
+            models.Index(fields=['run_at'], name='notification_job_due_idx', condition=models.Q(status='pending')),
+        ]
+
+
+class WaitlistEntry(models.Model):
+    """
+    Request for a slot of `duration` on an equipment item anywhere inside
+    [window_start, window_end); booked by the allocator (waitlist.py) when a
+    cancellation or no-show frees one
+    """
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('allocated', 'Allocated'),
+        ('expired', 'Expired'),
+        ('withdrawn', 'Withdrawn'),
+    ]
+    
+    # Lower goes first, ties go to the earliest request; fixed when joining
+    ROLE_PRIORITY = {'super_admin': 0, 'lab_manager': 1, 'researcher': 2, 'student': 3}
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries')
+    equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE, related_name='waitlist_entries')
+    window_start = models.DateTimeField()
+    window_end = models.DateTimeField()
+    duration = models.DurationField()
+    purpose = models.TextField(blank=True)
+    priority = models.PositiveSmallIntegerField(default=3)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
+    reservation = models.OneToOneField(Reservation, on_delete=models.SET_NULL, blank=True, null=True,
+                                       related_name='waitlist_entry')  # The booking it was given
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.equipment.name} ({self.status})"
+    
+    class Meta:
+        ordering = ['priority', 'created_at', 'id']
+        indexes = [
+            # Allocator: waiting entries of an equipment item whose window overlaps a freed slot
+            models.Index(
+                fields=['equipment', 'window_start', 'window_end'],
+                name='waitlist_window_idx',
+                condition=models.Q(status='waiting'),
+            ),
+            # A user's entries, newest first
+            models.Index(fields=['user', '-created_at'], name='waitlist_user_recent_idx'),
+        ]
+
+class QuotaPolicy(models.Model):
+    """
+    Most hours per week that one user, each user with a role, or a whole
+    department together may book on an equipment item or a category
+    A user policy replaces the role policy on the same target; department
+    policies apply on top (quotas.py)
+    """
+    SCOPE_CHOICES = [
+        ('user', 'User'),
+        ('role', 'Role'),
+        ('department', 'Department'),
+    ]
+    
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True, related_name='quota_policies')
+    role = models.CharField(max_length=20, choices=User.ROLE_CHOICES, blank=True)
+    department = models.CharField(max_length=100, blank=True)
+    equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE, blank=True, null=True,
+                                  related_name='quota_policies')
+    category = models.ForeignKey(EquipmentCategory, on_delete=models.CASCADE, blank=True, null=True,
+                                 related_name='quota_policies')
+    hours_per_week = models.FloatField()
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        subject = {'user': self.user_id, 'role': self.role, 'department': self.department}[self.scope]
+        target = f'equipment {self.equipment_id}' if self.equipment_id else f'category {self.category_id}'
+        return f"{self.scope} {subject}: {self.hours_per_week}h/week on {target}"
+    
+    class Meta:
+        verbose_name_plural = 'quota policies'
+        constraints = [
+            # Exactly one target
+            models.CheckConstraint(
+                condition=models.Q(equipment__isnull=False, category__isnull=True)
+                | models.Q(equipment__isnull=True, category__isnull=False),
+                name='quota_policy_one_target',
+            ),
+            # The subject field that goes with the scope
+            models.CheckConstraint(
+                condition=models.Q(scope='user', user__isnull=False)
+                | models.Q(scope='role', role__gt='')
+                | models.Q(scope='department', department__gt=''),
+                name='quota_policy_subject',
+            ),
+            models.CheckConstraint(condition=models.Q(hours_per_week__gte=0), name='quota_policy_hours'),
+        ]
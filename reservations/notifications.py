@@ -0,0 +1,208 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from users.models import User
+from .models import BLOCKING_STATUSES, MaintenanceLog, Notification, NotificationJob, Reservation
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+
+# A claimed job whose worker died is retaken after this long
+LEASE = timedelta(minutes=5)
+
+
+def enqueue(event, dedupe_key=None, **payload):
+    """
+    Queue a notification event; a single INSERT in the caller's transaction,
+    so the event is committed (or rolled back) together with its cause
+    """
+    job = NotificationJob(event=event, payload=payload, dedupe_key=dedupe_key)
+    if dedupe_key:
+        NotificationJob.objects.bulk_create([job], ignore_conflicts=True)
+    else:
+        job.save()
+    return job
+
+
+def enqueue_due_reminders(now=None):
+    """
+    Queue one reminder per confirmed reservation starting within the lead
+    time; the dedupe key keeps repeated runs from queueing it twice
+    """
+    now = now or timezone.now()
+    lead = timedelta(hours=getattr(settings, 'NOTIFICATION_REMINDER_HOURS', 24))
+    due = Reservation.objects.filter(
+        status='confirmed', start_time__gt=now, start_time__lte=now + lead
+    ).values_list('pk', 'start_time')
+    jobs = [
+        NotificationJob(
+            event='reservation_reminder',
+            payload={'reservation_id': pk},
+            dedupe_key=f'reminder:{pk}:{start_time:%Y%m%d%H%M}',
+        )
+        for pk, start_time in due.iterator()
+    ]
+    NotificationJob.objects.bulk_create(jobs, batch_size=500, ignore_conflicts=True)
+    return len(jobs)
+
+
+def claim_jobs(limit, now=None):
+    """
+    Lease up to `limit` due jobs to this worker
+    The UPDATE re-checks the lease, so concurrent workers never share a job
+    """
+    now = now or timezone.now()
+    token = uuid.uuid4().hex
+    due = NotificationJob.objects.filter(status='pending', run_at__lte=now).exclude(locked_until__gt=now)
+    due_ids = list(due.values_list('pk', flat=True)[:limit])
+    if not due_ids:
+        return []
+    due.filter(pk__in=due_ids).update(claimed_by=token, locked_until=now + LEASE)
+    return list(NotificationJob.objects.filter(claimed_by=token, status='pending'))
+
+
+def _reservation_notification(job, reservation):
+    equipment = reservation.equipment.name
+    when = timezone.localtime(reservation.start_time).strftime('%a %d %b %Y, %H:%M')
+    if job.event == 'reservation_confirmation':
+        title = f'Reservation confirmed: {equipment}'
+        message = f'Your reservation of {equipment} on {when} has been confirmed.'
+    elif job.event == 'waitlist_allocated':
+        title = f'Waitlist: {equipment} on {when} is yours'
+        message = f'A slot opened up and {equipment} is now reserved for you on {when}, as requested on the waitlist.'
+        if reservation.status == 'pending':
+            message += ' It still needs to be approved by a lab manager.'
+    else:
+        title = f'Reminder: {equipment} on {when}'
+        message = f'Your reservation of {equipment} starts on {when}.'
+    return Notification(user=reservation.user, notification_type=job.event, title=title, message=message)
+
+
+def _maintenance_notifications(job, maintenance):
+    """
+    One alert per user holding a reservation during the maintenance window,
+    or owning one of the bookings it displaced (payload reservation_ids)
+    """
+    displaced = job.payload.get('reservation_ids') or []
+    users = User.objects.filter(
+        Q(
+            reservations__equipment_id=maintenance.equipment_id,
+            reservations__status__in=BLOCKING_STATUSES,
+            reservations__start_time__lt=maintenance.end_date,
+            reservations__end_time__gt=maintenance.start_date,
+        ) | Q(reservations__id__in=displaced)
+    ).distinct().only('id', 'username', 'email')
+    start = timezone.localtime(maintenance.start_date).strftime('%a %d %b %Y, %H:%M')
+    end = timezone.localtime(maintenance.end_date).strftime('%a %d %b %Y, %H:%M')
+    title = f'Maintenance scheduled: {maintenance.equipment.name}'
+    message = (
+        f'{maintenance.equipment.name} is under {maintenance.maintenance_type} maintenance '
+        f'from {start} to {end}, which overlaps your reservation.'
+    )
+    if displaced:
+        message += ' Affected reservations were moved to the next free slot or cancelled.'
+
+    return [
+        Notification(user=user, notification_type=job.event, title=title, message=message)
+        for user in users
+    ]
+
+
+def build_notifications(jobs):
+    """
+    Notification rows per job id, loading the referenced rows in bulk
+    Jobs whose reservation/maintenance is gone (or no longer applies) map to []
+    """
+    reservation_ids = {job.payload.get('reservation_id') for job in jobs} - {None}
+    reservations = Reservation.objects.select_related('user', 'equipment').in_bulk(reservation_ids)
+    maintenance_ids = {job.payload.get('maintenance_id') for job in jobs} - {None}
+    maintenance = MaintenanceLog.objects.select_related('equipment').in_bulk(maintenance_ids)
+
+    built = {}
+    for job in jobs:
+        if job.event == 'maintenance_alert':
+            log = maintenance.get(job.payload.get('maintenance_id'))
+            built[job.pk] = _maintenance_notifications(job, log) if log else []
+        else:
+            reservation = reservations.get(job.payload.get('reservation_id'))
+            # A reminder for a reservation cancelled in the meantime is dropped;
+            # waitlist slots of regular users are allocated pending approval
+            live = ['pending', 'confirmed'] if job.event == 'waitlist_allocated' else ['confirmed']
+            if reservation is None or reservation.status not in live:
+                built[job.pk] = []
+            else:
+                built[job.pk] = [_reservation_notification(job, reservation)]
+    return built
+
+
+def send_emails(notifications):
+    """
+    Email each notification to its user, batched over one backend connection
+    Delivery failures are logged; the in-app notification already exists
+    """
+    messages = [
+        EmailMessage(subject=notification.title, body=notification.message, to=[notification.user.email])
+        for notification in notifications if notification.user.email
+    ]
+    batch_size = getattr(settings, 'NOTIFICATION_EMAIL_BATCH_SIZE', 100)
+    sent = 0
+    for start in range(0, len(messages), batch_size):
+        try:
+            with get_connection() as connection:
+                sent += connection.send_messages(messages[start:start + batch_size]) or 0
+        except Exception:
+            logger.exception('Sending %s notification emails failed', len(messages[start:start + batch_size]))
+    return sent
+
+
+def _retry(job, error, now):
+    job.attempts += 1
+    job.last_error = str(error)
+    job.locked_until = None
+    if job.attempts >= MAX_ATTEMPTS:
+        job.status = 'failed'
+    else:
+        job.run_at = now + timedelta(seconds=30 * 2 ** job.attempts)  # Exponential backoff
+    job.save(update_fields=['attempts', 'last_error', 'locked_until', 'status', 'run_at'])
+
+
+def process_jobs(batch_size=100, now=None):
+    """
+    Claim a batch of due jobs, write all their notifications with one
+    bulk_create, mark them done with one UPDATE, then send the emails
+    Returns the number of jobs claimed
+    """
+    now = now or timezone.now()
+    jobs = claim_jobs(batch_size, now=now)
+    if not jobs:
+        return 0
+
+    try:
+        built = build_notifications(jobs)
+    except Exception as error:
+        logger.exception('Building notifications failed')
+        for job in jobs:
+            _retry(job, error, now)
+        return len(jobs)
+
+    notifications = [notification for job in jobs for notification in built[job.pk]]
+    with transaction.atomic():
+        Notification.objects.bulk_create(notifications, batch_size=500)
+        NotificationJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status='done', attempts=F('attempts') + 1, locked_until=None
+        )
+    send_emails(notifications)
+    return len(jobs)
+
+
+def purge_finished_jobs(older_than=timedelta(days=7)):
+    return NotificationJob.objects.filter(
+        status='done', created_at__lt=timezone.now() - older_than
+    ).delete()[0]
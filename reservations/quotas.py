@@ -0,0 +1,253 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from analytics.models import UserEquipmentWeeklyUsage
+from analytics.rollups import week_start
+from .models import QuotaPolicy
+
+# Rounding slack when comparing booked hours with a limit
+EPSILON = 1e-6
+
+
+class QuotaExceeded(APIException):
+    """
+    Raised when a booking would take a user, or their department, past a
+    weekly quota; rendered like ReservationConflict
+    """
+    status_code = status.HTTP_403_FORBIDDEN
+    default_detail = 'This booking exceeds a weekly quota.'
+    default_code = 'quota_exceeded'
+
+    def __init__(self, message=None):
+        super().__init__()
+        self.detail = {'error': message or str(self.default_detail), 'code': self.default_code}
+
+
+def week_of(moment):
+    """
+    Monday of the local week a reservation starting at `moment` counts in
+    """
+    return week_start(timezone.localdate(moment))
+
+
+def weeks_between(start, end):
+    """
+    Mondays of every week from the one of `start` to the one of `end`
+    """
+    week, last = week_of(start), week_of(end)
+    weeks = []
+    while week <= last:
+        weeks.append(week)
+        week += timedelta(weeks=1)
+    return weeks
+
+
+def lock_policies(policy_ids):
+    """
+    Serialize quota checks against these policies until the transaction
+    ends, taken in id order like lock_equipment_items
+    A category or department quota spans several equipment items, so the
+    equipment locks alone would let two bookings on different items both
+    take its last hours
+    """
+    policy_ids = sorted(set(policy_ids))
+    if connection.features.has_select_for_update:
+        list(QuotaPolicy.objects.select_for_update().filter(pk__in=policy_ids).order_by('pk')
+             .values_list('pk', flat=True))
+    else:
+        QuotaPolicy.objects.filter(pk__in=policy_ids).update(hours_per_week=F('hours_per_week'))
+
+
+def _hours(start, end):
+    return (end - start).total_seconds() / 3600
+
+
+class QuotaLedger:
+    """
+    Quota policies and weekly counters for some users, equipment items and
+    weeks, loaded with one query each (the counters only when a policy
+    applies), so a whole batch is checked without touching the history
+    For each target (the item, then its category) a user policy replaces
+    the role policy; department policies apply on top
+    Call add() for every booking accepted, so later bookings see it, and
+    release() for the old times of bookings being moved or cancelled
+    With lock=True (inside a transaction) the policies are locked before
+    the counters are read
+    """
+    def __init__(self, users, equipment_items, weeks, lock=False):
+        users = {user.pk: user for user in users}
+        categories = {item.category_id for item in equipment_items}
+        departments = {user.department for user in users.values() if user.department}
+        subjects = (Q(scope='user', user_id__in=list(users))
+                    | Q(scope='role', role__in={user.role for user in users.values()}))
+        if departments:
+            subjects |= Q(scope='department', department__in=departments)
+        self.policies = list(
+            QuotaPolicy.objects.filter(subjects, is_active=True)
+            .filter(Q(equipment_id__in=[item.pk for item in equipment_items]) | Q(category_id__in=categories))
+            .select_related('equipment', 'category')
+        )
+        self.usage = defaultdict(float)
+        self.baseline = None  # Usage before the first release()
+        if not self.policies:
+            return
+        if lock:
+            lock_policies([policy.pk for policy in self.policies])
+
+        counters = UserEquipmentWeeklyUsage.objects.filter(week__in=set(weeks)).filter(
+            Q(equipment_id__in={policy.equipment_id for policy in self.policies if policy.equipment_id})
+            | Q(equipment__category_id__in={policy.category_id for policy in self.policies if policy.category_id})
+        )
+        owners = Q(user_id__in=list(users))
+        # Department quotas count every member's hours
+        bound = {policy.department for policy in self.policies if policy.scope == 'department'}
+        if bound:
+            owners |= Q(user__department__in=bound)
+        for row in counters.filter(owners).values_list(
+            'user_id', 'user__department', 'equipment_id', 'equipment__category_id', 'week', 'reserved_hours'
+        ):
+            self._count(*row)
+
+    def _count(self, user_id, department, equipment_id, category_id, week, hours):
+        self.usage['user', user_id, 'equipment', equipment_id, week] += hours
+        self.usage['user', user_id, 'category', category_id, week] += hours
+        if department:
+            self.usage['department', department, 'equipment', equipment_id, week] += hours
+            self.usage['department', department, 'category', category_id, week] += hours
+
+    def applicable(self, user, equipment):
+        """
+        Policies that bind `user` on `equipment`
+        """
+        found = []
+        for target, target_id in (('equipment', equipment.pk), ('category', equipment.category_id)):
+            matching = [
+                policy for policy in self.policies
+                if getattr(policy, f'{target}_id') == target_id and (
+                    (policy.scope == 'user' and policy.user_id == user.pk)
+                    or (policy.scope == 'role' and policy.role == user.role)
+                    or (policy.scope == 'department' and user.department and policy.department == user.department)
+                )
+            ]
+            personal = [policy for policy in matching if policy.scope == 'user']
+            found += personal or [policy for policy in matching if policy.scope == 'role']
+            found += [policy for policy in matching if policy.scope == 'department']
+        return found
+
+    def used(self, policy, user, week, usage=None):
+        """
+        Hours counted against `policy` for `user` in `week`
+        """
+        usage = self.usage if usage is None else usage
+        target = 'equipment' if policy.equipment_id else 'category'
+        target_id = policy.equipment_id or policy.category_id
+        if policy.scope == 'department':
+            return usage['department', policy.department, target, target_id, week]
+        return usage['user', user.pk, target, target_id, week]
+
+    def breach(self, user, equipment, start, end):
+        """
+        Message for the first quota that booking [start, end) would exceed, or None
+        A change is only refused when it adds hours to a quota: moving or
+        shortening a booking of someone already over a (since lowered)
+        limit is allowed
+        """
+        week = week_of(start)
+        hours = _hours(start, end)
+        for policy in self.applicable(user, equipment):
+            used = self.used(policy, user, week)
+            before = used if self.baseline is None else self.used(policy, user, week, self.baseline)
+            if used + hours > policy.hours_per_week + EPSILON and used + hours > before + EPSILON:
+                subject = {
+                    'user': 'your', 'role': f'the {policy.role}', 'department': f'the {policy.department} department',
+                }[policy.scope]
+                target = policy.equipment.name if policy.equipment_id else f'{policy.category.name} equipment'
+                return (f'{target} allows {policy.hours_per_week:g} hours per week under {subject} quota; '
+                        f'{round(used, 2):g} of them are booked in the week of {week.isoformat()}.')
+        return None
+
+    def add(self, user, equipment, start, end):
+        self._count(user.pk, user.department, equipment.pk, equipment.category_id, week_of(start), _hours(start, end))
+
+    def release(self, user, equipment, start, end):
+        if self.baseline is None:
+            self.baseline = self.usage.copy()
+        self._count(user.pk, user.department, equipment.pk, equipment.category_id, week_of(start), -_hours(start, end))
+
+    def remaining(self, user, equipment, week):
+        """
+        Every binding quota of `user` on `equipment` in `week` as
+        {scope, equipment, category, limit, used, remaining}
+        """
+        lines = []
+        for policy in self.applicable(user, equipment):
+            used = self.used(policy, user, week)
+            lines.append({
+                'scope': policy.scope,
+                'equipment': policy.equipment_id,
+                'category': policy.category_id,
+                'limit': policy.hours_per_week,
+                'used': round(used, 2),
+                'remaining': round(max(policy.hours_per_week - used, 0), 2),
+            })
+        return lines
+
+
+def check_quotas(bookings, released=()):
+    """
+    Check new or moved bookings ([(user, equipment, start, end)]) in order,
+    each counting towards the next, after giving back the hours of
+    `released` (the old times of moved bookings and the cancelled ones,
+    same shape); returns {index: message} for the refused bookings
+    Run it in the booking's transaction: the policies stay locked until it
+    commits, so the counters cannot move meanwhile
+    """
+    if not bookings:
+        return {}
+    changes = list(bookings) + list(released)
+    ledger = QuotaLedger(
+        list({user.pk: user for user, *_ in changes}.values()),
+        list({item.pk: item for _, item, *_ in changes}.values()),
+        {week_of(start) for _, _, start, _ in changes},
+        lock=True,
+    )
+    if not ledger.policies:
+        return {}
+    for user, equipment, start, end in released:
+        ledger.release(user, equipment, start, end)
+    refused = {}
+    for index, (user, equipment, start, end) in enumerate(bookings):
+        message = ledger.breach(user, equipment, start, end)
+        if message:
+            refused[index] = message
+        else:
+            ledger.add(user, equipment, start, end)
+    return refused
+
+
+def enforce_quotas(user, equipment, intervals, released=()):
+    """
+    Raise QuotaExceeded unless every interval of one user's booking fits;
+    released: (equipment, start, end) the booking held before this change
+    """
+    refused = check_quotas(
+        [(user, equipment, start, end) for start, end in intervals],
+        [(user, *interval) for interval in released],
+    )
+    if refused:
+        raise QuotaExceeded(refused[min(refused)])
+
+
+def remaining_quotas(user, equipment, first_week, weeks=1):
+    """
+    remaining() for `weeks` weeks from the week of `first_week`
+    """
+    first_week = week_start(first_week)
+    days = [first_week + timedelta(weeks=offset) for offset in range(weeks)]
+    ledger = QuotaLedger([user], [equipment], days)
+    return [{'week': day, 'quotas': ledger.remaining(user, equipment, day)} for day in days]
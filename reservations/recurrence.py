@@ -0,0 +1,226 @@
+import calendar
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .conflicts import OVERLAP_CONSTRAINT, ReservationConflict, blocking_intervals, lock_equipment
+from .models import Reservation
+from .quotas import enforce_quotas
+from .signals import reservations_bulk_created
+
+# Hard cap on how many occurrences one series can create
+MAX_OCCURRENCES = 500
+
+WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+# Plain pattern names accepted besides RRULE strings
+SHORTCUTS = {
+    'daily': 'FREQ=DAILY',
+    'weekly': 'FREQ=WEEKLY',
+    'biweekly': 'FREQ=WEEKLY;INTERVAL=2',
+    'monthly': 'FREQ=MONTHLY',
+}
+
+
+class RecurrenceRule:
+    """
+    Small RRULE subset: FREQ=DAILY|WEEKLY|MONTHLY, INTERVAL, BYDAY (weekly), COUNT
+    e.g. 'weekly' or 'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;COUNT=10'
+    """
+
+    def __init__(self, freq, interval=1, byday=None, count=None):
+        self.freq = freq
+        self.interval = interval
+        self.byday = byday  # Sorted weekday numbers (0 = Monday), weekly only
+        self.count = count
+
+    @classmethod
+    def parse(cls, pattern):
+        """
+        Build a rule from a recurring_pattern value, ValueError if it is invalid
+        """
+        pattern = (pattern or '').strip()
+        pattern = SHORTCUTS.get(pattern.lower(), pattern)
+        parts = {}
+        for part in pattern.upper().split(';'):
+            if not part:
+                continue
+            key, sep, value = part.partition('=')
+            if not sep:
+                raise ValueError(f'Invalid recurrence part "{part}"')
+            parts[key.strip()] = value.strip()
+
+        freq = parts.pop('FREQ', None)
+        if freq not in ('DAILY', 'WEEKLY', 'MONTHLY'):
+            raise ValueError('Recurrence must be daily, weekly, monthly or FREQ=DAILY|WEEKLY|MONTHLY')
+        try:
+            interval = int(parts.pop('INTERVAL', 1))
+            count = int(parts['COUNT']) if 'COUNT' in parts else None
+        except ValueError:
+            raise ValueError('INTERVAL and COUNT must be whole numbers')
+        parts.pop('COUNT', None)
+        if interval < 1 or (count is not None and count < 1):
+            raise ValueError('INTERVAL and COUNT must be positive')
+
+        byday = None
+        if 'BYDAY' in parts:
+            if freq != 'WEEKLY':
+                raise ValueError('BYDAY is only supported for weekly recurrence')
+            days = parts.pop('BYDAY').split(',')
+            if any(day not in WEEKDAYS for day in days):
+                raise ValueError('BYDAY must list days as MO,TU,WE,TH,FR,SA,SU')
+            byday = sorted({WEEKDAYS.index(day) for day in days})
+        if parts:
+            raise ValueError(f'Unsupported recurrence option(s): {", ".join(sorted(parts))}')
+
+        return cls(freq, interval, byday, count)
+
+    def dates(self, first):
+        """
+        Yield (index, date) for every occurrence date from `first` on
+        """
+        if self.freq == 'DAILY':
+            k = 0
+            while True:
+                yield k, first + timedelta(days=k * self.interval)
+                k += 1
+
+        elif self.freq == 'WEEKLY':
+            days = self.byday or [first.weekday()]
+            week0 = first - timedelta(days=first.weekday())
+            index = 0
+            w = 0
+            while True:
+                week = week0 + timedelta(weeks=w * self.interval)
+                for day in days:
+                    if w == 0 and day < first.weekday():
+                        continue
+                    yield index, week + timedelta(days=day)
+                    index += 1
+                w += 1
+
+        else:  # MONTHLY
+            index = 0
+            month = 0
+            while True:
+                year, month_index = divmod(first.month - 1 + month, 12)
+                year += first.year
+                if first.day <= calendar.monthrange(year, month_index + 1)[1]:
+                    yield index, first.replace(year=year, month=month_index + 1)
+                    index += 1
+                month += self.interval
+
+
+def expand(rule, start_time, end_time, until=None, exceptions=()):
+    """
+    Yield (start, end) for each occurrence of a series
+    Occurrences keep the same local wall-clock time across DST changes
+    """
+    duration = end_time - start_time
+    local_start = timezone.localtime(start_time)
+    tz = local_start.tzinfo
+    exceptions = set(exceptions)
+
+    for index, day in rule.dates(local_start.date()):
+        if rule.count is not None and index >= rule.count:
+            return
+        occurrence_start = timezone.make_aware(datetime.combine(day, local_start.time()), tz)
+        if until is not None and occurrence_start > until:
+            return
+        if day.isoformat() in exceptions:
+            continue
+        yield occurrence_start, occurrence_start + duration
+
+
+def series_intervals(rule, start_time, end_time, until=None, exceptions=()):
+    """
+    Materialize a whole (bounded) series, ValueError if it is too long
+    """
+    if until is None and rule.count is None:
+        raise ValueError('Recurring reservations need a recurring_end_date or a COUNT')
+    intervals = []
+    for interval in expand(rule, start_time, end_time, until, exceptions):
+        intervals.append(interval)
+        if len(intervals) > MAX_OCCURRENCES:
+            raise ValueError(f'A series can have at most {MAX_OCCURRENCES} occurrences')
+    if not intervals:
+        raise ValueError('This recurrence has no occurrences')
+    return intervals
+
+
+def find_series_conflicts(equipment_id, intervals, exclude_ids=()):
+    """
+    Existing bookings and maintenance windows (Blocks) that overlap any of
+    the sorted intervals
+    One query for the whole series, then a bisect per occurrence
+    """
+    if not intervals:
+        return []
+    rows = blocking_intervals(
+        [equipment_id], intervals[0][0], max(end for _, end in intervals), exclude_ids=exclude_ids
+    )
+    starts = [row.start_time for row in rows]
+    longest_end = []  # Latest end_time among rows[:i + 1]
+    for row in rows:
+        longest_end.append(max(row.end_time, longest_end[-1]) if longest_end else row.end_time)
+
+    conflicts = {}
+    for occurrence_start, occurrence_end in intervals:
+        i = bisect_left(starts, occurrence_end)  # rows[:i] start before this occurrence ends
+        while i > 0 and longest_end[i - 1] > occurrence_start:
+            i -= 1
+            if rows[i].end_time > occurrence_start:
+                conflicts[rows[i].kind, rows[i].id] = rows[i]
+    return sorted(conflicts.values(), key=lambda row: row.start_time)
+
+
+def create_series(serializer, **kwargs):
+    """
+    Save a recurring reservation and bulk create all of its occurrences
+    The whole series is checked against existing bookings and the weekly
+    quotas up front, and either every occurrence is booked or none is
+    """
+    data = serializer.validated_data
+    rule = RecurrenceRule.parse(data['recurring_pattern'])
+    intervals = series_intervals(
+        rule, data['start_time'], data['end_time'],
+        until=data.get('recurring_end_date'),
+        exceptions=data.get('recurring_exceptions', []),
+    )
+    equipment = data['equipment']
+
+    with transaction.atomic():
+        lock_equipment(equipment.pk)
+        conflicts = find_series_conflicts(equipment.pk, intervals)
+        if conflicts:
+            raise ReservationConflict(conflicts[:10])
+        enforce_quotas(kwargs['user'], equipment, intervals)
+
+        try:
+            with transaction.atomic():
+                # The first occurrence is the series master, the rest point at it
+                master = serializer.save(
+                    start_time=intervals[0][0], end_time=intervals[0][1], **kwargs
+                )
+                occurrences = Reservation.objects.bulk_create([
+                    Reservation(
+                        user=master.user,
+                        equipment=equipment,
+                        start_time=occurrence_start,
+                        end_time=occurrence_end,
+                        status=master.status,
+                        purpose=master.purpose,
+                        is_recurring=True,
+                        recurring_pattern=master.recurring_pattern,
+                        recurring_end_date=master.recurring_end_date,
+                        series=master,
+                    )
+                    for occurrence_start, occurrence_end in intervals[1:]
+                ])
+                reservations_bulk_created.send(sender=Reservation, reservations=occurrences)
+        except IntegrityError as exc:
+            if OVERLAP_CONSTRAINT in str(exc):
+                raise ReservationConflict()
+            raise
+    return master
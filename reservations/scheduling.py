@@ -0,0 +1,155 @@
+from bisect import bisect_right
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .availability import busy_intervals, free_intervals
+
+# How far ahead suggestions look by default
+DEFAULT_HORIZON = timedelta(days=14)
+
+# Suggested start times are rounded up to this step
+SLOT_STEP = timedelta(minutes=15)
+
+MAX_SUGGESTIONS = 20
+MAX_HORIZON_DAYS = 90
+
+
+def round_up(moment, step=SLOT_STEP):
+    remainder = (moment - moment.min.replace(tzinfo=moment.tzinfo)) % step
+    return moment + (step - remainder) if remainder else moment
+
+
+def parse_suggestion_params(params):
+    """
+    Read duration (hours), after (ISO 8601, default now), count and
+    horizon_days query parameters
+    Returns (after, duration, count, horizon, error message)
+    """
+    try:
+        duration = timedelta(hours=float(params.get('duration', '')))
+        count = int(params.get('count', 5))
+        horizon = timedelta(days=int(params.get('horizon_days', DEFAULT_HORIZON.days)))
+    except (ValueError, OverflowError):
+        return None, None, None, None, 'duration (hours), count and horizon_days must be numbers'
+    if duration <= timedelta(0):
+        return None, None, None, None, 'duration must be a positive number of hours'
+    if not 1 <= count <= MAX_SUGGESTIONS:
+        return None, None, None, None, f'count must be between 1 and {MAX_SUGGESTIONS}'
+    if not timedelta(days=1) <= horizon <= timedelta(days=MAX_HORIZON_DAYS):
+        return None, None, None, None, f'horizon_days must be between 1 and {MAX_HORIZON_DAYS}'
+
+    now = timezone.now()
+    after = now
+    if params.get('after'):
+        after = parse_datetime(params['after'])
+        if after is None:
+            return None, None, None, None, 'after must be an ISO 8601 date and time'
+        if timezone.is_naive(after):
+            after = timezone.make_aware(after)
+        after = max(after, now)  # Never suggest the past
+    return after, duration, count, horizon, None
+
+
+class FreeSlotIndex:
+    """
+    Free gaps of one equipment item over a horizon, sorted by start, with a
+    max-length segment tree over them. Finding the first gap at or after a
+    time that fits a duration takes one bisect and one tree descent, so
+    O(log n) in the number of busy intervals
+    """
+
+    def __init__(self, busy, start, end):
+        self.gaps = free_intervals(busy, start, end)
+        self.starts = [gap_start for gap_start, _ in self.gaps]
+        self.size = 1
+        while self.size < len(self.gaps):
+            self.size *= 2
+        self.tree = [timedelta(0)] * (2 * self.size)
+        for i, (gap_start, gap_end) in enumerate(self.gaps):
+            self.tree[self.size + i] = gap_end - gap_start
+        for node in range(self.size - 1, 0, -1):
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+
+    def _first_at_least(self, first, duration):
+        """
+        Index of the first gap at position >= first at least `duration` long
+        """
+        if first >= len(self.gaps):
+            return None
+        # Climb from the leaf until a right sibling subtree could hold a fit
+        node = self.size + first
+        if self.tree[node] >= duration:
+            return first
+        while node > 1:
+            if node % 2 == 0 and self.tree[node + 1] >= duration:
+                node += 1
+                break
+            node //= 2
+        else:
+            return None
+        # Then descend to its leftmost fitting leaf
+        while node < self.size:
+            node = 2 * node if self.tree[2 * node] >= duration else 2 * node + 1
+        return node - self.size
+
+    def first_fit(self, after, duration):
+        """
+        Earliest start >= after with `duration` free from there, or None
+        """
+        i = bisect_right(self.starts, after) - 1
+        if i >= 0:
+            start = round_up(after)
+            if start + duration <= self.gaps[i][1]:
+                return start
+        i += 1
+        while True:
+            i = self._first_at_least(i, duration)
+            if i is None:
+                return None
+            start = round_up(self.gaps[i][0])
+            if start + duration <= self.gaps[i][1]:
+                return start
+            i += 1  # Rounding ate the fit, rare: keep looking
+
+    def next_slots(self, after, duration, count):
+        """
+        Up to `count` back-to-back free slots of `duration` from `after` on
+        """
+        slots = []
+        while len(slots) < count:
+            start = self.first_fit(after, duration)
+            if start is None:
+                break
+            slots.append((start, start + duration))
+            after = start + duration
+        return slots
+
+
+def suggest_slots(equipment, after, duration, count, horizon=DEFAULT_HORIZON):
+    """
+    Next free slots of one equipment item, from one interval query
+    """
+    end = after + horizon
+    busy = busy_intervals([equipment.pk], after, end)[equipment.pk]
+    return FreeSlotIndex(busy, after, end).next_slots(after, duration, count)
+
+
+def earliest_slots(equipment_items, after, duration, count, horizon=DEFAULT_HORIZON):
+    """
+    Earliest free slot of each equipment item that allows `duration`, sorted
+    by start and cut to `count`; busy intervals of all items in one query
+    Returns [(equipment, start, end)]
+    """
+    items = [item for item in equipment_items if duration <= timedelta(hours=item.max_reservation_hours)]
+    if not items:
+        return []
+    end = after + horizon
+    busy = busy_intervals([item.pk for item in items], after, end)
+    found = []
+    for item in items:
+        start = FreeSlotIndex(busy[item.pk], after, end).first_fit(after, duration)
+        if start is not None:
+            found.append((item, start, start + duration))
+    found.sort(key=lambda slot: (slot[1], slot[0].pk))
+    return found[:count]
@@ -1,9 +1,18 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import serializers
-from .models import Reservation, MaintenanceLog, Notification
+from .models import Reservation, MaintenanceLog, Notification, WaitlistEntry
 from users.serializers import UserSerializer
+from equipment.models import Equipment
 from equipment.serializers import EquipmentSerializer
+from reservation_system.serializers import DynamicFieldsMixin
+from .recurrence import RecurrenceRule, series_intervals
+from .states import check_transition
+from .waitlist import free_slot
 
-class ReservationSerializer(serializers.ModelSerializer):
+class ReservationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for Reservation model with related data
     Shows user and equipment details instead of just IDs
@@ -17,10 +26,121 @@ class ReservationSerializer(serializers.ModelSerializer):
         model = Reservation
         fields = ['id', 'user', 'user_name', 'equipment', 'equipment_name', 'equipment_details',
                  'start_time', 'end_time', 'status', 'purpose', 'is_recurring',
-                 'recurring_pattern', 'recurring_end_date', 'created_at']
-        read_only_fields = ['id', 'user', 'created_at']
+                 'recurring_pattern', 'recurring_end_date', 'recurring_exceptions',
+                 'series', 'created_at']
+        read_only_fields = ['id', 'user', 'series', 'created_at']
+        expandable_fields = ['equipment_details']  # Only sent with ?expand=equipment_details
+
+    def validate(self, attrs):
+        """
+        A reservation must end after it starts, and a new or changed one
+        last at most the equipment's max_reservation_hours
+        """
+        start_time = attrs.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = attrs.get('end_time', getattr(self.instance, 'end_time', None))
+        if start_time and end_time and end_time <= start_time:
+            raise serializers.ValidationError({'end_time': 'End time must be after start time.'})
+        # Only when the booking's length or equipment changes: a status-only
+        # update of an older, longer booking is not refused
+        changed = any(field in attrs for field in ('start_time', 'end_time', 'equipment'))
+        equipment = attrs.get('equipment', getattr(self.instance, 'equipment', None))
+        # Batch entries name the equipment by id; the batch checks them itself
+        if (changed and isinstance(equipment, Equipment) and start_time and end_time
+                and end_time - start_time > timedelta(hours=equipment.max_reservation_hours)):
+            raise serializers.ValidationError({
+                'end_time': f'{equipment.name} can be reserved for at most {equipment.max_reservation_hours} hours.'
+            })
+
+        # New recurring reservations must describe a valid, bounded series
+        if self.instance is None and attrs.get('is_recurring'):
+            try:
+                rule = RecurrenceRule.parse(attrs.get('recurring_pattern'))
+                series_intervals(rule, start_time, end_time,
+                                 until=attrs.get('recurring_end_date'),
+                                 exceptions=attrs.get('recurring_exceptions', []))
+            except ValueError as exc:
+                raise serializers.ValidationError({'recurring_pattern': str(exc)})
+        return attrs
+
+    def validate_status(self, value):
+        """
+        Status changes follow the reservation state machine (states.py)
+        """
+        request = self.context.get('request')
+        is_admin = request is not None and request.user.role in ['super_admin', 'lab_manager']
+        if self.instance is None:
+            allowed = ['pending', 'confirmed'] if is_admin else ['pending']
+            if value not in allowed:
+                raise serializers.ValidationError(f'New reservations must be {" or ".join(allowed)}.')
+            return value
+        if request is not None:
+            error = check_transition(self.instance, value, request.user)
+            if error:
+                raise serializers.ValidationError(error)
+        return value
+
+    def validate_recurring_exceptions(self, value):
+        """
+        Exceptions are a list of 'YYYY-MM-DD' dates to skip
+        """
+        if not isinstance(value, list) or not all(isinstance(day, str) for day in value):
+            raise serializers.ValidationError('Must be a list of YYYY-MM-DD dates.')
+        days = []
+        for day in value:
+            try:
+                parsed = parse_date(day)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                raise serializers.ValidationError(f'Invalid date "{day}".')
+            days.append(parsed.isoformat())
+        return days
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, request=None):
+        """
+        Build the query plan for a list of reservations up front
+        Joins user, equipment and category in the same query and only loads
+        the columns this serializer actually renders (no per-row queries)
+        """
+        columns = [
+            'id', 'user', 'equipment', 'start_time', 'end_time', 'status',
+            'purpose', 'is_recurring', 'recurring_pattern', 'recurring_end_date',
+            'recurring_exceptions', 'series', 'created_at', 'updated_at', 'user__username', 'equipment__name',
+            'equipment__max_reservation_hours',
+        ]
+        if 'equipment_details' not in cls.get_expanded_fields(request):
+            return queryset.select_related('user', 'equipment').only(*columns)
+
+        columns += [
+            f'equipment__{field}' for field in EquipmentSerializer.Meta.fields
+            if field != 'category_name'
+        ]
+        return queryset.select_related(
+            'user', 'equipment', 'equipment__category'
+        ).only(*columns, 'equipment__category__name')
+
+class BatchReservationSerializer(ReservationSerializer):
+    """
+    New reservation in a batch (batch.py): equipment is a plain id, resolved
+    for the whole batch in one query, and there is no recurrence
+    """
+    equipment = serializers.IntegerField(min_value=1)
+
+    class Meta(ReservationSerializer.Meta):
+        fields = ['equipment', 'start_time', 'end_time', 'status', 'purpose']
+
+class BatchReservationUpdateSerializer(BatchReservationSerializer):
+    """
+    Change to an existing reservation in a batch: times and purpose only
+    (moving to other equipment is a cancel plus a create)
+    """
+    equipment = None
+
+    class Meta(BatchReservationSerializer.Meta):
+        fields = ['start_time', 'end_time', 'purpose']
 
-class MaintenanceLogSerializer(serializers.ModelSerializer):
+class MaintenanceLogSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for Maintenance Logs
     """
@@ -32,8 +152,29 @@ class MaintenanceLogSerializer(serializers.ModelSerializer):
                  'description', 'performed_by', 'start_date', 'end_date', 
                  'notes', 'created_at']
         read_only_fields = ['id', 'created_at']
+        extra_kwargs = {'performed_by': {'required': False}}  # Defaults to the requesting user
 
-class NotificationSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        """
+        A maintenance window must end after it starts
+        """
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = attrs.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date and end_date and end_date <= start_date:
+            raise serializers.ValidationError({'end_date': 'End date must be after start date.'})
+        return attrs
+
+class UpcomingMaintenanceSerializer(MaintenanceLogSerializer):
+    """
+    Maintenance window with the number of bookings it displaces
+    """
+    affected_reservations = serializers.IntegerField(read_only=True)
+
+    class Meta(MaintenanceLogSerializer.Meta):
+        fields = ['id', 'equipment', 'equipment_name', 'maintenance_type',
+                 'start_date', 'end_date', 'affected_reservations']
+
+class NotificationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for User Notifications
     """
@@ -41,4 +182,51 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = ['id', 'user', 'notification_type', 'title', 'message', 
                  'is_read', 'created_at']
-        read_only_fields = ['id', 'created_at']
\ No newline at end of file
+        read_only_fields = ['id', 'created_at']
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    """
+    Waitlist entry; duration as "HH:MM:SS"
+    """
+    equipment_name = serializers.CharField(source='equipment.name', read_only=True)
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ['id', 'equipment', 'equipment_name', 'window_start', 'window_end', 'duration',
+                 'purpose', 'priority', 'status', 'reservation', 'created_at']
+        read_only_fields = ['id', 'priority', 'status', 'reservation', 'created_at']
+
+    def validate(self, attrs):
+        """
+        The slot must fit the window and the equipment's longest reservation,
+        and a user waits at most once per equipment and window
+        Windows with a free slot are refused: that slot is booked the normal
+        way, through the approval flow
+        """
+        equipment, duration = attrs['equipment'], attrs['duration']
+        if attrs['window_end'] <= attrs['window_start']:
+            raise serializers.ValidationError({'window_end': 'The window must end after it starts.'})
+        if attrs['window_end'] <= timezone.now():
+            raise serializers.ValidationError({'window_end': 'The window is already over.'})
+        if not timedelta(0) < duration <= attrs['window_end'] - attrs['window_start']:
+            raise serializers.ValidationError({'duration': 'Must be positive and fit inside the window.'})
+        if duration > timedelta(hours=equipment.max_reservation_hours):
+            raise serializers.ValidationError(
+                {'duration': f'{equipment.name} can be reserved for at most {equipment.max_reservation_hours} hours.'}
+            )
+        if not equipment.is_active:
+            raise serializers.ValidationError({'equipment': 'This equipment is not available.'})
+        request = self.context.get('request')
+        if request is not None and WaitlistEntry.objects.filter(
+            user_id=request.user.pk, equipment=equipment, status='waiting',
+            window_start__lt=attrs['window_end'], window_end__gt=attrs['window_start'],
+        ).exists():
+            raise serializers.ValidationError('You are already waiting for this equipment in this window.')
+        slot = free_slot(equipment.pk, attrs['window_start'], attrs['window_end'], duration)
+        if slot:
+            raise serializers.ValidationError(
+                f'{equipment.name} is free from {timezone.localtime(slot[0]).isoformat()} in this window; '
+                f'book that slot instead of joining the waitlist.'
+            )
+        return attrs
@@ -0,0 +1,151 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import Signal, receiver
+from reservation_system.events import equipment_channel, publish_batch_on_commit, publish_on_commit
+from .models import BLOCKING_STATUSES, MaintenanceLog, NotificationJob, Reservation
+from .notifications import enqueue
+
+# Sent after reservations are written with bulk_create, which skips post_save
+# Arguments: reservations (list of Reservation), notify (optional, False when
+# the sender queues its own notifications instead of the confirmations)
+reservations_bulk_created = Signal()
+
+# Sent when a set-based UPDATE moves reservations to another status
+# Arguments: rows (dicts with id, equipment_id, user_id, start_time, end_time),
+# old_status, new_status
+reservations_status_changed = Signal()
+
+# Sent when a bulk UPDATE moves reservations to new times
+# Arguments: rows (dicts with id, equipment_id, user_id, status, the new
+# start_time/end_time and the previous_start_time/previous_end_time)
+reservations_rescheduled = Signal()
+
+
+@receiver(post_init, sender=Reservation)
+def remember_status_for_notifications(sender, instance, **kwargs):
+    # __dict__ so a deferred status is not fetched just for this
+    instance._status_on_load = instance.__dict__.get('status')
+
+
+def _slot(reservation):
+    # No user details: every subscriber of the equipment receives this
+    return {
+        'reservation_id': reservation.pk,
+        'equipment_id': reservation.equipment_id,
+        'start_time': reservation.start_time,
+        'end_time': reservation.end_time,
+        'status': reservation.status,
+    }
+
+
+@receiver(post_save, sender=Reservation)
+def publish_reservation_change(sender, instance, created, **kwargs):
+    if created:
+        event = 'reservation.created'
+    elif instance.status == 'cancelled' and instance._status_on_load != 'cancelled':
+        event = 'reservation.cancelled'
+    else:
+        event = 'reservation.updated'
+    publish_on_commit(equipment_channel(instance.equipment_id), event, _slot(instance))
+
+
+@receiver(post_delete, sender=Reservation)
+def publish_reservation_delete(sender, instance, **kwargs):
+    publish_on_commit(equipment_channel(instance.equipment_id), 'reservation.deleted', _slot(instance))
+
+
+# Slots given back by a cancellation, a no-show, a deletion or a move go to
+# the waitlist (waitlist.py) once the change commits
+
+FREEING_STATUSES = ['cancelled', 'no_show']
+
+
+def _allocate_freed(freed):
+    # Imported here: the allocator sends the signals defined above
+    from .waitlist import allocate_on_commit
+    if freed:
+        allocate_on_commit(freed)
+
+
+@receiver(post_save, sender=Reservation)
+def allocate_on_cancel(sender, instance, created, **kwargs):
+    # Before queue_confirmation, which resets _status_on_load
+    if instance.status in FREEING_STATUSES and instance._status_on_load in BLOCKING_STATUSES:
+        _allocate_freed([(instance.equipment_id, instance.start_time, instance.end_time)])
+
+
+@receiver(post_delete, sender=Reservation)
+def allocate_on_delete(sender, instance, **kwargs):
+    if instance.status in BLOCKING_STATUSES:
+        _allocate_freed([(instance.equipment_id, instance.start_time, instance.end_time)])
+
+
+@receiver(reservations_status_changed)
+def allocate_on_status_change(sender, rows, old_status, new_status, **kwargs):
+    if new_status in FREEING_STATUSES and old_status in BLOCKING_STATUSES:
+        _allocate_freed([(row['equipment_id'], row['start_time'], row['end_time']) for row in rows])
+
+
+@receiver(reservations_rescheduled)
+def allocate_on_reschedule(sender, rows, **kwargs):
+    _allocate_freed([
+        (row['equipment_id'], row['previous_start_time'], row['previous_end_time']) for row in rows
+    ])
+
+
+@receiver(post_save, sender=Reservation)
+def queue_confirmation(sender, instance, created, **kwargs):
+    if instance.status == 'confirmed' and (created or instance._status_on_load != 'confirmed'):
+        enqueue('reservation_confirmation', reservation_id=instance.pk)
+    instance._status_on_load = instance.status
+
+
+@receiver(reservations_bulk_created)
+def publish_bulk_created(sender, reservations, **kwargs):
+    for reservation in reservations:
+        publish_on_commit(equipment_channel(reservation.equipment_id), 'reservation.created', _slot(reservation))
+
+
+@receiver(reservations_status_changed)
+def publish_status_changes(sender, rows, old_status, new_status, **kwargs):
+    event = 'reservation.cancelled' if new_status == 'cancelled' else 'reservation.updated'
+    publish_batch_on_commit([
+        (equipment_channel(row['equipment_id']), event, {
+            'reservation_id': row['id'],
+            'equipment_id': row['equipment_id'],
+            'start_time': row['start_time'],
+            'end_time': row['end_time'],
+            'status': new_status,
+        })
+        for row in rows
+    ])
+
+
+@receiver(reservations_rescheduled)
+def publish_reschedules(sender, rows, **kwargs):
+    publish_batch_on_commit([
+        (equipment_channel(row['equipment_id']), 'reservation.updated', {
+            'reservation_id': row['id'],
+            'equipment_id': row['equipment_id'],
+            'start_time': row['start_time'],
+            'end_time': row['end_time'],
+            'status': row['status'],
+        })
+        for row in rows
+    ])
+
+
+@receiver(reservations_bulk_created)
+def queue_bulk_confirmations(sender, reservations, notify=True, **kwargs):
+    if not notify:
+        return
+    NotificationJob.objects.bulk_create([
+        NotificationJob(event='reservation_confirmation', payload={'reservation_id': reservation.pk})
+        for reservation in reservations if reservation.status == 'confirmed'
+    ])
+
+
+@receiver(post_save, sender=MaintenanceLog)
+def queue_maintenance_alert(sender, instance, **kwargs):
+    # Saving again (e.g. moved dates) alerts again, the worker fans out to
+    # whoever overlaps the window at that point
+    enqueue('maintenance_alert', maintenance_id=instance.pk)
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Reservation
+from .signals import reservations_status_changed
+
+# Allowed status changes; completed, cancelled and no_show are final
+TRANSITIONS = {
+    'pending': {'confirmed', 'cancelled'},
+    'confirmed': {'active', 'completed', 'cancelled', 'no_show'},
+    'active': {'completed'},
+    'completed': set(),
+    'cancelled': set(),
+    'no_show': set(),
+}
+
+# Transitions a reservation's owner may make: cancel, and check in
+OWNER_TRANSITIONS = {('pending', 'cancelled'), ('confirmed', 'cancelled'), ('confirmed', 'active')}
+
+# Columns the status-changed signal carries for each moved reservation
+SWEEP_FIELDS = ['id', 'equipment_id', 'user_id', 'start_time', 'end_time']
+
+
+def check_transition(reservation, new_status, user, now=None):
+    """
+    Error message if `user` may not move `reservation` to `new_status`, else None
+    """
+    old_status = reservation.status
+    if new_status == old_status:
+        return None
+    if new_status not in TRANSITIONS[old_status]:
+        return f'A {old_status} reservation cannot become {new_status}.'
+    if user.role not in ['super_admin', 'lab_manager'] and (old_status, new_status) not in OWNER_TRANSITIONS:
+        return f'Only lab managers can mark a reservation {new_status}.'
+
+    now = now or timezone.now()
+    if new_status == 'active':
+        early = timedelta(minutes=getattr(settings, 'RESERVATION_CHECK_IN_EARLY_MINUTES', 15))
+        if not reservation.start_time - early <= now < reservation.end_time:
+            return 'Check-in is only possible shortly before and during the reservation.'
+    if new_status in ('completed', 'no_show') and now < reservation.start_time:
+        return f'A reservation that has not started cannot be {new_status}.'
+    return None
+
+
+def _sweep(queryset, old_status, new_status, now, batch_size):
+    """
+    Move every row of `queryset` from old_status to new_status, batch_size
+    rows per transaction: one indexed SELECT of the batch, one UPDATE
+    The UPDATE only takes rows still in old_status: without row locks
+    (SQLite) a request may have changed some of them since the SELECT
+    """
+    queryset = queryset.filter(status=old_status).order_by()
+    if connection.features.has_select_for_update_skip_locked:
+        # Rows a request is changing right now are left for the next sweep
+        queryset = queryset.select_for_update(skip_locked=True)
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(queryset.values(*SWEEP_FIELDS)[:batch_size])
+            if not rows:
+                return moved
+            ids = [row['id'] for row in rows]
+            updated = Reservation.objects.filter(pk__in=ids, status=old_status).update(
+                status=new_status, updated_at=now
+            )
+            if updated < len(rows):
+                swept = set(Reservation.objects.filter(pk__in=ids, status=new_status, updated_at=now)
+                            .values_list('pk', flat=True))
+                rows = [row for row in rows if row['id'] in swept]
+            reservations_status_changed.send(
+                sender=Reservation, rows=rows, old_status=old_status, new_status=new_status
+            )
+        moved += len(rows)
+
+
+def advance_reservations(now=None, batch_size=10_000):
+    """
+    Apply the time-based transitions up to `now` with set-based UPDATEs
+    Returns {(old_status, new_status): rows moved}
+      pending   -> cancelled  never approved before the start, only when
+                              RESERVATION_CANCEL_UNAPPROVED is set
+      confirmed -> active     at the start (or no_show after the grace period
+                              when RESERVATION_REQUIRE_CHECK_IN is set)
+      confirmed -> completed  slot over without ever being active
+      active    -> completed  at the end
+    """
+    now = now or timezone.now()
+    live = Reservation.objects.all()
+    moves = []
+    if getattr(settings, 'RESERVATION_CANCEL_UNAPPROVED', False):
+        moves.append(('pending', 'cancelled', live.filter(start_time__lte=now)))
+    if getattr(settings, 'RESERVATION_REQUIRE_CHECK_IN', False):
+        grace = timedelta(minutes=getattr(settings, 'RESERVATION_NO_SHOW_GRACE_MINUTES', 15))
+        moves.append(('confirmed', 'no_show', live.filter(start_time__lte=now - grace)))
+    else:
+        moves += [
+            ('confirmed', 'completed', live.filter(end_time__lte=now)),
+            ('confirmed', 'active', live.filter(start_time__lte=now)),
+        ]
+    moves.append(('active', 'completed', live.filter(end_time__lte=now)))
+
+    return {
+        (old_status, new_status): _sweep(queryset, old_status, new_status, now, batch_size)
+        for old_status, new_status, queryset in moves
+    }
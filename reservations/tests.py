@@ -1,3 +1,1304 @@
-from django.test import TestCase
+import asyncio
+import random
+import threading
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from importlib import import_module
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core import mail
+from django.db import IntegrityError, connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from analytics.models import EquipmentDailyUsage, UserEquipmentWeeklyUsage
+from equipment.models import Equipment, EquipmentCategory
+from reservation_system.events import equipment_channel, get_broker
+from users.authentication import StreamToken, calendar_feed_token, issue_stream_token, issue_tokens
+from users.models import User
+from .models import MaintenanceLog, Notification, NotificationJob, QuotaPolicy, Reservation, WaitlistEntry
+from . import conflicts
+from .availability import free_intervals
+from .maintenance import reschedule_affected
+from .notifications import enqueue_due_reminders, process_jobs
+from .scheduling import FreeSlotIndex, round_up
+from .signals import reservations_status_changed
+from .states import advance_reservations
+from .waitlist import expire_waitlist
+from .views import ReservationListView
+
+
+class ReservationTestMixin:
+    """
+    Shared fixtures for reservation API tests
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.category = EquipmentCategory.objects.create(name='Microscopy')
+        self.manager = User.objects.create_user(
+            username='manager', password='pass', role='lab_manager', is_approved=True
+        )
+        self.student = User.objects.create_user(
+            username='student', password='pass', role='student', is_approved=True
+        )
+        self.start = timezone.now() + timedelta(days=1)
+
+    def make_equipment(self, name='SEM', **kwargs):
+        return Equipment.objects.create(
+            name=name, description='', category=self.category, location='Lab 1', **kwargs
+        )
+
+    def make_reservation(self, equipment, user=None, offset_hours=0, hours=1, **kwargs):
+        start = self.start + timedelta(hours=offset_hours)
+        return Reservation.objects.create(
+            user=user or self.student,
+            equipment=equipment,
+            start_time=start,
+            end_time=start + timedelta(hours=hours),
+            **kwargs
+        )
+
+
+class ReservationQueryCountTests(ReservationTestMixin, TestCase):
+    """
+    The list endpoints must not issue extra queries per reservation row
+    """
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def seed(self, count):
+        for i in range(count):
+            equipment = self.make_equipment(name=f'SEM {i}')
+            self.make_reservation(equipment, offset_hours=i)
+
+    def test_user_list_query_count_is_constant(self):
+        self.client.force_authenticate(self.student)
+        self.seed(1)
+        url = reverse('reservation-list') + '?expand=equipment_details'
+        baseline = self.count_queries(url)
+        self.seed(10)
+        self.assertEqual(self.count_queries(url), baseline)
+
+    def test_admin_list_query_count_is_constant(self):
+        self.client.force_authenticate(self.manager)
+        self.seed(1)
+        url = reverse('all-reservations') + '?expand=equipment_details'
+        baseline = self.count_queries(url)
+        self.seed(10)
+        self.assertEqual(self.count_queries(url), baseline)
+
+    def test_availability_query_count_is_constant(self):
+        self.client.force_authenticate(self.student)
+        equipment = self.make_equipment()
+        self.make_reservation(equipment)
+        url = (
+            reverse('equipment-availability', args=[equipment.id])
+            + f'?start_time={(self.start - timedelta(days=1)).isoformat()}'
+            + f'&end_time={(self.start + timedelta(days=2)).isoformat()}'
+            + '&expand=equipment_details'
+        )
+        url = url.replace('+', '%2B')
+        baseline = self.count_queries(url)
+        for i in range(1, 10):
+            self.make_reservation(equipment, offset_hours=i)
+        self.assertEqual(self.count_queries(url), baseline)
+
+
+class ReservationPaginationTests(ReservationTestMixin, TestCase):
+    """
+    List endpoints are cursor paginated and project fields on request
+    """
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.student)
+        self.equipment = self.make_equipment()
+        for i in range(5):
+            self.make_reservation(self.equipment, offset_hours=i)
+
+    def test_cursor_pages_cover_every_row_once(self):
+        url = reverse('reservation-list') + '?page_size=2'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(sorted(seen), sorted(Reservation.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_equipment_details_only_when_expanded(self):
+        row = self.client.get(reverse('reservation-list')).data['results'][0]
+        self.assertNotIn('equipment_details', row)
+        self.assertEqual(row['equipment_name'], 'SEM')
+
+        url = reverse('reservation-list') + '?expand=equipment_details'
+        row = self.client.get(url).data['results'][0]
+        self.assertEqual(row['equipment_details']['category_name'], 'Microscopy')
+
+    def test_fields_projection(self):
+        url = reverse('reservation-list') + '?fields=id,status'
+        row = self.client.get(url).data['results'][0]
+        self.assertEqual(set(row), {'id', 'status'})
+
+
+class ReservationConflictTests(ReservationTestMixin, TestCase):
+    """
+    Overlapping bookings of the same equipment are rejected with a 409
+    """
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.student)
+        self.equipment = self.make_equipment()
+        self.existing = self.make_reservation(self.equipment, hours=2)
+
+    def post(self, offset_hours, hours=1, equipment=None):
+        start = self.start + timedelta(hours=offset_hours)
+        return self.client.post(reverse('reservation-list'), {
+            'equipment': (equipment or self.equipment).id,
+            'start_time': start.isoformat(),
+            'end_time': (start + timedelta(hours=hours)).isoformat(),
+        }, format='json')
+
+    def test_overlapping_create_returns_conflict(self):
+        response = self.post(offset_hours=1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['code'], 'reservation_conflict')
+        self.assertEqual(
+            [row['id'] for row in response.data['conflicting_reservations']],
+            [self.existing.id]
+        )
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_adjacent_and_other_equipment_are_allowed(self):
+        self.assertEqual(self.post(offset_hours=2).status_code, 201)
+        other = self.make_equipment(name='TEM')
+        self.assertEqual(self.post(offset_hours=0, equipment=other).status_code, 201)
+
+    def test_cancelled_reservations_do_not_block(self):
+        self.existing.status = 'cancelled'
+        self.existing.save()
+        self.assertEqual(self.post(offset_hours=0).status_code, 201)
+
+    def test_update_into_taken_slot_returns_conflict(self):
+        later = self.make_reservation(self.equipment, offset_hours=5)
+        response = self.client.patch(
+            reverse('reservation-detail', args=[later.id]),
+            {'start_time': (self.start + timedelta(hours=1)).isoformat()},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 409)
+
+    def test_end_before_start_is_rejected(self):
+        self.assertEqual(self.post(offset_hours=10, hours=-1).status_code, 400)
+
+    def test_overlap_migration_cancels_later_double_bookings(self):
+        # Rows that predate the exclusion constraint (SQLite has none)
+        later = self.make_reservation(self.equipment, offset_hours=1, hours=2)
+        chained = self.make_reservation(self.equipment, offset_hours=2, hours=2)
+        self.make_reservation(self.equipment, offset_hours=1, status='cancelled')
+        migration = import_module('reservations.migrations.0002_reservation_no_overlap')
+        self.assertEqual(sorted(migration.cancel_overlaps(Reservation)), [later.pk])
+        self.assertEqual(
+            sorted(Reservation.objects.filter(status='pending').values_list('pk', flat=True)),
+            [self.existing.pk, chained.pk],
+        )
+
+
+class BatchReservationTests(ReservationTestMixin, TestCase):
+    """
+    Batches of creates, updates and cancels are applied all or none
+    """
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.student)
+        self.sem = self.make_equipment()
+        self.coater = self.make_equipment(name='Sputter coater')
+        self.glovebox = self.make_equipment(name='Glovebox')
+
+    def entry(self, equipment, offset_hours, hours=1):
+        start = self.start + timedelta(hours=offset_hours)
+        return {
+            'equipment': equipment.pk, 'purpose': 'Sample prep',
+            'start_time': start.isoformat(), 'end_time': (start + timedelta(hours=hours)).isoformat(),
+        }
+
+    def post(self, **operations):
+        return self.client.post(reverse('reservation-batch'), operations, format='json')
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        # Keep every slot on one local day, so both batches touch the same rollup rows
+        self.start = timezone.localtime(self.start).replace(hour=1, minute=0, second=0, microsecond=0)
+        counts = []
+        # The first batch also inserts the day's rollup rows, later ones only update them
+        for offset, size in ((0, 1), (1, 1), (2, 16)):
+            items = [self.entry(equipment, offset_hours=offset + i)
+                     for i in range(size) for equipment in (self.sem, self.coater, self.glovebox)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post(create=items)
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(len(response.data['created']), len(items))
+            counts.append(len(queries))
+        self.assertEqual(counts[1], counts[2])
+        self.assertEqual(Reservation.objects.filter(status='pending').count(), 54)
+        # The usage rollups saw every booking
+        self.assertEqual(EquipmentDailyUsage.objects.aggregate(total=Sum('reservation_count'))['total'], 54)
+
+    def test_one_conflict_rejects_the_whole_batch(self):
+        taken = self.make_reservation(self.sem, user=self.manager, offset_hours=0, hours=2)
+        mine = self.make_reservation(self.coater, offset_hours=5)
+        response = self.post(
+            create=[self.entry(self.glovebox, 0), self.entry(self.sem, 1)],
+            cancel=[mine.pk],
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([(item['op'], item['index']) for item in response.data['items']], [('create', 1)])
+        self.assertEqual(response.data['items'][0]['conflicting_reservations'][0]['id'], taken.pk)
+        self.assertEqual(Reservation.objects.count(), 2)
+        mine.refresh_from_db()
+        self.assertEqual(mine.status, 'pending')
+
+        # Entries of the same batch may not overlap each other either
+        response = self.post(create=[self.entry(self.glovebox, 0, hours=2), self.entry(self.glovebox, 1)])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['items'][0]['code'], 'batch_overlap')
+
+    def test_errors_are_reported_per_entry(self):
+        foreign = self.make_reservation(self.sem, user=self.manager)
+        response = self.post(
+            create=[self.entry(self.sem, 3), self.entry(self.sem, 5, hours=-1), {**self.entry(self.sem, 8), 'equipment': 999}],
+            update=[{'id': foreign.pk, 'purpose': 'Mine now'}],
+            cancel=['x'],
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [(item['op'], item['index'], list(item['errors'])) for item in response.data['items']],
+            [('cancel', 0, ['id']), ('create', 1, ['end_time']), ('create', 2, ['equipment']), ('update', 0, ['id'])],
+        )
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs the exclusion constraint (PostgreSQL)')
+    def test_shifting_adjacent_bookings_together_is_not_a_conflict(self):
+        # The single UPDATE moves the first row onto the second's old slot
+        # before moving the second; the deferred constraint checks the end state
+        first = self.make_reservation(self.sem, offset_hours=0)
+        second = self.make_reservation(self.sem, offset_hours=1)
+        response = self.post(update=[
+            {'id': reservation.pk, 'start_time': self.entry(self.sem, offset)['start_time'],
+             'end_time': self.entry(self.sem, offset)['end_time']}
+            for reservation, offset in ((first, 1), (second, 2))
+        ])
+        self.assertEqual(response.status_code, 200)
+
+    def test_cancel_frees_slots_for_the_same_batch(self):
+        old = self.make_reservation(self.sem, offset_hours=0, hours=2)
+        moved = self.make_reservation(self.coater, offset_hours=0)
+        response = self.post(
+            cancel=[old.pk],
+            create=[self.entry(self.sem, 1)],
+            update=[{'id': moved.pk, 'start_time': (self.start + timedelta(hours=3)).isoformat(),
+                     'end_time': (self.start + timedelta(hours=4)).isoformat()}],
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['cancelled'], [old.pk])
+        old.refresh_from_db()
+        moved.refresh_from_db()
+        self.assertEqual(old.status, 'cancelled')
+        self.assertEqual(moved.start_time, self.start + timedelta(hours=3))
+        self.assertEqual(response.data['updated'][0]['id'], moved.pk)
+
+
+class BulkAvailabilityTests(ReservationTestMixin, TestCase):
+    """
+    One request answers free/busy for a whole set of equipment
+    """
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.student)
+
+    def get(self, **params):
+        params.setdefault('start_time', self.start.isoformat())
+        params.setdefault('end_time', (self.start + timedelta(hours=10)).isoformat())
+        return self.client.get(reverse('bulk-availability'), params)
+
+    def test_busy_intervals_are_merged_and_free_gaps_returned(self):
+        sem = self.make_equipment(name='SEM')
+        tem = self.make_equipment(name='TEM')
+        self.make_reservation(sem, offset_hours=1, hours=2)
+        self.make_reservation(sem, offset_hours=2, hours=2)
+        self.make_reservation(sem, offset_hours=6, hours=1, status='cancelled')
+
+        response = self.get(category=self.category.id)
+        self.assertEqual(response.status_code, 200)
+        rows = {row['equipment_id']: row for row in response.data['equipment']}
+
+        self.assertFalse(rows[sem.id]['available'])
+        self.assertEqual(len(rows[sem.id]['busy']), 1)
+        self.assertEqual(rows[sem.id]['busy'][0]['end'], self.start + timedelta(hours=4))
+        self.assertEqual(len(rows[sem.id]['free']), 2)
+        self.assertTrue(rows[tem.id]['available'])
+
+    def test_query_count_does_not_grow_with_equipment(self):
+        ids = []
+        for i in range(10):
+            equipment = self.make_equipment(name=f'SEM {i}')
+            self.make_reservation(equipment, offset_hours=i % 5)
+            ids.append(str(equipment.id))
+        with self.assertNumQueries(2):
+            response = self.get(equipment=','.join(ids))
+        self.assertEqual(len(response.data['equipment']), 10)
+
+    def test_requires_time_range_and_selection(self):
+        self.assertEqual(self.get(start_time='').status_code, 400)
+        self.assertEqual(self.get().status_code, 400)
+
+
+class RecurringReservationTests(ReservationTestMixin, TestCase):
+    """
+    Recurring reservations expand into occurrences validated as one series
+    """
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.student)
+        self.equipment = self.make_equipment()
+
+    def post_series(self, pattern, weeks=4, **extra):
+        return self.client.post(reverse('reservation-list'), {
+            'equipment': self.equipment.id,
+            'start_time': self.start.isoformat(),
+            'end_time': (self.start + timedelta(hours=2)).isoformat(),
+            'is_recurring': True,
+            'recurring_pattern': pattern,
+            'recurring_end_date': (self.start + timedelta(weeks=weeks, hours=1)).isoformat(),
+            **extra
+        }, format='json')
+
+    def test_weekly_series_creates_every_occurrence(self):
+        skipped = (timezone.localtime(self.start) + timedelta(weeks=2)).date().isoformat()
+        response = self.post_series('weekly', recurring_exceptions=[skipped])
+        self.assertEqual(response.status_code, 201)
+        master = Reservation.objects.get(pk=response.data['id'])
+        self.assertEqual(master.occurrences.count(), 3)  # 5 weeks minus master and exception
+
+    def test_series_with_a_taken_slot_books_nothing(self):
+        self.make_reservation(self.equipment, offset_hours=24 * 7 * 3, hours=3)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post_series('weekly')
+        self.assertEqual(response.status_code, 409)
+        reservation_reads = [
+            q for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT') and 'reservations_reservation' in q['sql']
+        ]
+        self.assertEqual(len(reservation_reads), 1)  # One query checks the whole series
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_invalid_or_unbounded_patterns_are_rejected(self):
+        self.assertEqual(self.post_series('FREQ=YEARLY').status_code, 400)
+        response = self.post_series('daily', recurring_end_date=None)
+        self.assertEqual(response.status_code, 400)
+
+    def test_weekly_count_starts_from_the_first_day(self):
+        from .recurrence import RecurrenceRule, expand
+        rule = RecurrenceRule.parse('FREQ=WEEKLY;BYDAY=MO,WE;COUNT=5')
+        start = timezone.make_aware(timezone.datetime(2026, 1, 7, 9))  # A Wednesday
+        occurrences = list(expand(rule, start, start + timedelta(hours=1)))
+        self.assertEqual([o.weekday() for o, _ in occurrences], [2, 0, 2, 0, 2])
+        self.assertEqual(occurrences[0][0], start)
+        self.assertTrue(all(o.hour == 9 for o, _ in occurrences))
+
+    def test_monthly_skips_short_months(self):
+        from .recurrence import RecurrenceRule, expand
+        start = timezone.make_aware(timezone.datetime(2026, 1, 31, 9))
+        occurrences = list(expand(RecurrenceRule.parse('FREQ=MONTHLY;COUNT=3'),
+                                  start, start + timedelta(hours=1)))
+        self.assertEqual([o.month for o, _ in occurrences], [1, 3, 5])
+
+
+class NotificationPipelineTests(ReservationTestMixin, TestCase):
+    """
+    Events are queued in the request and delivered by the worker
+    """
+    def setUp(self):
+        super().setUp()
+        self.student.email = 'student@lab.edu'
+        self.student.save()
+        self.equipment = self.make_equipment()
+
+    def test_confirmation_is_queued_not_delivered(self):
+        reservation = self.make_reservation(self.equipment)
+        self.assertFalse(NotificationJob.objects.exists())  # Pending, nothing to confirm yet
+
+        self.client.force_authenticate(self.manager)
+        response = self.client.patch(
+            reverse('reservation-detail', args=[reservation.pk]), {'status': 'confirmed'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(NotificationJob.objects.filter(event='reservation_confirmation').count(), 1)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(process_jobs(), 1)
+        notification = Notification.objects.get(user=self.student)
+        self.assertEqual(notification.notification_type, 'reservation_confirmation')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['student@lab.edu'])
+        self.assertEqual(process_jobs(), 0)
+
+    def test_worker_batches_jobs(self):
+        for offset in range(5):
+            self.make_reservation(self.equipment, offset_hours=offset * 2, status='confirmed')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(process_jobs(), 5)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "reservations_notification"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Notification.objects.count(), 5)
+        self.assertEqual(NotificationJob.objects.filter(status='done').count(), 5)
+
+    def test_reminders_are_queued_once(self):
+        self.make_reservation(self.equipment, status='confirmed')
+        NotificationJob.objects.all().delete()
+        self.assertEqual(enqueue_due_reminders(), 1)
+        enqueue_due_reminders()
+        self.assertEqual(NotificationJob.objects.filter(event='reservation_reminder').count(), 1)
+
+    def test_maintenance_alert_reaches_overlapping_users(self):
+        self.make_reservation(self.equipment, status='confirmed')
+        other = User.objects.create_user(username='other', password='pass', is_approved=True)
+        self.make_reservation(self.equipment, user=other, offset_hours=48)
+        NotificationJob.objects.all().delete()
+        MaintenanceLog.objects.create(
+            equipment=self.equipment, maintenance_type='Calibration', description='', performed_by='Tech',
+            start_date=self.start - timedelta(hours=1), end_date=self.start + timedelta(hours=2),
+        )
+        process_jobs()
+        self.assertEqual(
+            list(Notification.objects.values_list('user__username', 'notification_type')),
+            [('student', 'maintenance_alert')]
+        )
+
+    def test_unread_count_and_mark_read(self):
+        for title in ['a', 'b', 'c']:
+            Notification.objects.create(user=self.student, notification_type='system_announcement',
+                                        title=title, message='')
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data, {'unread': 3})
+        first = Notification.objects.filter(title='a').get()
+        response = self.client.post(reverse('notification-mark-read'), {'ids': [first.pk]}, format='json')
+        self.assertEqual(response.data, {'updated': 1})
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data, {'unread': 2})
+        self.client.post(reverse('notification-mark-read'))
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data, {'unread': 0})
+
+
+class AvailabilityEventTests(ReservationTestMixin, TestCase):
+    """
+    Reservation changes are pushed to subscribed event streams
+    """
+    def setUp(self):
+        super().setUp()
+        self.equipment = self.make_equipment()
+        self.url = reverse('availability-events')
+        self.token = str(issue_stream_token(self.student))
+
+    def test_changes_are_published_after_commit(self):
+        with patch('reservation_system.events.get_broker') as get_broker:
+            with self.captureOnCommitCallbacks(execute=True):
+                reservation = self.make_reservation(self.equipment)
+            with self.captureOnCommitCallbacks(execute=True):
+                reservation.status = 'cancelled'
+                reservation.save()
+        published = [call.args for call in get_broker.return_value.publish.call_args_list]
+        self.assertEqual([channel for channel, _ in published], [f'equipment:{self.equipment.pk}'] * 2)
+        self.assertEqual([event['event'] for _, event in published],
+                         ['reservation.created', 'reservation.cancelled'])
+        self.assertNotIn('user', published[0][1]['data'])
+
+    async def test_stream_delivers_subscribed_events(self):
+        other = await Equipment.objects.acreate(name='TEM', description='', category=self.category, location='Lab 2')
+        response = await self.async_client.get(
+            self.url, {'equipment': str(self.equipment.pk), 'stream_token': self.token}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 5000\n\n')
+
+        broker = get_broker()
+        broker.publish(equipment_channel(other.pk), {'id': 1, 'event': 'equipment.status', 'data': {}})
+        broker.publish(equipment_channel(self.equipment.pk), {
+            'id': 2, 'event': 'equipment.status', 'data': {'equipment_id': self.equipment.pk, 'status': 'maintenance'},
+        })
+        chunk = await asyncio.wait_for(anext(chunks), timeout=2)
+        self.assertEqual(
+            chunk,
+            f'id: 2\nevent: equipment.status\ndata: {{"equipment_id": {self.equipment.pk}, '
+            f'"status": "maintenance"}}\n\n'.encode()
+        )
+        await chunks.aclose()
+
+    async def test_stream_requires_token(self):
+        response = await self.async_client.get(self.url, {'equipment': str(self.equipment.pk)})
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(self.url, {'equipment': 'x', 'stream_token': self.token})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_stream_refuses_access_tokens_in_the_url(self):
+        access = await sync_to_async(lambda: str(issue_tokens(self.student).access_token))()
+        response = await self.async_client.get(
+            self.url, {'equipment': str(self.equipment.pk), 'stream_token': access}
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_token_is_short_lived_and_not_an_api_token(self):
+        self.client.force_authenticate(self.student)
+        response = self.client.get(reverse('availability-events-token'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['expires_in'], 300)
+        token = StreamToken(response.data['stream_token'])
+        self.assertEqual(token['user_id'], str(self.student.pk))
+        self.assertEqual(token['role'], 'student')
+
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["stream_token"]}')
+        self.assertEqual(self.client.get(reverse('reservation-list')).status_code, 401)
+
+
+class AsyncReadViewTests(ReservationTestMixin, TransactionTestCase):
+    """
+    Under ASGI the read endpoints run in the thread pool on their own connection
+    (TransactionTestCase: those connections only see committed rows)
+    """
+    def setUp(self):
+        super().setUp()
+        self.equipment = self.make_equipment()
+        self.make_reservation(self.equipment)
+        self.auth = {'headers': {'Authorization': f'Bearer {issue_tokens(self.student).access_token}'}}
+
+    async def test_reads_run_off_the_request_thread(self):
+        threads = []
+        original = ReservationListView.list
+
+        def recording_list(view, request, *args, **kwargs):
+            threads.append(threading.get_ident())
+            return original(view, request, *args, **kwargs)
+
+        with patch.object(ReservationListView, 'list', recording_list):
+            response = await self.async_client.get(reverse('reservation-list'), **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertNotEqual(threads, [threading.get_ident()])
+
+        response = await self.async_client.get(
+            reverse('equipment-availability', args=[self.equipment.pk]),
+            {'start_time': self.start.isoformat(), 'end_time': (self.start + timedelta(hours=2)).isoformat()},
+            **self.auth,
+        )
+        self.assertFalse(response.json()['available'])
+        response = await self.async_client.get(reverse('equipment-list'), **self.auth)
+        self.assertEqual([item['name'] for item in response.json()['results']], ['SEM'])
+
+    async def test_writes_still_work(self):
+        response = await self.async_client.post(reverse('reservation-list'), {
+            'equipment': self.equipment.pk,
+            'start_time': (self.start + timedelta(hours=5)).isoformat(),
+            'end_time': (self.start + timedelta(hours=6)).isoformat(),
+        }, content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(await Reservation.objects.acount(), 2)
+
+
+class ReservationStateTests(ReservationTestMixin, TestCase):
+    """
+    Validated status transitions and the batched time-based sweep
+    """
+    def setUp(self):
+        super().setUp()
+        self.equipment = self.make_equipment()
+        self.now = timezone.now()
+
+    def make_at(self, status, hours_ago, hours=1):
+        return Reservation.objects.create(
+            user=self.student, equipment=self.equipment, status=status,
+            start_time=self.now - timedelta(hours=hours_ago),
+            end_time=self.now - timedelta(hours=hours_ago) + timedelta(hours=hours),
+        )
+
+    def patch_status(self, reservation, value):
+        return self.client.patch(
+            reverse('reservation-detail', args=[reservation.pk]), {'status': value}, format='json'
+        )
+
+    def test_transitions_are_validated(self):
+        reservation = self.make_reservation(self.equipment)
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.patch_status(reservation, 'confirmed').status_code, 400)
+        self.assertEqual(self.patch_status(reservation, 'cancelled').status_code, 200)
+
+        self.client.force_authenticate(self.manager)
+        response = self.patch_status(reservation, 'confirmed')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cannot become confirmed', response.data['status'][0])
+
+        response = self.client.post(reverse('reservation-list'), {
+            'equipment': self.equipment.pk, 'status': 'completed',
+            'start_time': self.start + timedelta(hours=3), 'end_time': self.start + timedelta(hours=4),
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_check_in_only_around_the_slot(self):
+        reservation = self.make_reservation(self.equipment, status='confirmed')  # Starts tomorrow
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.patch_status(reservation, 'active').status_code, 400)
+        started = self.make_at('confirmed', hours_ago=0.1)
+        self.assertEqual(self.patch_status(started, 'active').status_code, 200)
+
+    @override_settings(RESERVATION_CANCEL_UNAPPROVED=True)
+    def test_sweep_moves_rows_in_batches(self):
+        expired = self.make_at('pending', hours_ago=1, hours=3)
+        started = self.make_at('confirmed', hours_ago=1, hours=3)
+        missed = self.make_at('confirmed', hours_ago=6)
+        finished = self.make_at('active', hours_ago=8)
+        upcoming = self.make_reservation(self.equipment, status='confirmed')
+
+        usage = EquipmentDailyUsage.objects.get(equipment=self.equipment, date=timezone.localdate(expired.start_time))
+        counted = usage.reservation_count
+
+        with CaptureQueriesContext(connection) as queries:
+            moved = advance_reservations(now=self.now, batch_size=1)
+        self.assertEqual(moved, {
+            ('pending', 'cancelled'): 1,
+            ('confirmed', 'completed'): 1,
+            ('confirmed', 'active'): 1,
+            ('active', 'completed'): 1,
+        })
+        updates = [q for q in queries if q['sql'].startswith('UPDATE "reservations_reservation"')]
+        self.assertEqual(len(updates), 4)  # One per moved batch, never per-row saves
+
+        statuses = dict(Reservation.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[expired.pk], 'cancelled')
+        self.assertEqual(statuses[started.pk], 'active')
+        self.assertEqual(statuses[missed.pk], 'completed')
+        self.assertEqual(statuses[finished.pk], 'completed')
+        self.assertEqual(statuses[upcoming.pk], 'confirmed')
+
+        # The expired request no longer counts towards usage
+        usage.refresh_from_db()
+        self.assertEqual(usage.reservation_count, counted - 1)
+
+    def test_unapproved_requests_are_kept_by_default(self):
+        pending = self.make_at('pending', hours_ago=1, hours=3)
+        self.assertNotIn(('pending', 'cancelled'), advance_reservations(now=self.now))
+        self.assertEqual(Reservation.objects.get(pk=pending.pk).status, 'pending')
+
+    def test_sweep_skips_rows_changed_since_it_read_them(self):
+        started = self.make_at('confirmed', hours_ago=1, hours=3)
+        also_started = self.make_at('confirmed', hours_ago=1, hours=3)
+        changed = []
+        filter_rows = Reservation.objects.filter
+
+        def cancel_first(*args, **kwargs):
+            # A request cancels `started` between the sweep's SELECT and UPDATE
+            if not changed:
+                changed.append(filter_rows(pk=started.pk).update(status='cancelled'))
+            return filter_rows(*args, **kwargs)
+
+        sent = []
+
+        def receiver(sender, rows, old_status, new_status, **kwargs):
+            sent.append((old_status, new_status, [row['id'] for row in rows]))
+        reservations_status_changed.connect(receiver)
+        self.addCleanup(reservations_status_changed.disconnect, receiver)
+
+        with patch.object(Reservation.objects, 'filter', side_effect=cancel_first):
+            moved = advance_reservations(now=self.now)
+        self.assertEqual(moved[('confirmed', 'active')], 1)
+        self.assertEqual(Reservation.objects.get(pk=started.pk).status, 'cancelled')
+        self.assertEqual(Reservation.objects.get(pk=also_started.pk).status, 'active')
+        self.assertIn(('confirmed', 'active', [also_started.pk]), sent)
+
+    @override_settings(RESERVATION_REQUIRE_CHECK_IN=True, RESERVATION_NO_SHOW_GRACE_MINUTES=15)
+    def test_no_show_when_check_in_is_required(self):
+        absent = self.make_at('confirmed', hours_ago=0.5)
+        just_started = self.make_at('confirmed', hours_ago=0.1)
+        advance_reservations(now=self.now)
+        self.assertEqual(Reservation.objects.get(pk=absent.pk).status, 'no_show')
+        self.assertEqual(Reservation.objects.get(pk=just_started.pk).status, 'confirmed')
+
+
+class WaitlistTests(ReservationTestMixin, TestCase):
+    """
+    Freed slots go to waiting entries in priority order
+    """
+    def setUp(self):
+        super().setUp()
+        self.equipment = self.make_equipment()
+        self.researcher = User.objects.create_user(
+            username='researcher', password='pass', role='researcher', is_approved=True
+        )
+        self.start = timezone.localtime(self.start).replace(minute=0, second=0, microsecond=0)
+
+    def join(self, user, hours, window_hours=2, offset_hours=0):
+        self.client.force_authenticate(user)
+        window_start = self.start + timedelta(hours=offset_hours)
+        return self.client.post(reverse('waitlist-list'), {
+            'equipment': self.equipment.pk,
+            'window_start': window_start.isoformat(),
+            'window_end': (window_start + timedelta(hours=window_hours)).isoformat(),
+            'duration': f'{hours:02d}:00:00',
+        }, format='json')
+
+    def test_cancellation_goes_to_the_highest_priority(self):
+        taken = self.make_reservation(self.equipment, hours=2)
+        student_entry = self.join(self.student, hours=1).data
+        researcher_entry = self.join(self.researcher, hours=2).data
+        self.assertEqual((student_entry['status'], researcher_entry['status']), ('waiting', 'waiting'))
+
+        self.client.force_authenticate(self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('reservation-detail', args=[taken.pk]), {'status': 'cancelled'}, format='json')
+
+        # The researcher outranks the earlier student request and fills the
+        # slot, still pending approval like any booking of theirs
+        entry = WaitlistEntry.objects.get(pk=researcher_entry['id'])
+        self.assertEqual(entry.status, 'allocated')
+        self.assertEqual((entry.reservation.start_time, entry.reservation.end_time, entry.reservation.status),
+                         (self.start, self.start + timedelta(hours=2), 'pending'))
+        self.assertEqual(WaitlistEntry.objects.get(pk=student_entry['id']).status, 'waiting')
+
+        self.assertEqual(list(NotificationJob.objects.filter(payload__reservation_id=entry.reservation_id)
+                              .values_list('event', flat=True)), ['waitlist_allocated'])
+        process_jobs()
+        notification = Notification.objects.get(user=self.researcher)
+        self.assertEqual(notification.notification_type, 'waitlist_allocated')
+
+    def test_free_window_is_refused_on_joining(self):
+        self.make_reservation(self.equipment, hours=1)
+        response = self.join(self.student, hours=1, window_hours=3)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('book that slot', response.data['non_field_errors'][0])
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertEqual(Reservation.objects.count(), 1)
+        # A duration that does not fit the window is refused
+        self.assertEqual(self.join(self.student, hours=3, offset_hours=5).status_code, 400)
+
+    def test_lab_managers_are_allocated_confirmed_slots(self):
+        taken = self.make_reservation(self.equipment, hours=2)
+        entry = self.join(self.manager, hours=2).data
+        with self.captureOnCommitCallbacks(execute=True):
+            taken.status = 'cancelled'
+            taken.save()
+        self.assertEqual(WaitlistEntry.objects.get(pk=entry['id']).reservation.status, 'confirmed')
+
+    @override_settings(RESERVATION_REQUIRE_CHECK_IN=True, RESERVATION_NO_SHOW_GRACE_MINUTES=15)
+    def test_no_show_frees_the_rest_of_the_slot(self):
+        now = timezone.now()
+        absent = Reservation.objects.create(
+            user=self.researcher, equipment=self.equipment, status='confirmed',
+            start_time=now - timedelta(minutes=30), end_time=now + timedelta(hours=3),
+        )
+        entry = WaitlistEntry.objects.create(
+            user=self.student, equipment=self.equipment, duration=timedelta(hours=1),
+            window_start=now - timedelta(hours=1), window_end=now + timedelta(hours=3),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            advance_reservations(now=now)
+        self.assertEqual(Reservation.objects.get(pk=absent.pk).status, 'no_show')
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'allocated')
+        self.assertTrue(now <= entry.reservation.start_time < now + timedelta(minutes=15))
+
+    def test_withdraw_and_expire(self):
+        self.make_reservation(self.equipment, hours=4)
+        first = self.join(self.student, hours=1).data
+        second = self.join(self.student, hours=1, offset_hours=2).data
+        url = reverse('waitlist-detail', args=[first['id']])
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 409)
+        self.assertEqual(expire_waitlist(now=self.start + timedelta(days=1)), 1)
+        self.assertEqual(WaitlistEntry.objects.get(pk=second['id']).status, 'expired')
+
+
+class QuotaTests(ReservationTestMixin, TestCase):
+    """
+    Weekly quotas are checked against the maintained counters
+    """
+    def setUp(self):
+        super().setUp()
+        self.equipment = self.make_equipment(max_reservation_hours=6)
+        # Monday 9:00 next week, so every booking of a test counts in one week
+        monday = timezone.localdate() + timedelta(days=7 - timezone.localdate().weekday())
+        self.start = timezone.make_aware(datetime.combine(monday, time(9)))
+        self.client.force_authenticate(self.student)
+
+    def post(self, offset_hours, hours, equipment=None):
+        start = self.start + timedelta(hours=offset_hours)
+        return self.client.post(reverse('reservation-list'), {
+            'equipment': (equipment or self.equipment).pk,
+            'start_time': start.isoformat(),
+            'end_time': (start + timedelta(hours=hours)).isoformat(),
+        }, format='json')
+
+    def test_role_quota_is_enforced_per_week(self):
+        QuotaPolicy.objects.create(scope='role', role='student', equipment=self.equipment, hours_per_week=5)
+        self.assertEqual(self.post(0, 3).status_code, 201)
+        response = self.post(4, 3)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['code'], 'quota_exceeded')
+        self.assertEqual(self.post(4, 2).status_code, 201)
+        # The next week starts from zero, and other roles are not bound
+        self.assertEqual(self.post(24 * 7, 5).status_code, 201)
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.post(10, 5).status_code, 201)
+
+        usage = UserEquipmentWeeklyUsage.objects.get(user=self.student, week=timezone.localdate(self.start))
+        self.assertEqual((usage.reservation_count, usage.reserved_hours), (2, 5.0))
+
+    def test_user_policy_replaces_role_and_department_is_shared(self):
+        QuotaPolicy.objects.create(scope='role', role='student', category=self.category, hours_per_week=2)
+        QuotaPolicy.objects.create(scope='user', user=self.student, category=self.category, hours_per_week=6)
+        QuotaPolicy.objects.create(scope='department', department='Physics', category=self.category,
+                                   hours_per_week=8)
+        User.objects.filter(pk__in=[self.student.pk, self.manager.pk]).update(department='Physics')
+        self.student.refresh_from_db()
+        other = self.make_equipment(name='TEM')
+        self.make_reservation(self.equipment, user=self.manager, offset_hours=20, hours=3)
+
+        self.assertEqual(self.post(0, 4).status_code, 201)
+        # 4 + 3 hours of the department are booked, 2 more would pass 8
+        response = self.post(0, 2, equipment=other)
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('Physics department', response.data['error'])
+        self.assertEqual(self.post(0, 1, equipment=other).status_code, 201)
+
+        response = self.client.get(reverse('quota-remaining'), {
+            'equipment': other.pk, 'date': timezone.localdate(self.start).isoformat(), 'weeks': 2,
+        })
+        self.assertEqual(response.status_code, 200)
+        this_week, next_week = response.data['weeks']
+        self.assertEqual([(line['scope'], line['used'], line['remaining']) for line in this_week['quotas']],
+                         [('user', 5.0, 1.0), ('department', 8.0, 0)])
+        self.assertEqual([line['remaining'] for line in next_week['quotas']], [6, 8])
+        self.assertEqual(self.client.get(reverse('quota-remaining')).status_code, 400)
+
+    def test_writers_on_different_items_lock_the_shared_policy_first(self):
+        policy = QuotaPolicy.objects.create(scope='role', role='student', category=self.category, hours_per_week=3)
+        other = self.make_equipment(name='TEM')
+        for offset, equipment in ((0, self.equipment), (5, other)):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertIn(self.post(offset, 2, equipment=equipment).status_code, (201, 403))
+            statements = [query['sql'] for query in ctx.captured_queries]
+            policy_lock = next(i for i, sql in enumerate(statements)
+                               if 'reservations_quotapolicy' in sql and ('UPDATE' in sql or 'FOR UPDATE' in sql))
+            counters = next(i for i, sql in enumerate(statements) if 'analytics_userequipmentweeklyusage' in sql)
+            self.assertLess(policy_lock, counters)
+            self.assertIn(str(policy.pk), statements[policy_lock])
+        # The second item sees the hours booked on the first
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_series_and_batch_count_every_booking(self):
+        QuotaPolicy.objects.create(scope='user', user=self.student, equipment=self.equipment, hours_per_week=4)
+        response = self.client.post(reverse('reservation-list'), {
+            'equipment': self.equipment.pk,
+            'start_time': self.start.isoformat(),
+            'end_time': (self.start + timedelta(hours=2)).isoformat(),
+            'is_recurring': True,
+            'recurring_pattern': 'FREQ=DAILY;COUNT=3',
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+
+        creates = [
+            {'equipment': self.equipment.pk, 'start_time': (self.start + timedelta(hours=offset)).isoformat(),
+             'end_time': (self.start + timedelta(hours=offset + 2)).isoformat()}
+            for offset in (0, 3, 6)
+        ]
+        response = self.client.post(reverse('reservation-batch'), {'create': creates}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual([(item['index'], item['code']) for item in response.data['items']],
+                         [(2, 'quota_exceeded')])
+        self.assertEqual(Reservation.objects.count(), 0)
+
+    def test_changes_that_add_hours_are_checked(self):
+        policy = QuotaPolicy.objects.create(scope='role', role='student', equipment=self.equipment, hours_per_week=4)
+        reservation_id = self.post(0, 2).data['id']
+        url = reverse('reservation-detail', args=[reservation_id])
+        response = self.client.patch(url, {'end_time': (self.start + timedelta(hours=5)).isoformat()}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['code'], 'quota_exceeded')
+        # Growing within the quota and moving inside the week are fine
+        self.assertEqual(self.client.patch(url, {'end_time': (self.start + timedelta(hours=4)).isoformat()},
+                                           format='json').status_code, 200)
+        self.assertEqual(self.client.patch(url, {
+            'start_time': (self.start + timedelta(days=1)).isoformat(),
+            'end_time': (self.start + timedelta(days=1, hours=4)).isoformat(),
+        }, format='json').status_code, 200)
+
+        # A batch move may not grow it past the quota either
+        response = self.client.post(reverse('reservation-batch'), {'update': [{
+            'id': reservation_id, 'end_time': (self.start + timedelta(days=1, hours=5)).isoformat(),
+        }]}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual([(item['op'], item['code']) for item in response.data['items']],
+                         [('update', 'quota_exceeded')])
+
+        # Under a lowered limit the booking can still shrink and be cancelled
+        policy.hours_per_week = 1
+        policy.save()
+        self.assertEqual(self.client.patch(url, {'end_time': (self.start + timedelta(days=1, hours=3)).isoformat()},
+                                           format='json').status_code, 200)
+        self.assertEqual(self.client.patch(url, {'status': 'cancelled'}, format='json').status_code, 200)
+
+    def test_maintenance_does_not_move_bookings_past_a_quota(self):
+        QuotaPolicy.objects.create(scope='role', role='student', equipment=self.equipment, hours_per_week=2)
+        sunday = self.make_reservation(self.equipment, offset_hours=-11, hours=1)  # Sunday 22:00
+        self.make_reservation(self.equipment, offset_hours=-9, hours=2)  # Monday 0:00, this week's 2 hours
+        maintenance = MaintenanceLog.objects.create(
+            equipment=self.equipment, maintenance_type='repair', description='',
+            start_date=self.start - timedelta(hours=12), end_date=self.start - timedelta(hours=9),
+        )
+        # The first free slot is Monday 2:00, in a week the student has used up
+        moved, cancelled = reschedule_affected(maintenance)
+        self.assertEqual((moved, [row['id'] for row in cancelled]), ([], [sunday.pk]))
+
+    def test_waitlist_passes_over_entries_past_their_quota(self):
+        QuotaPolicy.objects.create(scope='role', role='student', equipment=self.equipment, hours_per_week=1)
+        researcher = User.objects.create_user(username='researcher', password='pass', role='researcher')
+        taken = self.make_reservation(self.equipment, user=self.manager, hours=2)
+        # The student asks first and outranks the researcher, but has 1 hour left
+        WaitlistEntry.objects.create(user=self.student, equipment=self.equipment, priority=0,
+                                     duration=timedelta(hours=2), window_start=self.start,
+                                     window_end=self.start + timedelta(hours=2))
+        later = WaitlistEntry.objects.create(user=researcher, equipment=self.equipment, priority=2,
+                                             duration=timedelta(hours=2), window_start=self.start,
+                                             window_end=self.start + timedelta(hours=2))
+        with self.captureOnCommitCallbacks(execute=True):
+            taken.status = 'cancelled'
+            taken.save()
+        self.assertEqual(WaitlistEntry.objects.get(pk=later.pk).status, 'allocated')
+        self.assertEqual(WaitlistEntry.objects.get(user=self.student).status, 'waiting')
+
+    def test_max_reservation_hours_is_enforced(self):
+        response = self.post(0, 7)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at most 6 hours', str(response.data['end_time']))
+
+        # A booking made before the limit was lowered can still be cancelled
+        longer = self.make_reservation(self.equipment, hours=8)
+        self.assertEqual(self.client.patch(reverse('reservation-detail', args=[longer.pk]), {'status': 'cancelled'},
+                                           format='json').status_code, 200)
+
+
+@skipUnless(connection.features.has_select_for_update, 'needs row locks (PostgreSQL)')
+class QuotaConcurrencyTests(ReservationTestMixin, TransactionTestCase):
+    """
+    Two writers on different items of one category quota, interleaved so
+    both hold their equipment lock before either checks the quota
+    """
+    def test_concurrent_bookings_cannot_both_take_the_last_hours(self):
+        QuotaPolicy.objects.create(scope='role', role='student', category=self.category, hours_per_week=3)
+        items = [self.make_equipment(name='SEM'), self.make_equipment(name='TEM')]
+        both_locked = threading.Barrier(2, timeout=5)
+        original = conflicts.enforce_quotas
+
+        def enforce_after_both_locked(*args, **kwargs):
+            both_locked.wait()
+            return original(*args, **kwargs)
+
+        codes = []
+
+        def book(equipment):
+            client = APIClient()
+            client.force_authenticate(self.student)
+            try:
+                codes.append(client.post(reverse('reservation-list'), {
+                    'equipment': equipment.pk,
+                    'start_time': self.start.isoformat(),
+                    'end_time': (self.start + timedelta(hours=2)).isoformat(),
+                }, format='json').status_code)
+            finally:
+                connection.close()
+
+        with patch.object(conflicts, 'enforce_quotas', enforce_after_both_locked):
+            writers = [threading.Thread(target=book, args=[equipment]) for equipment in items]
+            for writer in writers:
+                writer.start()
+            for writer in writers:
+                writer.join()
+        self.assertEqual(sorted(codes), [201, 403])
+
+
+class MaintenanceSchedulingTests(ReservationTestMixin, TestCase):
+    """
+    Maintenance windows block bookings and can push displaced ones aside
+    """
+    def setUp(self):
+        super().setUp()
+        self.equipment = self.make_equipment()
+        self.client.force_authenticate(self.manager)
+
+    def schedule(self, offset_hours=0, hours=2, equipment=None):
+        start = self.start + timedelta(hours=offset_hours)
+        return self.client.post(reverse('maintenance-list'), {
+            'equipment': (equipment or self.equipment).pk, 'maintenance_type': 'Calibration',
+            'description': 'Yearly calibration',
+            'start_date': start, 'end_date': start + timedelta(hours=hours),
+        }, format='json')
+
+    def test_create_fills_in_performed_by_and_next_maintenance(self):
+        response = self.schedule()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['performed_by'], 'manager')
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.next_maintenance, timezone.localdate(self.start))
+
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.schedule(offset_hours=10).status_code, 403)
+
+    def test_windows_block_bookings_and_availability(self):
+        self.schedule(hours=2)
+        self.client.force_authenticate(self.student)
+        response = self.client.post(reverse('reservation-list'), {
+            'equipment': self.equipment.pk,
+            'start_time': self.start + timedelta(hours=1), 'end_time': self.start + timedelta(hours=3),
+        }, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(response.data['conflicting_maintenance']), 1)
+        self.assertEqual(response.data['conflicting_reservations'], [])
+
+        url = reverse('equipment-availability', args=[self.equipment.pk])
+        window = {'start_time': (self.start + timedelta(hours=1)).isoformat(),
+                  'end_time': (self.start + timedelta(hours=2)).isoformat()}
+        response = self.client.get(url, window)
+        self.assertFalse(response.data['available'])
+        self.assertEqual(response.data['conflicting_maintenance'][0]['maintenance_type'], 'Calibration')
+
+        free = {'start_time': (self.start + timedelta(hours=5)).isoformat(),
+                'end_time': (self.start + timedelta(hours=6)).isoformat()}
+        with self.assertNumQueries(1):
+            self.assertTrue(self.client.get(url, free).data['available'])
+
+    def test_reschedule_moves_displaced_bookings_in_bulk(self):
+        first = self.make_reservation(self.equipment, offset_hours=0, hours=1, status='confirmed')
+        second = self.make_reservation(self.equipment, offset_hours=1, hours=1)
+        after = self.make_reservation(self.equipment, user=self.manager, offset_hours=2, hours=1)
+        maintenance = MaintenanceLog.objects.create(
+            equipment=self.equipment, maintenance_type='Repair', description='', performed_by='tech',
+            start_date=self.start, end_date=self.start + timedelta(hours=2),
+        )
+        usage = EquipmentDailyUsage.objects.filter(equipment=self.equipment)
+        counted = usage.aggregate(Sum('reservation_count'), Sum('reserved_hours'))
+
+        url = reverse('maintenance-reschedule', args=[maintenance.pk])
+        response = self.client.post(url, {'dry_run': True}, format='json')
+        self.assertTrue(response.data['dry_run'])
+        self.assertEqual(Reservation.objects.get(pk=first.pk).start_time, first.start_time)
+        self.assertEqual(self.client.post(url, {'dry_run': 'maybe'}).status_code, 400)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'dry_run': 'false'})  # Form encoded
+        self.assertEqual(response.status_code, 200)
+        # The slot right after the window is taken, so both go after `after`
+        moved = {row['id']: row['start_time'] for row in response.data['moved']}
+        self.assertEqual(moved, {first.pk: after.end_time, second.pk: after.end_time + timedelta(hours=1)})
+        self.assertEqual(Reservation.objects.get(pk=second.pk).start_time, after.end_time + timedelta(hours=1))
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "reservations_reservation"')]), 1)
+
+        # Usage moves between days at most, the totals stay the same
+        self.assertEqual(usage.aggregate(Sum('reservation_count'), Sum('reserved_hours')), counted)
+        job = NotificationJob.objects.filter(event='maintenance_alert').latest('id')
+        self.assertEqual(sorted(job.payload['reservation_ids']), sorted([first.pk, second.pk]))
+
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.post(url, {}, format='json').status_code, 403)
+
+    def test_reschedule_refused_by_the_overlap_constraint_is_a_conflict(self):
+        first = self.make_reservation(self.equipment, offset_hours=0, hours=1, status='confirmed')
+        maintenance = MaintenanceLog.objects.create(
+            equipment=self.equipment, maintenance_type='Repair', description='', performed_by='tech',
+            start_date=self.start, end_date=self.start + timedelta(hours=2),
+        )
+        # What PostgreSQL raises when a concurrent booking took the new slot
+        error = IntegrityError('conflicting key value violates exclusion constraint "reservation_no_overlap"')
+        with patch('reservations.maintenance.Reservation.objects.bulk_update', side_effect=error):
+            response = self.client.post(reverse('maintenance-reschedule', args=[maintenance.pk]), {}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Reservation.objects.get(pk=first.pk).start_time, first.start_time)
+
+    def test_upcoming_lists_all_equipment_in_one_query(self):
+        other = self.make_equipment('TEM')
+        self.make_reservation(self.equipment, offset_hours=0)
+        self.schedule(offset_hours=0)
+        self.schedule(offset_hours=30, equipment=other)
+        self.schedule(offset_hours=24 * 60)  # Beyond the default 30 days
+
+        self.client.force_authenticate(self.student)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('maintenance-upcoming'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['equipment_name'], row['affected_reservations']) for row in response.data],
+                         [('SEM', 1), ('TEM', 0)])
+        self.assertEqual(self.client.get(reverse('maintenance-upcoming'), {'days': 0}).status_code, 400)
+
+
+class SlotSuggestionTests(ReservationTestMixin, TestCase):
+    """
+    Free slot suggestions from the interval index
+    """
+    def setUp(self):
+        super().setUp()
+        self.start = round_up(self.start.replace(minute=0, second=0, microsecond=0))
+        self.equipment = self.make_equipment(max_reservation_hours=4)
+        self.client.force_authenticate(self.student)
+
+    def test_index_matches_a_linear_scan(self):
+        rng = random.Random(7)
+        base = self.start
+        busy, cursor = [], base
+        for _ in range(300):
+            cursor += timedelta(minutes=15 * rng.randint(0, 12))
+            length = timedelta(minutes=15 * rng.randint(1, 16))
+            busy.append((cursor, cursor + length))
+            cursor += length
+        end = cursor + timedelta(hours=1)
+        index = FreeSlotIndex(busy, base, end)
+        gaps = free_intervals(busy, base, end)
+        for _ in range(200):
+            after = base + timedelta(minutes=15 * rng.randint(0, 4000))
+            duration = timedelta(minutes=15 * rng.randint(1, 12))
+            expected = next(
+                (max(gap_start, after) for gap_start, gap_end in gaps
+                 if max(gap_start, after) + duration <= gap_end),
+                None,
+            )
+            self.assertEqual(index.first_fit(after, duration), expected)
+
+    def test_next_slots_skip_reservations_and_maintenance(self):
+        self.make_reservation(self.equipment, offset_hours=0, hours=2)
+        MaintenanceLog.objects.create(
+            equipment=self.equipment, maintenance_type='Repair', description='', performed_by='tech',
+            start_date=self.start + timedelta(hours=3), end_date=self.start + timedelta(hours=5),
+        )
+        with self.assertNumQueries(2):  # The equipment row and one interval query
+            response = self.client.get(reverse('equipment-slot-suggestions', args=[self.equipment.pk]), {
+                'duration': 1.5, 'after': self.start.isoformat(), 'count': 2,
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [slot['start_time'] for slot in response.data['slots']],
+            [self.start + timedelta(hours=5), self.start + timedelta(hours=6, minutes=30)],
+        )
+
+        response = self.client.get(reverse('equipment-slot-suggestions', args=[self.equipment.pk]),
+                                   {'duration': 5})
+        self.assertEqual(response.status_code, 400)
+
+    def test_earliest_slot_across_a_category(self):
+        other = self.make_equipment('TEM')
+        self.make_equipment('Long only', max_reservation_hours=1)
+        self.make_reservation(self.equipment, offset_hours=0, hours=3)
+        self.make_reservation(other, offset_hours=0, hours=1)
+        response = self.client.get(reverse('category-slot-suggestions'), {
+            'category': self.category.pk, 'duration': 2, 'after': self.start.isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(slot['equipment_name'], slot['start_time']) for slot in response.data['slots']],
+            [('TEM', self.start + timedelta(hours=1)), ('SEM', self.start + timedelta(hours=3))],
+        )
+
+
+class CalendarTests(ReservationTestMixin, TestCase):
+    """
+    Streamed .ics feeds with conditional GET, and .ics import
+    """
+    def setUp(self):
+        super().setUp()
+        self.equipment = self.make_equipment()
+        self.client.force_authenticate(self.student)
+
+    def read(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_feeds_stream_and_revalidate(self):
+        mine = self.make_reservation(self.equipment, purpose='Imaging, grids; batch 2')
+        self.make_reservation(self.equipment, user=self.manager, offset_hours=2, purpose='Private')
+        token = calendar_feed_token(self.student)
+        client = APIClient()  # Calendar apps only have the URL
+
+        response = client.get(reverse('calendar-my-feed'), {'token': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = self.read(response)
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn(f'UID:reservation-{mine.pk}@testserver', body)
+        self.assertIn('DESCRIPTION:Imaging\\, grids\; batch 2', body)
+        self.assertEqual(body.count('BEGIN:VEVENT'), 1)
+
+        with self.assertNumQueries(2):  # The token's user and one aggregate
+            response = client.get(reverse('calendar-my-feed'), {'token': token},
+                                  HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        shared = self.read(client.get(reverse('calendar-equipment-feed', args=[self.equipment.pk]), {'token': token}))
+        self.assertEqual(shared.count('BEGIN:VEVENT'), 2)
+        self.assertNotIn('Private', shared)
+        self.assertEqual(self.read(client.get(reverse('calendar-lab-feed'), {'token': token, 'location': 'Lab 2'}))
+                         .count('BEGIN:VEVENT'), 0)
+
+        self.assertEqual(client.get(reverse('calendar-my-feed'), {'token': token + 'x'}).status_code, 401)
+        self.assertEqual(client.get(reverse('calendar-my-feed')).status_code, 401)
+        self.student.set_password('changed')
+        self.student.save()
+        self.assertEqual(client.get(reverse('calendar-my-feed'), {'token': token}).status_code, 401)
+
+    async def test_feed_streams_under_asgi(self):
+        await sync_to_async(self.make_reservation)(self.equipment)
+        token = await sync_to_async(calendar_feed_token)(self.student)
+        response = await self.async_client.get(reverse('calendar-my-feed'), {'token': token})
+        self.assertEqual(response.status_code, 200)
+        # Served from an async iterator, not read into a list by Django first
+        self.assertTrue(response.is_async)
+        body = b''.join([piece async for piece in response.streaming_content]).decode()
+        self.assertEqual(body.count('BEGIN:VEVENT'), 1)
+        self.assertTrue(body.endswith('END:VCALENDAR\r\n'))
+
+    def test_feed_changes_when_a_reservation_changes(self):
+        reservation = self.make_reservation(self.equipment)
+        url = reverse('calendar-equipment-feed', args=[self.equipment.pk])
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {issue_tokens(self.student).access_token}')
+        etag = self.client.get(url)['ETag']
+        reservation.status = 'cancelled'
+        reservation.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('BEGIN:VEVENT', self.read(response))
+
+    def test_import_books_all_events_or_none(self):
+        def event(hours_from, hours, summary='Run'):
+            start = self.start + timedelta(hours=hours_from)
+            return (f'BEGIN:VEVENT\r\nDTSTART:{start:%Y%m%dT%H%M%SZ}\r\nDURATION:PT{hours}H\r\n'
+                    f'SUMMARY:{summary}\r\nBEGIN:VALARM\r\nDESCRIPTION:Alarm\r\nEND:VALARM\r\nEND:VEVENT\r\n')
+        self.start = self.start.astimezone(dt_timezone.utc)
+        calendar = 'BEGIN:VCALENDAR\r\n' + ''.join(event(i * 2, 1, f'Run {i}') for i in range(30)) + 'END:VCALENDAR\r\n'
+
+        url = reverse('reservation-import')
+        response = self.client.post(url, {'equipment': self.equipment.pk, 'calendar': calendar}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 30)
+        self.assertEqual(Reservation.objects.filter(user=self.student, purpose='Run 3').count(), 1)
+
+        # Importing again collides with the bookings just made
+        response = self.client.post(url, {'equipment': self.equipment.pk, 'calendar': calendar}, format='json')
+        self.assertEqual(response.status_code, 409)
+
+        overlapping = 'BEGIN:VCALENDAR\r\n' + event(200, 2) + event(201, 2) + event(300, 30) + 'END:VCALENDAR'
+        response = self.client.post(url, {'equipment': self.equipment.pk, 'calendar': overlapping}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.data['events']), [2, 3])
+        self.assertEqual(Reservation.objects.count(), 30)
@@ -1,11 +1,34 @@
 from django.urls import path
+from reservation_system.async_views import async_read_view
 from . import views
 
 urlpatterns = [
-    path('reservations/', views.ReservationListView.as_view(), name='reservation-list'),
+    path('reservations/', async_read_view(views.ReservationListView.as_view()), name='reservation-list'),
     path('admin/reservations/', views.AllReservationListView.as_view(), name='all-reservations'),
+    path('reservations/batch/', views.batch_reservations, name='reservation-batch'),
     path('reservations/<int:pk>/', views.ReservationDetailView.as_view(), name='reservation-detail'),
+    path('reservations/import/', views.import_calendar, name='reservation-import'),
+    path('calendar/', views.calendar_feed_urls, name='calendar-feeds'),
+    path('calendar/me.ics', views.my_calendar_feed, name='calendar-my-feed'),
+    path('calendar/lab.ics', views.lab_calendar_feed, name='calendar-lab-feed'),
+    path('calendar/equipment/<int:equipment_id>.ics', views.equipment_calendar_feed,
+         name='calendar-equipment-feed'),
+    path('waitlist/', views.WaitlistListView.as_view(), name='waitlist-list'),
+    path('waitlist/<int:pk>/', views.WaitlistDetailView.as_view(), name='waitlist-detail'),
+    path('quotas/remaining/', views.remaining_quota, name='quota-remaining'),
     path('maintenance/', views.MaintenanceLogListView.as_view(), name='maintenance-list'),
+    path('maintenance/upcoming/', views.upcoming_maintenance_list, name='maintenance-upcoming'),
+    path('maintenance/<int:pk>/reschedule/', views.reschedule_maintenance_conflicts, name='maintenance-reschedule'),
     path('notifications/', views.NotificationListView.as_view(), name='notification-list'),
-    path('equipment/<int:equipment_id>/availability/', views.equipment_availability, name='equipment-availability'),
+    path('notifications/unread-count/', views.unread_notification_count, name='notification-unread-count'),
+    path('notifications/mark-read/', views.mark_notifications_read, name='notification-mark-read'),
+    path('equipment/availability/', async_read_view(views.bulk_availability), name='bulk-availability'),
+    path('equipment/events/', views.availability_events, name='availability-events'),
+    path('equipment/events/token/', views.availability_events_token, name='availability-events-token'),
+    path('equipment/suggestions/', async_read_view(views.category_slot_suggestions),
+         name='category-slot-suggestions'),
+    path('equipment/<int:equipment_id>/suggestions/', async_read_view(views.equipment_slot_suggestions),
+         name='equipment-slot-suggestions'),
+    path('equipment/<int:equipment_id>/availability/', async_read_view(views.equipment_availability),
+         name='equipment-availability'),
 ]
\ No newline at end of file
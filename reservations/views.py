@@ -1,11 +1,56 @@
-from rest_framework import generics, permissions, status
+from datetime import timedelta
+
+from rest_framework import generics, permissions, serializers, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.db.models import Q
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed
+from django_filters.rest_framework import DjangoFilterBackend
 from django.core.exceptions import PermissionDenied
-from .models import Reservation, MaintenanceLog, Notification
-from .serializers import ReservationSerializer, MaintenanceLogSerializer, NotificationSerializer
+from .models import Reservation, MaintenanceLog, Notification, WaitlistEntry
+from .serializers import (
+    ReservationSerializer, MaintenanceLogSerializer, NotificationSerializer, UpcomingMaintenanceSerializer,
+    WaitlistEntrySerializer,
+)
+from .filters import MaintenanceLogFilter, ReservationFilter
+from .conflicts import blocking_intervals, lock_equipment, save_reservation
+from .maintenance import RESCHEDULE_HORIZON, reschedule_affected, upcoming_maintenance
+from .scheduling import earliest_slots, parse_suggestion_params, suggest_slots
+from .ical import CalendarImportError, feed_queryset, feed_version, generate_calendar, import_events, parse_calendar
+from .recurrence import create_series
+from .batch import BatchRejected, apply_batch
+from .quotas import remaining_quotas
+from .availability import busy_intervals, free_intervals, parse_time_range
+from equipment.models import Equipment
+from reservation_system.async_views import streaming_response
+from reservation_system.events import equipment_channel, sse_stream
+from reservation_system.serializers import split_param
+from users.authentication import (
+    CalendarTokenAuthentication, ClaimsJWTAuthentication, QueryTokenJWTAuthentication, calendar_feed_token,
+    issue_stream_token,
+)
+
+# Upper bound on instruments per bulk availability request
+MAX_BULK_EQUIPMENT = 500
+
+# Longest look-ahead of the upcoming maintenance listing
+MAX_UPCOMING_DAYS = 365
+
+# Longest look-ahead of the remaining quota listing, in weeks
+MAX_QUOTA_WEEKS = 8
+
+# Largest .ics file accepted by the import
+MAX_CALENDAR_BYTES = 2 * 1024 * 1024
 
 class AllReservationListView(generics.ListAPIView):
     """
@@ -13,12 +58,16 @@ class AllReservationListView(generics.ListAPIView):
     """
     serializer_class = ReservationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ReservationFilter  # Same filters as the exports
 
     def get_queryset(self):
         user = self.request.user
         # Only admins and lab managers can access this view
         if user.role in ['super_admin', 'lab_manager']:
-            return Reservation.objects.all().order_by('-created_at')
+            return ReservationSerializer.setup_eager_loading(
+                Reservation.objects.all().order_by('-created_at'), self.request
+            )
         # Regular users get empty queryset (will be blocked by permission anyway)
         return Reservation.objects.none()
 
@@ -41,13 +90,20 @@ class ReservationListView(generics.ListCreateAPIView):
         
         # Regular users only see their own reservations
         # return Reservation.objects.filter(user=user)
-        return Reservation.objects.filter(user=self.request.user)
+        return ReservationSerializer.setup_eager_loading(
+            Reservation.objects.filter(user=self.request.user), self.request
+        )
 
     def perform_create(self, serializer):
         """
         Automatically assign the current user when creating a reservation
+        Overlapping bookings of the same equipment are rejected with a 409
+        Recurring reservations book every occurrence of the series at once
         """
-        serializer.save(user=self.request.user)
+        if serializer.validated_data.get('is_recurring'):
+            create_series(serializer, user=self.request.user)
+        else:
+            save_reservation(serializer, user=self.request.user)
 
 class ReservationDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
@@ -62,24 +118,193 @@ class ReservationDetailView(generics.RetrieveUpdateDestroyAPIView):
         """
         user = self.request.user
         if user.role in ['super_admin', 'lab_manager']:
-            return Reservation.objects.all()
-        return Reservation.objects.filter(user=user)
+            return ReservationSerializer.setup_eager_loading(Reservation.objects.all(), self.request)
+        return ReservationSerializer.setup_eager_loading(Reservation.objects.filter(user=user), self.request)
+
+    def perform_update(self, serializer):
+        """
+        Moving or re-activating a reservation goes through the same conflict check
+        """
+        save_reservation(serializer)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def batch_reservations(request):
+    """
+    Create, update and cancel several reservations (e.g. every instrument of
+    one experiment) in one request, all or none
+    {"create": [{equipment, start_time, end_time, purpose}], "update": [{id, ...}], "cancel": [ids]}
+    Failures are reported per entry, with conflicts as a 409
+    """
+    if not isinstance(request.data, dict):
+        return Response({'error': 'Send a JSON object with create, update and cancel lists'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        created, updated, cancelled = apply_batch(request.data, request.user, context={'request': request})
+    except BatchRejected as error:
+        return Response({'error': error.message, 'items': error.items}, status=error.status_code)
+    context = {'request': request}
+    return Response({
+        'created': ReservationSerializer(created, many=True, context=context).data,
+        'updated': ReservationSerializer(updated, many=True, context=context).data,
+        'cancelled': [reservation.pk for reservation in cancelled],
+    }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+class WaitlistListView(generics.ListCreateAPIView):
+    """
+    Waitlist entries (all of them for lab managers), and joining the
+    waitlist for a slot of some duration inside a time window
+    """
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        entries = WaitlistEntry.objects.select_related('equipment')
+        if user.role in ['super_admin', 'lab_manager']:
+            return entries
+        return entries.filter(user_id=user.pk)
+
+    def perform_create(self, serializer):
+        priority = WaitlistEntry.ROLE_PRIORITY.get(self.request.user.role, max(WaitlistEntry.ROLE_PRIORITY.values()))
+        serializer.save(user=self.request.user, priority=priority)
+
+class WaitlistDetailView(generics.RetrieveDestroyAPIView):
+    """
+    One of the user's waitlist entries; DELETE leaves the waitlist
+    """
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return WaitlistEntry.objects.select_related('equipment').filter(user_id=self.request.user.pk)
+
+    def destroy(self, request, *args, **kwargs):
+        entry = self.get_object()
+        if entry.status != 'waiting':
+            return Response({'error': f'This entry is already {entry.status}'}, status=status.HTTP_409_CONFLICT)
+        entry.status = 'withdrawn'
+        entry.save(update_fields=['status'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def remaining_quota(request):
+    """
+    The user's weekly quotas on ?equipment= with the hours used and left,
+    for the week of ?date= (default today) and ?weeks= after it (default 1)
+    Read from the weekly counters, like the check at booking time
+    """
+    try:
+        equipment_id = int(request.query_params['equipment'])
+        weeks = int(request.query_params.get('weeks', 1))
+    except (KeyError, ValueError):
+        return Response({'error': 'equipment must be an equipment id'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= weeks <= MAX_QUOTA_WEEKS:
+        return Response({'error': f'weeks must be between 1 and {MAX_QUOTA_WEEKS}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    day = timezone.localdate()
+    if 'date' in request.query_params:
+        try:
+            day = parse_date(request.query_params['date'])
+        except ValueError:
+            day = None
+        if day is None:
+            return Response({'error': 'date must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        equipment = Equipment.objects.only('id', 'name', 'category_id').get(pk=equipment_id, is_active=True)
+    except Equipment.DoesNotExist:
+        return Response({'error': 'Equipment not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'equipment_id': equipment.pk,
+        'weeks': remaining_quotas(request.user, equipment, day, weeks),
+    })
 
 class MaintenanceLogListView(generics.ListCreateAPIView):
     serializer_class = MaintenanceLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = MaintenanceLogFilter
 
     def get_queryset(self):
         user = self.request.user
         if user.role in ['super_admin', 'lab_manager']:
-            return MaintenanceLog.objects.all()
+            return MaintenanceLog.objects.select_related('equipment')
         return MaintenanceLog.objects.none()  # Regular users see nothing for now
     
     def perform_create(self, serializer):
+        """
+        Maintenance windows block the equipment, so they are written under the
+        same equipment lock as reservations
+        """
         user = self.request.user
         if user.role not in ['super_admin', 'lab_manager']:
             raise PermissionDenied("Only lab managers and admins can create maintenance logs")
-        serializer.save(technician=user)
+        performed_by = serializer.validated_data.get('performed_by') or user.get_full_name() or user.username
+        with transaction.atomic():
+            lock_equipment(serializer.validated_data['equipment'].pk)
+            serializer.save(performed_by=performed_by)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def reschedule_maintenance_conflicts(request, pk):
+    """
+    Move the bookings a maintenance window displaces to the next free slot of
+    the same length, cancelling those that do not fit within horizon_days
+    Body: {"horizon_days": 14, "dry_run": false} (both optional)
+    """
+    if request.user.role not in ['super_admin', 'lab_manager']:
+        return Response({'error': 'Only lab managers and admins can reschedule reservations'},
+                        status=status.HTTP_403_FORBIDDEN)
+    try:
+        maintenance = MaintenanceLog.objects.get(pk=pk)
+    except MaintenanceLog.DoesNotExist:
+        return Response({'error': 'Maintenance log not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        horizon_days = int(request.data.get('horizon_days', RESCHEDULE_HORIZON.days))
+    except (TypeError, ValueError):
+        horizon_days = 0
+    if not 1 <= horizon_days <= MAX_UPCOMING_DAYS:
+        return Response({'error': f'horizon_days must be between 1 and {MAX_UPCOMING_DAYS}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # Form posts send "false"/"0" as text
+        dry_run = serializers.BooleanField().to_internal_value(request.data.get('dry_run', False))
+    except serializers.ValidationError:
+        return Response({'error': 'dry_run must be true or false'}, status=status.HTTP_400_BAD_REQUEST)
+    moved, cancelled = reschedule_affected(maintenance, timedelta(days=horizon_days), dry_run=dry_run)
+    return Response({
+        'dry_run': dry_run,
+        'moved': [
+            {
+                'id': row['id'],
+                'start_time': row['start_time'],
+                'end_time': row['end_time'],
+                'previous_start_time': row['previous_start_time'],
+                'previous_end_time': row['previous_end_time'],
+            }
+            for row in moved
+        ],
+        'cancelled': [row['id'] for row in cancelled],
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def upcoming_maintenance_list(request):
+    """
+    Maintenance windows across all equipment for the next ?days= (default 30)
+    """
+    try:
+        days = int(request.query_params.get('days', 30))
+    except ValueError:
+        days = 0
+    if not 1 <= days <= MAX_UPCOMING_DAYS:
+        return Response({'error': f'days must be between 1 and {MAX_UPCOMING_DAYS}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    now = timezone.now()
+    windows = upcoming_maintenance(now, now + timedelta(days=days))
+    return Response(UpcomingMaintenanceSerializer(windows, many=True, context={'request': request}).data)
 
 class NotificationListView(generics.ListAPIView):
     serializer_class = NotificationSerializer
@@ -88,11 +313,36 @@ class NotificationListView(generics.ListAPIView):
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user)
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def unread_notification_count(request):
+    """
+    Number of unread notifications, for the badge (served from a partial index)
+    """
+    return Response({'unread': Notification.objects.filter(user=request.user, is_read=False).count()})
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def mark_notifications_read(request):
+    """
+    Mark the given notification ids (or all of them) as read in one UPDATE
+    Body: {"ids": [...]} (optional)
+    """
+    notifications = Notification.objects.filter(user=request.user, is_read=False)
+    ids = request.data.get('ids')
+    if ids is not None:
+        try:
+            notifications = notifications.filter(pk__in=[int(pk) for pk in ids])
+        except (TypeError, ValueError):
+            return Response({'error': 'ids must be a list of notification ids'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'updated': notifications.update(is_read=True)})
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def equipment_availability(request, equipment_id):
     """
     Check if equipment is available for a given time period
+    Reservations and maintenance windows both make it unavailable
     """
     start_time = request.query_params.get('start_time')
     end_time = request.query_params.get('end_time')
@@ -103,17 +353,315 @@ def equipment_availability(request, equipment_id):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Check for reservations that overlap with the requested time
-    conflicting_reservations = Reservation.objects.filter(
-        equipment_id=equipment_id,
-        status__in=['pending', 'confirmed', 'active'],  # Only care about active reservations
-        start_time__lt=end_time,    # Reservation starts before requested end
-        end_time__gt=start_time     # Reservation ends after requested start
-    )
-    
-    is_available = not conflicting_reservations.exists()
+    # One query over reservations and maintenance; the full reservation
+    # rows are only loaded when something overlaps
+    blocks = blocking_intervals([equipment_id], start_time, end_time)
+    reservation_ids = [block.id for block in blocks if block.kind == 'reservation']
+    conflicting_data = []
+    if reservation_ids:
+        conflicting_reservations = ReservationSerializer.setup_eager_loading(
+            Reservation.objects.filter(pk__in=reservation_ids).order_by('start_time'), request
+        )
+        conflicting_data = ReservationSerializer(
+            conflicting_reservations, many=True, context={'request': request}
+        ).data
     
     return Response({
-        'available': is_available,
-        'conflicting_reservations': ReservationSerializer(conflicting_reservations, many=True).data
-    })
\ No newline at end of file
+        'available': not blocks,
+        'conflicting_reservations': conflicting_data,
+        'conflicting_maintenance': [
+            {'id': block.id, 'start_time': block.start_time, 'end_time': block.end_time,
+             'maintenance_type': block.label}
+            for block in blocks if block.kind == 'maintenance'
+        ],
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def equipment_slot_suggestions(request, equipment_id):
+    """
+    Next free slots of ?duration= hours for one equipment item
+    Optional: after (default now), count (default 5), horizon_days (default 14)
+    """
+    after, duration, count, horizon, error = parse_suggestion_params(request.query_params)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        equipment = Equipment.objects.only('id', 'max_reservation_hours').get(pk=equipment_id, is_active=True)
+    except Equipment.DoesNotExist:
+        return Response({'error': 'Equipment not found'}, status=status.HTTP_404_NOT_FOUND)
+    if duration > timedelta(hours=equipment.max_reservation_hours):
+        return Response({'error': f'This equipment can be reserved for at most {equipment.max_reservation_hours} hours'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    slots = suggest_slots(equipment, after, duration, count, horizon)
+    return Response({
+        'equipment_id': equipment.pk,
+        'slots': [{'start_time': start, 'end_time': end} for start, end in slots],
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def category_slot_suggestions(request):
+    """
+    Earliest free slot of ?duration= hours on each equipment item of
+    ?category=, soonest first (same optional parameters as one item)
+    """
+    after, duration, count, horizon, error = parse_suggestion_params(request.query_params)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+    category = request.query_params.get('category')
+    if not category or not category.isdigit():
+        return Response({'error': 'category parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    equipment = Equipment.objects.filter(is_active=True, category_id=category).exclude(
+        status='out_of_service'
+    ).only('id', 'name', 'max_reservation_hours').order_by('id')[:MAX_BULK_EQUIPMENT]
+    slots = earliest_slots(list(equipment), after, duration, count, horizon)
+    return Response({
+        'slots': [
+            {'equipment_id': item.pk, 'equipment_name': item.name, 'start_time': start, 'end_time': end}
+            for item, start, end in slots
+        ],
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_availability(request):
+    """
+    Free/busy intervals for many equipment items over one time period
+    Select equipment with ?equipment=1,2,3 and/or ?category= / ?location=
+    """
+    start, end, error = parse_time_range(request.query_params)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+    equipment = Equipment.objects.filter(is_active=True)
+    ids = request.query_params.get('equipment')
+    category = request.query_params.get('category')
+    location = request.query_params.get('location')
+    if not (ids or category or location):
+        return Response(
+            {'error': 'Provide equipment ids, a category or a location'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if ids:
+        try:
+            equipment = equipment.filter(id__in=[int(i) for i in ids.split(',') if i.strip()])
+        except ValueError:
+            return Response({'error': 'equipment must be a comma separated list of ids'},
+                            status=status.HTTP_400_BAD_REQUEST)
+    if category:
+        equipment = equipment.filter(category_id=category)
+    if location:
+        equipment = equipment.filter(location=location)
+
+    equipment = list(equipment.order_by('id').values_list('id', 'name')[:MAX_BULK_EQUIPMENT + 1])
+    if len(equipment) > MAX_BULK_EQUIPMENT:
+        return Response({'error': f'At most {MAX_BULK_EQUIPMENT} equipment items per request'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    busy = busy_intervals([equipment_id for equipment_id, _ in equipment], start, end)
+
+    def as_json(intervals):
+        return [{'start': s, 'end': e} for s, e in intervals]
+
+    return Response({
+        'start_time': start,
+        'end_time': end,
+        'equipment': [
+            {
+                'equipment_id': equipment_id,
+                'equipment_name': name,
+                'available': not busy[equipment_id],
+                'busy': as_json(busy[equipment_id]),
+                'free': as_json(free_intervals(busy[equipment_id], start, end)),
+            }
+            for equipment_id, name in equipment
+        ],
+    })
+
+@require_GET
+async def availability_events(request):
+    """
+    Server-Sent Events stream of reservation and equipment status changes
+    for ?equipment=1,2,3 (needs an ASGI server; EventSource clients send a
+    token from availability_events_token as ?stream_token=)
+    Events: reservation.created/updated/cancelled/deleted, equipment.status,
+    and resync when the client fell behind and should reload everything
+    """
+    try:
+        auth = await sync_to_async(QueryTokenJWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as error:
+        # Same body as DRF's 401s
+        detail = error.detail if isinstance(error.detail, dict) else {'detail': error.detail}
+        return JsonResponse(detail, status=401)
+    if auth is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    try:
+        equipment_ids = {int(pk) for pk in split_param(request.GET.get('equipment'))}
+    except ValueError:
+        return JsonResponse({'error': 'equipment must be a comma separated list of ids'}, status=400)
+    if not equipment_ids or len(equipment_ids) > MAX_BULK_EQUIPMENT:
+        return JsonResponse({'error': f'Subscribe to 1-{MAX_BULK_EQUIPMENT} equipment ids'}, status=400)
+
+    response = StreamingHttpResponse(
+        sse_stream([equipment_channel(pk) for pk in sorted(equipment_ids)]),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx-style proxies from buffering the stream
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def availability_events_token(request):
+    """
+    Short-lived ?stream_token= for the event stream URL
+    It is only checked on connect: fetch a new one before reconnecting
+    once it has expired
+    """
+    token = issue_stream_token(request.user)
+    return Response({
+        'stream_token': str(token),
+        'expires_in': int(settings.STREAM_TOKEN_LIFETIME.total_seconds()),
+        'url': request.build_absolute_uri(reverse('availability-events')),
+    })
+
+
+def _feed_user(request):
+    """
+    User of a calendar feed request, from ?token= (calendar apps) or an
+    Authorization header; returns (user, error response)
+    """
+    try:
+        auth = CalendarTokenAuthentication().authenticate(request) or ClaimsJWTAuthentication().authenticate(request)
+    except AuthenticationFailed as error:
+        detail = error.detail if isinstance(error.detail, dict) else {'detail': error.detail}
+        return None, JsonResponse(detail, status=401)
+    if auth is None:
+        return None, JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    return auth[0], None
+
+
+def _calendar_response(request, queryset, scope, name, private):
+    """
+    Streamed .ics feed with ETag/Last-Modified (an async iterator under
+    ASGI); an unchanged feed costs one aggregate query and is answered with a 304
+    """
+    etag, last_modified = feed_version(queryset, scope)
+    last_modified = last_modified and int(last_modified.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = streaming_response(
+            request,
+            generate_calendar(queryset, name, request.get_host().split(':')[0], private),
+            content_type='text/calendar; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'inline; filename="{scope.replace(":", "-")}.ics"'
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@require_GET
+def my_calendar_feed(request):
+    """
+    iCalendar feed of the requesting user's reservations
+    """
+    user, error = _feed_user(request)
+    if error:
+        return error
+    queryset = feed_queryset(Reservation.objects.filter(user_id=user.pk))
+    return _calendar_response(request, queryset, f'user:{user.pk}', 'My lab reservations', private=True)
+
+
+@require_GET
+def equipment_calendar_feed(request, equipment_id):
+    """
+    iCalendar feed of one equipment item's bookings (no purposes or names)
+    """
+    user, error = _feed_user(request)
+    if error:
+        return error
+    name = Equipment.objects.filter(pk=equipment_id, is_active=True).values_list('name', flat=True).first()
+    if name is None:
+        return JsonResponse({'error': 'Equipment not found'}, status=404)
+    queryset = feed_queryset(Reservation.objects.filter(equipment_id=equipment_id))
+    return _calendar_response(request, queryset, f'equipment:{equipment_id}', f'{name} bookings', private=False)
+
+
+@require_GET
+def lab_calendar_feed(request):
+    """
+    iCalendar feed of every booking in the lab, or at one ?location=
+    """
+    user, error = _feed_user(request)
+    if error:
+        return error
+    location = request.GET.get('location', '')
+    queryset = Reservation.objects.filter(equipment__is_active=True)
+    if location:
+        queryset = queryset.filter(equipment__location=location)
+    queryset = feed_queryset(queryset)
+    return _calendar_response(request, queryset, f'lab:{location}', f'{location or "Lab"} bookings', private=False)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def calendar_feed_urls(request):
+    """
+    Subscription URLs of the calendar feeds, with the user's feed token
+    The token stops working when the user changes their password
+    """
+    token = f'?token={calendar_feed_token(request.user)}'
+    return Response({
+        'my_reservations': request.build_absolute_uri(reverse('calendar-my-feed')) + token,
+        'lab': request.build_absolute_uri(reverse('calendar-lab-feed')) + token,
+        'equipment': request.build_absolute_uri(
+            reverse('calendar-equipment-feed', args=[0])
+        ).replace('/0.ics', '/{equipment_id}.ics') + token,
+    })
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def import_calendar(request):
+    """
+    Book the events of an .ics file on one equipment item, all or none
+    Multipart: file (.ics) and equipment; or JSON: calendar (text) and equipment
+    """
+    upload = request.FILES.get('file')
+    if upload is not None:
+        if upload.size > MAX_CALENDAR_BYTES:
+            return Response({'error': f'The file is larger than {MAX_CALENDAR_BYTES // (1024 * 1024)} MB'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            text = upload.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            return Response({'error': 'The file must be UTF-8 text'}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        text = request.data.get('calendar')
+        if not isinstance(text, str) or not text:
+            return Response({'error': 'Upload an .ics file or send its text as calendar'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        equipment = Equipment.objects.get(pk=int(request.data.get('equipment')), is_active=True)
+    except (TypeError, ValueError, Equipment.DoesNotExist):
+        return Response({'error': 'equipment must be the id of an active equipment item'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        created = import_events(parse_calendar(text), equipment, request.user)
+    except CalendarImportError as error:
+        return Response({'error': 'The calendar could not be imported', 'events': error.errors},
+                        status=status.HTTP_400_BAD_REQUEST)
+    except ValueError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'created': len(created), 'ids': [reservation.pk for reservation in created]},
+                    status=status.HTTP_201_CREATED)
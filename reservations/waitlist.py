@@ -0,0 +1,167 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .availability import busy_intervals, free_intervals, merge_intervals
+from .conflicts import lock_equipment_items
+from .models import NotificationJob, Reservation, WaitlistEntry
+from .quotas import QuotaLedger, weeks_between
+from .scheduling import round_up
+from .signals import reservations_bulk_created
+
+logger = logging.getLogger(__name__)
+
+
+def waiting_entries(windows):
+    """
+    Waiting entries whose window overlaps a window of their equipment item
+    ({equipment_id: [(start, end)]}), in priority order; one indexed query
+    """
+    overlapping = Q()
+    for equipment_id, intervals in windows.items():
+        for start, end in intervals:
+            overlapping |= Q(equipment_id=equipment_id, window_start__lt=end, window_end__gt=start)
+    if not overlapping:
+        return []
+    return list(
+        WaitlistEntry.objects.filter(overlapping, status='waiting').select_related('user', 'equipment')
+        .order_by('priority', 'created_at', 'id')
+    )
+
+
+def _free_parts(busy, start, end):
+    """
+    Free gaps inside [start, end) given busy intervals over a wider range
+    """
+    return free_intervals(
+        [(max(busy_start, start), min(busy_end, end)) for busy_start, busy_end in busy
+         if busy_start < end and busy_end > start],
+        start, end,
+    )
+
+
+def _take(gaps, entry, ledger=None):
+    """
+    Book the earliest fit for `entry` out of the free gaps (split in place)
+    that the entry's user quotas allow; returns (start, end) or None
+    """
+    for i, (gap_start, gap_end) in enumerate(gaps):
+        start = round_up(max(gap_start, entry.window_start))
+        end = start + entry.duration
+        if end <= min(gap_end, entry.window_end) and not (
+            ledger and ledger.breach(entry.user, entry.equipment, start, end)
+        ):
+            gaps[i:i + 1] = [gap for gap in ((gap_start, start), (end, gap_end)) if gap[0] < gap[1]]
+            return start, end
+    return None
+
+
+def free_slot(equipment_id, window_start, window_end, duration, now=None):
+    """
+    Earliest (start, end) of `duration` that is free inside the window from
+    now on, or None
+    """
+    start = max(window_start, now or timezone.now())
+    if start >= window_end:
+        return None
+    busy = busy_intervals([equipment_id], start, window_end)[equipment_id]
+    for gap_start, gap_end in free_intervals(busy, start, window_end):
+        slot_start = round_up(gap_start)
+        if slot_start + duration <= gap_end:
+            return slot_start, slot_start + duration
+    return None
+
+
+def allocate(freed, now=None):
+    """
+    Give freed intervals ([(equipment_id, start, end)]) to the waitlist
+    Under the equipment locks, the still free parts of the intervals are
+    read with one query and the overlapping waiting entries with another;
+    entries then take the earliest fit their weekly quotas allow, in
+    priority order (role, request time). The winners are booked with one
+    bulk_create, pending approval like any other booking unless they are
+    lab managers, and notified through the notification queue
+    Returns the created reservations
+    """
+    now = now or timezone.now()
+    windows = {}
+    for equipment_id, start, end in freed:
+        start = max(start, now)  # Only the part of a no-show that is still ahead
+        if start < end:
+            windows.setdefault(equipment_id, []).append((start, end))
+    if not windows:
+        return []
+    windows = {equipment_id: merge_intervals(sorted(intervals)) for equipment_id, intervals in windows.items()}
+
+    with transaction.atomic():
+        lock_equipment_items(list(windows))
+        entries = waiting_entries(windows)
+        if not entries:
+            return []
+        start = min(start for intervals in windows.values() for start, _ in intervals)
+        end = max(end for intervals in windows.values() for _, end in intervals)
+        busy = busy_intervals(list(windows), start, end)
+        gaps = {
+            equipment_id: [gap for interval in intervals for gap in _free_parts(busy[equipment_id], *interval)]
+            for equipment_id, intervals in windows.items()
+        }
+
+        # An entry whose booking would break a weekly quota is passed over
+        ledger = QuotaLedger(
+            {entry.user_id: entry.user for entry in entries}.values(),
+            {entry.equipment_id: entry.equipment for entry in entries}.values(),
+            weeks_between(start, end),
+            lock=True,
+        )
+        winners = []
+        for entry in entries:
+            slot = _take(gaps[entry.equipment_id], entry, ledger)
+            if slot:
+                ledger.add(entry.user, entry.equipment, *slot)
+                winners.append((entry, slot))
+        if not winners:
+            return []
+
+        created = Reservation.objects.bulk_create([
+            Reservation(
+                user_id=entry.user_id,
+                equipment_id=entry.equipment_id,
+                start_time=slot_start,
+                end_time=slot_end,
+                status='confirmed' if entry.user.role in ['super_admin', 'lab_manager'] else 'pending',
+                purpose=entry.purpose,
+            )
+            for entry, (slot_start, slot_end) in winners
+        ])
+        for (entry, _), reservation in zip(winners, created):
+            entry.status, entry.reservation = 'allocated', reservation
+        WaitlistEntry.objects.bulk_update([entry for entry, _ in winners], ['status', 'reservation'])
+        # The waitlist notification replaces the usual confirmation
+        reservations_bulk_created.send(sender=Reservation, reservations=created, notify=False)
+        NotificationJob.objects.bulk_create([
+            NotificationJob(event='waitlist_allocated', payload={'reservation_id': reservation.pk})
+            for reservation in created
+        ])
+    return created
+
+
+def allocate_on_commit(freed):
+    """
+    Run the allocator once the transaction that freed the slots commits
+    A failure is logged: the cancellation itself has already succeeded
+    """
+    def run():
+        try:
+            allocate(freed)
+        except Exception:
+            logger.exception('Waitlist allocation failed for %s', freed)
+    transaction.on_commit(run)
+
+
+def expire_waitlist(now=None):
+    """
+    Close waiting entries whose window has passed; returns how many
+    """
+    now = now or timezone.now()
+    return WaitlistEntry.objects.filter(status='waiting', window_end__lte=now).update(status='expired')
@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import BaseAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from .models import User
+from .revocation import deny_list
+
+# User fields carried in every token, enough for the permission checks in views
+CLAIM_FIELDS = ['username', 'role', 'is_approved', 'training_completed']
+
+# Seconds a full user row is cached for tokens without these claims
+USER_CACHE_TIMEOUT = 60
+
+CALENDAR_TOKEN_SALT = 'users.calendar-feed'
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def add_user_claims(token, user):
+    for field in CLAIM_FIELDS:
+        token[field] = getattr(user, field)
+    return token
+
+
+def issue_tokens(user):
+    """
+    Refresh/access pair with the user claims (the access token copies them)
+    """
+    return add_user_claims(RefreshToken.for_user(user), user)
+
+
+class StreamToken(AccessToken):
+    """
+    Short-lived token for the event stream URL, which cannot carry headers
+    Its own token type, so header authentication refuses it and a leaked
+    stream URL does not open the rest of the API
+    """
+    token_type = 'stream'
+    lifetime = settings.STREAM_TOKEN_LIFETIME
+
+
+def issue_stream_token(user):
+    return add_user_claims(StreamToken.for_user(user), user)
+
+
+def user_from_claims(token):
+    """
+    Unsaved-looking but real User instance built from token claims, no query
+    Every other field is deferred, so reading e.g. user.email loads it on demand
+    """
+    values = {'id': User._meta.pk.to_python(token['user_id']), 'is_active': True}
+    values.update({field: token[field] for field in CLAIM_FIELDS})
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in values]
+    return User.from_db('default', fields, [values[name] for name in fields])
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the user claims inside the token instead
+    of loading the users row on every request
+    Revoked tokens are refused through the in-process deny-list; tokens
+    issued before the claims existed fall back to a short-lived cached row
+    """
+
+    def get_user(self, validated_token):
+        if 'user_id' not in validated_token:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        if deny_list.is_revoked(validated_token):
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+
+        if all(field in validated_token for field in CLAIM_FIELDS):
+            return user_from_claims(validated_token)
+
+        user_id = User._meta.pk.to_python(validated_token['user_id'])
+        user = cache.get(user_cache_key(user_id))
+        if user is None:
+            user = User.objects.filter(pk=user_id).first()
+            if user is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            cache.set(user_cache_key(user_id), user, USER_CACHE_TIMEOUT)
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+
+class QueryTokenJWTAuthentication(ClaimsJWTAuthentication):
+    """
+    Also accepts an issue_stream_token() as ?stream_token=, for EventSource
+    streams (browsers cannot set headers on them); use only on those endpoints
+    Access tokens are refused there, they would end up in URLs and logs
+    """
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        raw_token = request.GET.get('stream_token')
+        if result is None and raw_token:
+            try:
+                validated_token = StreamToken(raw_token)
+            except TokenError as error:
+                raise InvalidToken({'detail': _('Given token not valid for any token type'),
+                                    'messages': [{'token_class': 'StreamToken', 'message': error.args[0]}]})
+            return self.get_user(validated_token), validated_token
+        return result
+
+
+def _calendar_key(user):
+    # Changes with the password, so a password change revokes old feed URLs
+    return salted_hmac(CALENDAR_TOKEN_SALT, user.password).hexdigest()[:16]
+
+
+def calendar_feed_token(user):
+    """
+    Long-lived token for calendar subscription URLs, which cannot carry
+    headers or refresh a short-lived JWT
+    """
+    return signing.dumps({'user': user.pk, 'key': _calendar_key(user)}, salt=CALENDAR_TOKEN_SALT)
+
+
+class CalendarTokenAuthentication(BaseAuthentication):
+    """
+    Accepts a calendar_feed_token() as ?token=; use only on the .ics feeds
+    """
+    def authenticate(self, request):
+        raw_token = request.GET.get('token')
+        if not raw_token:
+            return None
+        try:
+            data = signing.loads(raw_token, salt=CALENDAR_TOKEN_SALT)
+            user = User.objects.get(pk=data['user'], is_active=True)
+        except (signing.BadSignature, KeyError, TypeError, User.DoesNotExist):
+            raise AuthenticationFailed(_('Invalid calendar token'), code='invalid_calendar_token')
+        if not constant_time_compare(data.get('key', ''), _calendar_key(user)):
+            raise AuthenticationFailed(_('Invalid calendar token'), code='invalid_calendar_token')
+        return user, None
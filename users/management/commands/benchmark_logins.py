@@ -0,0 +1,63 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils.module_loading import import_string
+
+from users.authentication import issue_tokens
+from users.models import User
+
+
+class Rollback(Exception):
+    """
+    Raised at the end of the benchmark so the test users are never committed
+    """
+
+
+class Command(BaseCommand):
+    help = 'Report logins per second for one worker with each configured password hasher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=100)
+        parser.add_argument('--hasher', action='append', dest='hashers',
+                            help='Hasher class path (repeatable, default: PASSWORD_HASHERS)')
+
+    def handle(self, *args, **options):
+        password = 'Benchmark@1234'
+        for path in options['hashers'] or settings.PASSWORD_HASHERS:
+            hasher = import_string(path)()
+            if hasher.library is not None:
+                try:
+                    hasher._load_library()
+                except ValueError:
+                    self.stdout.write(f'{path:<60} skipped (library not installed)')
+                    continue
+
+            # Only this hasher is configured, so authenticate() cannot upgrade
+            # the hash to the preferred one after the first login and time that
+            try:
+                with override_settings(PASSWORD_HASHERS=[path]), transaction.atomic():
+                    User.objects.create(
+                        username='bench_login', is_approved=True,
+                        password=make_password(password, hasher=hasher),
+                    )
+                    started = time.perf_counter()
+                    for _ in range(options['logins']):
+                        # Same work as login_user: verify the password, mint tokens
+                        user = authenticate(username='bench_login', password=password)
+                        issue_tokens(user)
+                    elapsed = time.perf_counter() - started
+                    if not User.objects.filter(username='bench_login', password__startswith=hasher.algorithm).exists():
+                        raise CommandError(f'{path}: the password was rehashed during the benchmark')
+                    raise Rollback()
+            except Rollback:
+                pass
+
+            self.stdout.write(
+                f'{path:<60} {options["logins"] / elapsed:8.1f} logins/s  '
+                f'{elapsed / options["logins"] * 1000:7.1f} ms/login'
+            )
@@ -37,4 +37,18 @@ class User(AbstractUser):
     )
     
     def __str__(self):
-        return f"{self.username} ({self.get_role_display()})"
\ No newline at end of file
+        return f"{self.username} ({self.get_role_display()})"
+
+class TokenRevocation(models.Model):
+    """
+    Compact JWT deny-list entry, kept only until the revoked tokens expire
+    Either one token (jti) or every token of a user issued before revoked_at
+    """
+    jti = models.CharField(max_length=255, blank=True, null=True, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True,
+                             related_name='token_revocations')
+    revoked_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return self.jti or f"user {self.user_id} before {self.revoked_at}"
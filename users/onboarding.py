@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from .authentication import user_cache_key
+from .models import User
+from .revocation import deny_list
+
+IMPORT_FIELDS = ['username', 'email', 'password', 'role', 'institution_id', 'department', 'phone_number']
+
+# Below this many passwords a process pool costs more than it saves
+POOL_THRESHOLD = 50
+
+MAX_IMPORT_ROWS = 10_000
+
+
+class ImportedUserSerializer(serializers.ModelSerializer):
+    """
+    One row of a bulk import
+    Uniqueness is checked for the whole batch at once in validate_rows(),
+    not with a query per row
+    """
+    username = serializers.CharField(max_length=150, validators=User._meta.get_field('username').validators)
+    password = serializers.CharField(write_only=True, required=False, allow_blank=True)
+
+    class Meta:
+        model = User
+        fields = IMPORT_FIELDS
+
+
+def parse_rows(content, format):
+    """
+    Rows (dicts) from a CSV document with a header line or a JSON list
+    """
+    try:
+        if format == 'json':
+            rows = json.loads(content) if isinstance(content, (str, bytes)) else content
+        else:
+            if isinstance(content, bytes):
+                content = content.decode('utf-8-sig')
+            rows = list(csv.DictReader(io.StringIO(content)))
+    except (ValueError, csv.Error) as error:
+        raise serializers.ValidationError({'users': f'Could not parse the {format.upper()} file: {error}'})
+    if not isinstance(rows, list):
+        raise serializers.ValidationError({'users': 'Expected a list of users'})
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise serializers.ValidationError({'users': f'At most {MAX_IMPORT_ROWS} users per import'})
+    # Empty CSV cells mean "not given", not "empty string"
+    return [
+        {key.strip(): value for key, value in row.items() if key and value not in ('', None)}
+        if isinstance(row, dict) else row
+        for row in rows
+    ]
+
+
+def validate_rows(rows, allowed_roles=None):
+    """
+    Validated data for every row, or ValidationError keyed by row number
+    Usernames and institution ids must be unique within the file and against
+    existing users (one query each)
+    """
+    serializer = ImportedUserSerializer(data=rows, many=True)
+    serializer.is_valid()
+    errors = {index: dict(error) for index, error in enumerate(serializer.errors or []) if error}
+
+    # Checked on the raw rows too, so one response lists every problem
+    rows = [row if isinstance(row, dict) else {} for row in rows]
+    for field in ['username', 'institution_id']:
+        seen = {}
+        for index, row in enumerate(rows):
+            value = row.get(field)
+            if not value or not isinstance(value, str):
+                continue
+            if value in seen:
+                errors.setdefault(index, {})[field] = [f'Duplicate of row {seen[value]}']
+            seen.setdefault(value, index)
+        taken = set(User.objects.filter(**{f'{field}__in': list(seen)}).values_list(field, flat=True))
+        for index, row in enumerate(rows):
+            if row.get(field) in taken:
+                errors.setdefault(index, {})[field] = ['Already in use']
+
+    if allowed_roles is not None:
+        for index, row in enumerate(rows):
+            if row.get('role', 'student') not in allowed_roles:
+                errors.setdefault(index, {}).setdefault('role', ['You cannot create users with this role'])
+
+    if errors:
+        raise serializers.ValidationError({'rows': dict(sorted(errors.items()))})
+    return serializer.validated_data
+
+
+def _setup_worker():
+    # Spawned workers start without Django configured
+    django.setup()
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    make_password() for each password, spread over a process pool
+    Hashing is CPU-bound (argon2/PBKDF2), so threads would not help
+    Missing passwords become unusable ones (set later by a password reset)
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < POOL_THRESHOLD:
+        return [make_password(password or None) for password in passwords]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_setup_worker) as pool:
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(pool.map(make_password, [password or None for password in passwords], chunksize=chunksize))
+
+
+def create_users(rows, approve=False, batch_size=500, workers=None):
+    """
+    Create every row in batched INSERTs, all or nothing
+    """
+    hashes = hash_passwords([row.get('password') for row in rows], workers=workers)
+    users = [
+        User(
+            **{field: value for field, value in row.items() if field != 'password'},
+            password=password_hash,
+            is_approved=approve,
+        )
+        for row, password_hash in zip(rows, hashes)
+    ]
+    with transaction.atomic():
+        return User.objects.bulk_create(users, batch_size=batch_size)
+
+
+def set_approval(users, approve):
+    """
+    Approve or reject a queryset of users with a single UPDATE
+    Rejected accounts are also deactivated and their tokens revoked
+    (the save() signals that normally do this do not run for update())
+    """
+    user_ids = list(users.values_list('pk', flat=True))
+    users = User.objects.filter(pk__in=user_ids)
+    with transaction.atomic():
+        if approve:
+            updated = users.update(is_approved=True, is_active=True, updated_at=timezone.now())
+        else:
+            # Only approved users can hold tokens
+            signed_in = list(users.filter(is_approved=True).values_list('pk', flat=True))
+            updated = users.update(is_approved=False, is_active=False, updated_at=timezone.now())
+            if signed_in:
+                deny_list.revoke_users(signed_in)
+    cache.delete_many([user_cache_key(user_id) for user_id in user_ids])
+    return updated
@@ -0,0 +1,77 @@
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from .models import TokenRevocation
+
+
+class DenyList:
+    """
+    In-process copy of the live TokenRevocation rows
+    Reloaded at most every `refresh_interval` seconds, so checking a token
+    costs no query and every worker sees a revocation within that delay
+    """
+    refresh_interval = 30
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._jtis = frozenset()
+        self._users = {}  # str(user_id) -> unix time before which tokens are revoked
+
+    def _load(self):
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._loaded_at is not None and now - self._loaded_at < self.refresh_interval:
+                return
+            jtis, users = set(), {}
+            rows = TokenRevocation.objects.filter(expires_at__gt=timezone.now()).values_list(
+                'jti', 'user_id', 'revoked_at'
+            )
+            for jti, user_id, revoked_at in rows:
+                if jti:
+                    jtis.add(jti)
+                elif user_id:
+                    users[str(user_id)] = max(users.get(str(user_id), 0), revoked_at.timestamp())
+            self._jtis, self._users, self._loaded_at = frozenset(jtis), users, now
+
+    def reset(self):
+        self._loaded_at = None
+
+    def is_revoked(self, token):
+        self._load()
+        if token.get('jti') in self._jtis:
+            return True
+        revoked_before = self._users.get(str(token.get('user_id')))  # Tokens carry the id as a string
+        # iat has second precision, so tokens from the revocation's own second
+        # are refused too (one issued just after it means signing in again)
+        return revoked_before is not None and token.get('iat', 0) <= int(revoked_before)
+
+    def revoke_token(self, token):
+        expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+        TokenRevocation.objects.get_or_create(jti=token['jti'], defaults={'expires_at': expires_at})
+        self._jtis = self._jtis | {token['jti']}
+
+    def revoke_user(self, user_id):
+        """
+        Revoke every token the user holds (role/approval changed, deactivated)
+        """
+        self.revoke_users([user_id])
+
+    def revoke_users(self, user_ids):
+        """
+        revoke_user() for many users with a single INSERT
+        """
+        lifetime = max(settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'], settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'])
+        expires_at = timezone.now() + lifetime
+        revocations = TokenRevocation.objects.bulk_create([
+            TokenRevocation(user_id=user_id, expires_at=expires_at) for user_id in user_ids
+        ])
+        self._users = {**self._users, **{str(r.user_id): r.revoked_at.timestamp() for r in revocations}}
+
+
+deny_list = DenyList()
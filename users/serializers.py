@@ -1,7 +1,13 @@
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from .models import User
+from .authentication import add_user_claims
+from .revocation import deny_list
+from reservation_system.serializers import DynamicFieldsMixin
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for converting User model to/from JSON
     Used for reading user data (safe for API responses)
@@ -37,4 +43,20 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             department=validated_data.get('department'),
             phone_number=validated_data.get('phone_number')
         )
-        return user
\ No newline at end of file
+        return user
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Token refresh that honours the deny-list and re-reads the user claims,
+    so a new access token always carries the current role/approval
+    """
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if deny_list.is_revoked(refresh):
+            raise InvalidToken(_('Token has been revoked'))
+
+        user = User.objects.filter(pk=refresh.get('user_id')).first()
+        if user is None or not (user.is_active and user.is_approved):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        return {'access': str(add_user_claims(refresh, user).access_token)}
@@ -0,0 +1,29 @@
+from django.core.cache import cache
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+from .authentication import CLAIM_FIELDS, user_cache_key
+from .models import User
+from .revocation import deny_list
+
+# Changing any of these makes the claims in outstanding tokens wrong
+TRACKED_FIELDS = CLAIM_FIELDS + ['is_active']
+
+
+@receiver(post_init, sender=User)
+def remember_loaded_claims(sender, instance, **kwargs):
+    # __dict__ so deferred fields are not fetched just for this
+    instance._loaded_claims = {field: instance.__dict__.get(field) for field in TRACKED_FIELDS}
+
+
+@receiver(post_save, sender=User)
+def revoke_stale_tokens(sender, instance, created, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
+    loaded = instance._loaded_claims
+    current = {field: instance.__dict__.get(field) for field in TRACKED_FIELDS}
+    changed = [
+        field for field in TRACKED_FIELDS
+        if loaded[field] is not None and current[field] is not None and loaded[field] != current[field]
+    ]
+    if not created and changed:
+        deny_list.revoke_user(instance.pk)
+    instance._loaded_claims = current
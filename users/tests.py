@@ -1,3 +1,223 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password, is_password_usable, make_password
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import TokenRevocation, User
+from .onboarding import hash_passwords
+from .revocation import deny_list
+from .throttling import LoginUsernameThrottle
+
+
+class ClaimsAuthenticationTests(TestCase):
+    """
+    Requests authenticate from token claims, revoked tokens are refused
+    """
+    def setUp(self):
+        cache.clear()  # Login throttle buckets
+        deny_list.reset()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='sarah', password='Sarah@1234', role='researcher', is_approved=True
+        )
+
+    def login(self):
+        response = self.client.post(reverse('login'), {'username': 'sarah', 'password': 'Sarah@1234'})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def authorize(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_authenticated_request_skips_the_user_query(self):
+        self.authorize(self.login()['access'])
+        self.client.get(reverse('notification-list'))  # Loads the deny-list once
+        with self.assertNumQueries(1):  # Only the notifications query
+            response = self.client.get(reverse('notification-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        tokens = self.login()
+        self.authorize(tokens['access'])
+        response = self.client.post(reverse('logout'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(reverse('notification-list')).status_code, 401)
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_role_change_revokes_outstanding_tokens(self):
+        tokens = self.login()
+        self.user.role = 'student'
+        self.user.save()
+        self.assertTrue(TokenRevocation.objects.filter(user=self.user).exists())
+
+        deny_list.reset()
+        self.authorize(tokens['access'])
+        self.assertEqual(self.client.get(reverse('notification-list')).status_code, 401)
+
+    def test_token_from_the_revocations_own_second_is_refused(self):
+        tokens = self.login()
+        self.user.role = 'student'
+        self.user.save()
+        # Revoked later within the second the token was issued in
+        issued = AccessToken(tokens['access'])['iat']
+        TokenRevocation.objects.filter(user=self.user).update(
+            revoked_at=datetime.fromtimestamp(issued + 0.9, tz=dt_timezone.utc)
+        )
+        deny_list.reset()
+        self.authorize(tokens['access'])
+        self.assertEqual(self.client.get(reverse('notification-list')).status_code, 401)
+
+
+class LoginThroughputTests(TestCase):
+    """
+    Login throttling and rehashing with the configured hasher
+    """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='tom', password='Tom@12345', is_approved=True)
+
+    def login(self, password='Tom@12345', username='tom'):
+        return self.client.post(reverse('login'), {'username': username, 'password': password})
+
+    @override_settings(AUTH_THROTTLE_BUCKETS={'login_username': (3, 0.001)})
+    def test_username_bucket_limits_guessing(self):
+        for _ in range(3):
+            self.assertEqual(self.login(password='wrong').status_code, 401)
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # Another account behind the same address is unaffected
+        User.objects.create_user(username='ann', password='Ann@12345', is_approved=True)
+        self.assertEqual(self.login(username='ann', password='Ann@12345').status_code, 200)
+
+    @override_settings(AUTH_THROTTLE_BUCKETS={'login_username': (2, 0.001)})
+    def test_username_bucket_ignores_case(self):
+        self.login(username='TOM', password='wrong')
+        self.login(username='Tom', password='wrong')
+        self.assertEqual(self.login().status_code, 429)
+
+    def test_concurrent_requests_cannot_overspend_a_bucket(self):
+        real_get = cache.get
+
+        def slow_get(*args, **kwargs):
+            value = real_get(*args, **kwargs)
+            time.sleep(0.01)  # Every request reads the bucket before any writes it back
+            return value
+
+        throttle = LoginUsernameThrottle()
+        request = SimpleNamespace(data={'username': 'tom'})
+        allowed = []
+        with override_settings(AUTH_THROTTLE_BUCKETS={'login_username': (3, 0.001)}), \
+                patch.object(cache, 'get', slow_get), patch('users.throttling.LOCK_WAIT', 5):
+            workers = [
+                threading.Thread(target=lambda: allowed.append(throttle.allow_request(request, None)))
+                for _ in range(6)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(allowed.count(True), 3)
+
+    @override_settings(AUTH_THROTTLE_BUCKETS={'login_ip': (2, 0.001)})
+    def test_forged_forwarded_for_does_not_get_a_fresh_bucket(self):
+        for forged in ('1.1.1.1', '2.2.2.2'):
+            self.client.post(reverse('login'), {'username': 'tom', 'password': 'wrong'},
+                             HTTP_X_FORWARDED_FOR=f'{forged}, 203.0.113.9')
+        response = self.client.post(reverse('login'), {'username': 'ann', 'password': 'wrong'},
+                                    HTTP_X_FORWARDED_FOR='3.3.3.3, 203.0.113.9')
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'users.hashers.TunedPBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ], PBKDF2_ITERATIONS=1000)
+    def test_login_rehashes_with_preferred_hasher(self):
+        User.objects.filter(pk=self.user.pk).update(
+            password=make_password('Tom@12345', hasher='md5')
+        )
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BulkOnboardingTests(TestCase):
+    """
+    Cohort import and bulk approval
+    """
+    def setUp(self):
+        cache.clear()
+        deny_list.reset()
+        self.client = APIClient()
+        self.admin = User.objects.create_user(
+            username='manager', password='Manager@1234', role='lab_manager', is_approved=True
+        )
+        self.client.force_authenticate(self.admin)
+
+    def test_csv_upload_creates_cohort(self):
+        lines = ['username,email,password,role,institution_id,department']
+        lines += [f'stu{i},stu{i}@lab.edu,Pass@{i}xyz,student,INS{i},Physics' for i in range(60)]
+        upload = SimpleUploadedFile('cohort.csv', '\n'.join(lines).encode(), content_type='text/csv')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('user-bulk-import') + '?approve=true', {'file': upload})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 60)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "users_user"')]
+        self.assertLess(len(inserts), 3)  # Batched (SQLite caps the parameters per query)
+
+        user = User.objects.get(username='stu7')
+        self.assertTrue(user.is_approved)
+        self.assertEqual(user.institution_id, 'INS7')
+        self.assertTrue(user.check_password('Pass@7xyz'))
+
+    def test_invalid_rows_create_nothing(self):
+        response = self.client.post(reverse('user-bulk-import'), {'users': [
+            {'username': 'ann', 'password': 'Ann@12345'},
+            {'username': 'ann', 'role': 'wizard'},
+            {'username': 'boss', 'role': 'super_admin'},
+            {'username': 'manager'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.data['rows']), [1, 2, 3])
+        self.assertFalse(User.objects.filter(username='ann').exists())
+
+    def test_passwords_hash_in_worker_processes(self):
+        passwords = [f'Pass@{i}' for i in range(60)] + ['']
+        hashes = hash_passwords(passwords, workers=2)
+        self.assertTrue(check_password('Pass@42', hashes[42]))
+        self.assertFalse(is_password_usable(hashes[-1]))
+
+    def test_bulk_approval_is_one_update(self):
+        pending = [User.objects.create_user(username=f'p{i}', password='x') for i in range(5)]
+        ids = [user.id for user in pending]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('user-bulk-approval'), {'user_ids': ids, 'action': 'approve'}, format='json')
+        self.assertEqual(response.data['updated'], 5)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(User.objects.filter(id__in=ids, is_approved=True).count(), 5)
+
+        response = self.client.post(reverse('user-bulk-approval'), {'user_ids': ids[:2], 'action': 'reject'}, format='json')
+        self.assertEqual(response.data['updated'], 2)
+        self.assertFalse(User.objects.get(id=ids[0]).is_active)
+        self.assertEqual(TokenRevocation.objects.filter(user_id__in=ids[:2]).count(), 2)
+
+    def test_lab_manager_cannot_reject_super_admin(self):
+        boss = User.objects.create_user(username='boss', password='x', role='super_admin', is_approved=True)
+        response = self.client.post(reverse('user-bulk-approval'), {'user_ids': [boss.id], 'action': 'reject'}, format='json')
+        self.assertEqual(response.data['updated'], 0)
+        boss.refresh_from_db()
+        self.assertTrue(boss.is_approved)
@@ -0,0 +1,92 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+# (burst capacity, tokens refilled per second) per bucket scope
+DEFAULT_BUCKETS = {
+    'login_ip': (300, 5.0),         # A whole class behind one NAT can still log in
+    'login_username': (10, 0.2),    # Credential stuffing on one account: 1 try per 5s
+    'register_ip': (20, 0.1),
+}
+
+# How long a request waits for a bucket another request is updating (seconds),
+# and how long a lock outlives a worker that died holding it
+LOCK_WAIT = 0.05
+LOCK_TIMEOUT = 2
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket kept in the cache: each request takes a token, tokens come
+    back at a steady rate, so bursts up to the capacity are allowed
+    A bucket is read and written under a lock taken with cache.add (atomic
+    in every backend), so concurrent requests cannot spend the same token
+    Subclasses set `scope` and implement get_bucket_key()
+    """
+    scope = None
+
+    def get_bucket_key(self, request):
+        raise NotImplementedError
+
+    def get_rate(self):
+        buckets = {**DEFAULT_BUCKETS, **getattr(settings, 'AUTH_THROTTLE_BUCKETS', {})}
+        return buckets[self.scope]
+
+    def allow_request(self, request, view):
+        key = self.get_bucket_key(request)
+        if key is None:
+            return True
+        capacity, refill_rate = self.get_rate()
+        cache_key = f'throttle:{self.scope}:{key}'
+        lock_key = f'{cache_key}:lock'
+
+        deadline = time.monotonic() + LOCK_WAIT
+        while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                # Refuse rather than spend a token unlocked
+                self.wait_seconds = 1 / refill_rate
+                return False
+            time.sleep(0.002)
+        try:
+            now = time.time()
+            tokens, updated_at = cache.get(cache_key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+            if tokens < 1:
+                self.wait_seconds = (1 - tokens) / refill_rate
+                return False
+
+            # Keep the entry only as long as it takes to refill completely
+            cache.set(cache_key, (tokens - 1, now), int(capacity / refill_rate) + 1)
+            return True
+        finally:
+            cache.delete(lock_key)
+
+    def wait(self):
+        return getattr(self, 'wait_seconds', None)
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Bucket per client address; set REST_FRAMEWORK['NUM_PROXIES'] to the
+    proxies in front of the app, or X-Forwarded-For picks the bucket
+    """
+    def get_bucket_key(self, request):
+        return self.get_ident(request)
+
+
+class LoginIPThrottle(IPTokenBucketThrottle):
+    scope = 'login_ip'
+
+
+class LoginUsernameThrottle(TokenBucketThrottle):
+    scope = 'login_username'
+
+    def get_bucket_key(self, request):
+        username = request.data.get('username')
+        return str(username).strip().lower()[:150] if username else None
+
+
+class RegisterIPThrottle(IPTokenBucketThrottle):
+    scope = 'register_ip'
@@ -4,6 +4,9 @@ from . import views
 urlpatterns = [
     path('register/', views.register_user, name='register'),
     path('login/', views.login_user, name='login'),
+    path('logout/', views.logout_user, name='logout'),
+    path('users/bulk/', views.bulk_import_users, name='user-bulk-import'),
+    path('users/bulk-approval/', views.bulk_user_approval, name='user-bulk-approval'),
     path('users/', views.UserListView.as_view(), name='user-list'),
     path('users/<int:pk>/', views.UserDetailView.as_view(), name='user-detail'),
 ]
\ No newline at end of file
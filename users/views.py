@@ -1,10 +1,15 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from django.contrib.auth import authenticate
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 from .models import User
 from .serializers import UserSerializer, UserRegistrationSerializer
+from .authentication import issue_tokens
+from .revocation import deny_list
+from .onboarding import create_users, parse_rows, set_approval, validate_rows
+from .throttling import LoginIPThrottle, LoginUsernameThrottle, RegisterIPThrottle
 
 class UserListView(generics.ListAPIView):
     """
@@ -37,6 +42,7 @@ class UserDetailView(generics.RetrieveUpdateAPIView):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])  # Anyone can register
+@throttle_classes([RegisterIPThrottle])
 def register_user(request):
     """
     Custom registration endpoint
@@ -60,9 +66,12 @@ def register_user(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])  # Anyone can try to login
+@throttle_classes([LoginIPThrottle, LoginUsernameThrottle])
 def login_user(request):
     """
     Custom login endpoint that returns JWT tokens
+    Rate limited per IP and per username (token buckets, see throttling.py);
+    authenticate() re-hashes old passwords with the preferred hasher
     """
     username = request.data.get('username')
     password = request.data.get('password')
@@ -72,7 +81,8 @@ def login_user(request):
     
     if user and user.is_approved and user.is_active:
         # Generate JWT tokens for authenticated, approved users
-        refresh = RefreshToken.for_user(user)
+        # (role/approval claims inside let later requests skip the user query)
+        refresh = issue_tokens(user)
         return Response({
             'refresh': str(refresh),      # Long-term token for getting new access tokens
             'access': str(refresh.access_token),  # Short-term token for API calls
@@ -83,4 +93,74 @@ def login_user(request):
     return Response(
         {'error': 'Invalid credentials or account not approved'}, 
         status=status.HTTP_401_UNAUTHORIZED
-    )
\ No newline at end of file
+    )
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def logout_user(request):
+    """
+    Revoke the current access token and, if given, the refresh token
+    """
+    deny_list.revoke_token(request.auth)
+    if request.data.get('refresh'):
+        try:
+            deny_list.revoke_token(RefreshToken(request.data['refresh']))
+        except TokenError:
+            pass  # Already invalid or expired, nothing to revoke
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_import_users(request):
+    """
+    API endpoint to onboard a whole cohort at once (admins only)
+    Accepts a CSV/JSON file upload ("file") or a JSON body {"users": [...]},
+    with ?approve=true to approve the new accounts immediately
+    Nothing is created unless every row is valid
+    """
+    if request.user.role not in ['super_admin', 'lab_manager']:
+        return Response({'error': 'Only admins can import users'}, status=status.HTTP_403_FORBIDDEN)
+
+    upload = request.FILES.get('file')
+    if upload is not None:
+        format = 'json' if upload.name.lower().endswith('.json') else 'csv'
+        rows = parse_rows(upload.read(), format)
+    else:
+        rows = parse_rows(request.data.get('users', []), 'json')
+
+    # Lab managers cannot mint super admins
+    allowed_roles = None if request.user.role == 'super_admin' else ['lab_manager', 'researcher', 'student']
+    data = validate_rows(rows, allowed_roles=allowed_roles)
+    approve = request.query_params.get('approve') in ['1', 'true']
+    users = create_users(data, approve=approve)
+    return Response({
+        'created': len(users),
+        'user_ids': [user.id for user in users],
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_user_approval(request):
+    """
+    API endpoint to approve or reject many users in one UPDATE (admins only)
+    Body: {"user_ids": [...], "action": "approve" | "reject"}
+    """
+    if request.user.role not in ['super_admin', 'lab_manager']:
+        return Response({'error': 'Only admins can approve users'}, status=status.HTTP_403_FORBIDDEN)
+
+    action = request.data.get('action')
+    try:
+        user_ids = [int(user_id) for user_id in request.data.get('user_ids')]
+    except (TypeError, ValueError):
+        user_ids = None
+    if action not in ['approve', 'reject'] or user_ids is None:
+        return Response(
+            {'error': 'Expected {"user_ids": [...], "action": "approve" | "reject"}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    users = User.objects.filter(pk__in=user_ids).exclude(pk=request.user.pk)
+    if request.user.role != 'super_admin':
+        users = users.exclude(role='super_admin')
+    updated = set_approval(users, approve=action == 'approve')
+    return Response({'updated': updated})